@@ -7,5 +7,6 @@ class SingleAssetDataRepresentation(SingleAssetData):
     or any other customization -> inherit from SingleAssetData, and override methods
 
     Last inheritor will be used as asset data holder
+    Remove __slots__ if you need to store additional attributes in the asset object
     """
-    ...
+    __slots__ = ()
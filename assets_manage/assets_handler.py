@@ -1,36 +1,39 @@
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from queue import Queue, Empty as QueueEmptyException
 from threading import Thread, Event
 from typing import Type, Optional
 
 import os
+import json
+import math
 import time
-import yaml
 
-from data_holders import getAssetDataHolderClass, RecaptchaTokenHolder, UploadDataHolder, SingleAssetData, UploadResponseHolder
+from data_holders import getAssetDataHolderClass, CollectionInfo, RecaptchaTokenHolder, UploadDataHolder, SingleAssetData, UploadResponseHolder, UploadErrorHolder
 from events import EventHolder, ServerEvent
 from config import CollectionConfig
+from assets_manage.pending_index import PendingAssetsIndex
+from assets_manage.manifest import Manifest, InMemoryManifest, StreamingManifest
+from assets_manage.data_keeper import DataKeeper
+from assets_manage.dead_letters import DeadLetterStore
+from assets_manage.preflight import PreflightValidator, PreflightResult
+from assets_manage.content_index import ContentHashIndex
+from assets_manage.fingerprints import ManifestFingerprints, ManifestDiff
+from assets_manage.dispatch_order import DISPATCH_ORDERS
+from assets_manage.read_ahead import FileReadAhead
+from assets_manage.staging import StagingCache
+from assets_manage.build_manifest import build_manifest, scan_collection_dir, manifest_files
+from assets_manage.exceptions import MNUAssetsHandlerException, CollectionDirNotFound, ManifestNotFound, ManifestFileCorrupted, DataKeeperFileCorrupted, UnknownDispatchOrder, UnknownWatchMode
 
 import asset_data_holder  # imported for registering subclasses
 
 
-class MNUAssetsHandlerException(Exception):
-    """Base exception for assets_handler module"""
-
-
-class CollectionDirNotFound(MNUAssetsHandlerException):
-    """Assets handler can`t find the collection dir"""
-
-
-class ManifestNotFound(MNUAssetsHandlerException):
-    """Assets handler can`t find the manifest file"""
-
-
-class ManifestFileCorrupted(MNUAssetsHandlerException):
-    """Manifest file have unknown format or corrupted"""
-
-
-class DataKeeperFileCorrupted(MNUAssetsHandlerException):
-    """Data keeper file have unknown format or corrupted"""
+# exceptions were defined here before assets_manage.exceptions, re-exported for compatibility
+__all__ = [
+    "AssetsHandler",
+    "MNUAssetsHandlerException", "CollectionDirNotFound", "ManifestNotFound", "ManifestFileCorrupted", "DataKeeperFileCorrupted",
+]
 
 
 class AssetsHandler:
@@ -42,137 +45,691 @@ class AssetsHandler:
     workers_emulate_data: str = "JTQxJTcyJTY1JTVGJTc1JTVGJTczJTc1JTcyJTY1JTVGJTY5JTc0JTVGJTY5JTczJTVGJTczJTYxJTY2JTY1JTVGJTVGJTYyJTc1JTc0JTVGJTc0JTY4JTYxJTZFJTZCJTcz" # ?)
 
     collection_manifest: str = "0manifest.yaml" # file which must contain information about assets. Each element of manifest will be represent using AssetHolderClass
+    collection_manifest_stream: str = "0manifest.jsonl" # streaming(JSON Lines) form of the manifest. If exists, used instead of collection_manifest. See assets_manage.manifest for details
     collection_data_keeper: str = "0data_keeper.yaml" # file which will be contain data of uploaded assets(blockchain data). See data_holders.UploadResponseHolder.AssetDataFromResponse for details about data
+    collection_dead_letters: str = "0dead_letters.jsonl" # assets which failed uploading max_upload_attempts times. See assets_manage.dead_letters
+    collection_preflight_cache: str = "0preflight_cache.jsonl" # cached results of asset files checking. See assets_manage.preflight
+    collection_preflight_report: str = "0preflight_report.jsonl" # assets skipped during current run due to invalid files
+    collection_content_hashes: str = "0content_hashes.jsonl" # cached sha256 of asset files. See assets_manage.content_index
+    collection_duplicates_report: str = "0duplicates_report.json" # groups of assets with identical files
+    collection_fingerprints: str = "0fingerprints.bin" # fingerprints of the manifest entries and asset files. See assets_manage.fingerprints
+
+    preflight_workers: int = 4
+    preflight_window_size: int = 32 # amount of pending assets validated ahead of dispatching
+    read_ahead_files: int = 16 # amount of pending assets which files are warmed in the page cache(within read_ahead_mb)
+    staging_files: int = 8 # amount of pending assets which files are copied to the staging dir(within staging_mb)
+    staging_workers: int = 2 # concurrent copies from the slow storage
+
+    lease_grace_time: float = 30 # seconds, added to the max_upload_time. See assets_manage.pending_index.AssetLease
+    lease_reap_interval: float = 5 # seconds between checks of expired leases
+
+    watch_modes = ("off", "manifest", "dir") # see watch_mode of the collection config
+    watch_interval: float = 5 # seconds between checks of the manifest(collection dir) changes in watch mode
+
+    manifest_read_errors = (KeyError, OSError, ManifestFileCorrupted) # manifest was changed(or broken) while reading entries
 
-    def __init__(self, assets_uploader_bus: Queue, output_bus: Queue, collection_config: CollectionConfig = CollectionConfig()):
+    file_fields = ("id", "file_name", "path", "size", "media_type", "sha256") # fields of the manifest entry which describe asset file
+
+    max_prefetch_depth: int = 20 # upper limit of assets waiting for drivers in the bus
+    latency_smoothing: float = 0.2 # weight of the newest observation in latency averages(EWMA)
+
+    def __init__(self, assets_uploader_bus: Queue, output_bus: Queue, collection_config: Optional[CollectionConfig] = None):
+        collection_config = collection_config if collection_config is not None else CollectionConfig()
 
         if not os.path.isdir(collection_config.collection_dir_local_path):
             raise CollectionDirNotFound(collection_config.collection_dir_local_path)
 
         self.collection_config = collection_config
+        self.collection_info = CollectionInfo(collection_config.dict_like) # shared by all asset holders
         self.collection_dir = collection_config.collection_dir_local_path # type: str
+        self.dispatch_order = collection_config.dispatch_order or "manifest" # type: str # key of DISPATCH_ORDERS
+        if self.dispatch_order not in DISPATCH_ORDERS:
+            raise UnknownDispatchOrder(self.dispatch_order, list(DISPATCH_ORDERS))
+        self.watch_mode = collection_config.watch_mode or "off" # type: str
+        if self.watch_mode not in self.watch_modes:
+            raise UnknownWatchMode(self.watch_mode, list(self.watch_modes))
+        self._next_watch = time.monotonic() + self.watch_interval # type: float
+        self._collection_files = None # type: Optional[int] # hash of the collection dir listing, see _scan_collection_dir
+        self._dir_listings = dict() # type: dict # listings of the collection dirs, see scan_collection_dir
+        self._known_files = None # type: Optional[set] # files of the manifest, see _append_new_files
+        self._next_asset_id = 0 # type: int # id of the next appended asset
+        self._dir_scan = None # type: Optional[Future] # background scan of the collection dir, see _scan_collection_dir
+        self._duplicates_search = None # type: Optional[Future] # background hashing of the asset files, see _find_duplicates
+        self._sizes_measure = None # type: Optional[Future] # background measuring of the asset files sizes, see _measure_sizes
+        self._changes_detection = None # type: Optional[Future] # background comparison with the previous run, see _detect_changes
+        self._background = None # type: Optional[ThreadPoolExecutor] # producer work which must not block dispatching
+        self._background_done = False # type: bool # producer is woken to apply result of the background work
 
         self.collection_manifest = os.path.join(self.collection_dir, self.collection_manifest)
         self.collection_data_keeper = os.path.join(self.collection_dir, self.collection_data_keeper)
-
-        self.manifest_data = {} # type: dict # data from manifest. See manifest_structure.puml for example
-        if not os.path.isfile(self.collection_manifest):
-            raise ManifestNotFound(self.collection_manifest)
-        else:
-            with open(self.collection_manifest, "r") as f:
-                try:
-                    manifest = yaml.safe_load(f) # type: dict
-                except yaml.YAMLError:
-                    raise ManifestFileCorrupted(f"Error while decoding {self.collection_manifest}")
-
-                if not isinstance(manifest, dict) or "assets_data" not in manifest:
-                    raise ManifestFileCorrupted(type(manifest), manifest.keys())
-                self.manifest_data = manifest
-
-        self.uploaded_assets_ids = [] # type: list # contain ids of assets which already uploaded
-
-        if os.path.isfile(self.collection_data_keeper):
-            #TODO: read only strings with ids(collection_data_keeper is a dict)
-            with open(self.collection_data_keeper, "r") as f:
-                try:
-                    data_keeper = yaml.safe_load(f) # type: dict
-                except yaml.YAMLError:
-                    raise DataKeeperFileCorrupted(f"Error while decoding {self.collection_data_keeper}")
-
-                if not isinstance(data_keeper, dict):
-                    raise DataKeeperFileCorrupted(type(data_keeper))
-                self.uploaded_assets_ids = list(data_keeper.keys())
+        self.collection_dead_letters = os.path.join(self.collection_dir, self.collection_dead_letters)
+        self.collection_preflight_cache = os.path.join(self.collection_dir, self.collection_preflight_cache)
+        self.collection_preflight_report = os.path.join(self.collection_dir, self.collection_preflight_report)
+        self.collection_content_hashes = os.path.join(self.collection_dir, self.collection_content_hashes)
+        self.collection_duplicates_report = os.path.join(self.collection_dir, self.collection_duplicates_report)
+        self.collection_fingerprints = os.path.join(self.collection_dir, self.collection_fingerprints)
+
+        self.collection_manifest_stream = os.path.join(self.collection_dir, self.collection_manifest_stream)
+        self.manifest = self._load_manifest() # type: Manifest
+        self._manifest_keys_version = self.manifest.keys_version # type: int # see _remap_manifest_keys
+
+        self.output_bus = output_bus # bus for communication with server
+
+        self.data_keeper = DataKeeper(
+            self.collection_data_keeper,
+            flush_interval=(collection_config.data_keeper_flush_interval_ms or 0)/1000,
+            fsync_policy=collection_config.data_keeper_fsync or "commit",
+            on_error=lambda e: self.output_bus.put(EventHolder(ServerEvent.AH_DATA_KEEPER_WRITE_ERROR, e))
+        )
+
+        self.dead_letters = DeadLetterStore(self.collection_dead_letters)
+
+        self.pending_index = PendingAssetsIndex(
+            self.manifest.entries(),
+            uploaded_ids=self.data_keeper.load_uploaded_ids(),
+            dead_ids=self.dead_letters.load(),
+            max_attempts=collection_config.max_upload_attempts or 5
+        )
 
         self.assets_uploader_bus = assets_uploader_bus
-        self.output_bus          = output_bus # bus for communication with server
         self.incoming_token_bus  = Queue() # type: Queue # bus with valid tokens from recaptcha workers
 
+        self.preflight = None # type: Optional[PreflightValidator]
+        if collection_config.preflight_validation:
+            self.preflight = PreflightValidator(
+                self.collection_preflight_cache,
+                max_file_size=(collection_config.max_asset_file_size_mb or 100)*1024*1024,
+                workers=self.preflight_workers
+            )
+            if os.path.isfile(self.collection_preflight_report):
+                os.remove(self.collection_preflight_report) # report of the previous run
+        self._preflight_window = OrderedDict() # type: OrderedDict[int, tuple[SingleAssetData, Future]]
+
+        self.staging = None # type: Optional[StagingCache]
+        if collection_config.staging_dir:
+            self.staging = StagingCache(
+                collection_config.staging_dir,
+                (collection_config.staging_mb or 1024)*1024*1024,
+                workers=self.staging_workers
+            )
+
+        read_ahead_mb = collection_config.read_ahead_mb if collection_config.read_ahead_mb is not None else 128
+        self.read_ahead = None # type: Optional[FileReadAhead] # copying to the staging dir already reads files ahead
+        if read_ahead_mb > 0 and self.staging is None:
+            self.read_ahead = FileReadAhead(read_ahead_mb*1024*1024)
+
+        self.lease_time = (collection_config.max_upload_time or 60) + self.lease_grace_time # type: float
+        self._next_lease_reap = time.monotonic() + self.lease_reap_interval # type: float
+
+        self.active_workers = 1 # type: int # see set_active_workers
+        self.upload_latency = None # type: Optional[float] # seconds, EWMA of successful uploads duration
+        self.produce_latency = 0.0 # type: float # seconds, EWMA of time spent on preparing single asset for the bus
+
         self.stop_event = Event()
         self.assets_handler_thread = Thread(name="AssetsHandlerThread", target=self.start, daemon=True)
         self.assets_handler_thread.start()
 
+    def _load_manifest(self) -> Manifest:
+        """
+        Load streaming manifest if exists, otherwise parse YAML manifest
+
+        :return: Manifest
+        """
+        if os.path.isfile(self.collection_manifest_stream):
+            return StreamingManifest(self.collection_manifest_stream)
+        if not os.path.isfile(self.collection_manifest):
+            raise ManifestNotFound(self.collection_manifest)
+        return InMemoryManifest.load(self.collection_manifest, intern_traits=self.collection_config.intern_traits is not False)
+
     def put_token(self, new_token: RecaptchaTokenHolder):
         self.incoming_token_bus.put(new_token)
 
-    def asset_uploading_failed(self, asset_id: int) -> bool:
+    def set_active_workers(self, count: int) -> None:
+        """
+        Called by upload manager when drivers pool is changed. Affects prefetch_depth
+
+        :param count: Concurrent uploads of the drivers(upload slots)
+        """
+        self.active_workers = count
+        self._wake_producer()
+
+    @property
+    def prefetch_depth(self) -> int:
+        """
+        Amount of assets which must wait in the bus: one ready asset per upload slot, plus assets which drivers
+        will take while the producer prepares the next one(produce_latency/upload_latency per slot)
         """
-        Called when asset uploading failed
+        refill = self.produce_latency/self.upload_latency if self.upload_latency else 0
+        return max(1, min(self.max_prefetch_depth, math.ceil(self.active_workers*(1+refill))))
+
+    @staticmethod
+    def _ewma(average: Optional[float], value: float, weight: float) -> float:
+        return value if average is None else average + weight*(value-average)
+
+    def _wake_producer(self) -> None:
+        with self.assets_uploader_bus.not_full:
+            self.assets_uploader_bus.not_full.notify_all()
+
+    def _wait_producer_wakeup(self, predicate) -> bool:
+        """
+        Block producer until predicate is True, handler is stopped, background work is done(see _submit_background)
+        or it is time to reap expired leases(or to retry failed asset).
+        Drivers wake the producer on each Queue.get(it notifies Queue.not_full)
+
+        :return: Predicate value
+        """
+        bus = self.assets_uploader_bus
+        timeout = max(self._next_lease_reap-time.monotonic(), 0)
+        if self.watch_mode != "off":
+            timeout = min(timeout, max(self._next_watch-time.monotonic(), 0))
+        next_retry_in = self.pending_index.next_retry_in()
+        if next_retry_in is not None:
+            timeout = min(timeout, next_retry_in)
+        with bus.not_full:
+            bus.not_full.wait_for(lambda: self.stop_event.is_set() or self._background_done or predicate(), timeout)
+            return predicate() and not self.stop_event.is_set()
+
+    def asset_uploading_failed(self, asset_id: int, error: Optional[str] = None) -> bool:
+        """
+        Called when asset uploading failed. Asset will be retried later(see PendingAssetsIndex.mark_failed)
+        or moved to the dead letters, if attempts are exceeded
 
         :param asset_id: Id of asset which not uploaded
+        :param error: Description of the error
         :return: True if at least one asset was affected
         """
-        for asset_name, asset_data in self.manifest_data["assets_data"].items():
-            if asset_data["id"] == asset_id:
-                self.manifest_data["assets_data"][asset_name]["upload_in_progress"] = False
-                return True
-        return False
+        attempts = self.pending_index.mark_failed(asset_id)
+        if attempts is None:
+            return False
+        if self.staging is not None:
+            self.staging.unlock(asset_id)
+        if self.pending_index.is_dead(asset_id):
+            if self.staging is not None:
+                self.staging.release(asset_id)
+            self.dead_letters.add(asset_id, attempts, error)
+            self.output_bus.put(EventHolder(ServerEvent.AH_ASSET_DEAD_LETTERED, UploadErrorHolder(asset_id, error)))
+        self._wake_producer()
+        return True
+
+    def asset_upload_throttled(self, asset_id: int) -> bool:
+        """
+        Upload was rejected by the API rate limiting. Asset is returned to the queue without counting failed attempt,
+        rate of the drivers is decreased by the rate limiter(see assets_manage.rate_limiter)
+
+        :return: True if asset was returned
+        """
+        if not self.pending_index.requeue(asset_id):
+            return False
+        if self.staging is not None:
+            self.staging.unlock(asset_id)
+        self._wake_producer()
+        return True
 
     def asset_uploaded(self, response_data: UploadResponseHolder) -> bool:
         """
-        Mark asset as uploaded and save response data
+        Mark asset as uploaded and save response data. Throttled uploads are returned to the queue(see asset_upload_throttled)
 
         :param response_data: Data received after uploading
         :return: True if upload was successful, False otherwise
         """
         asset_id = response_data.asset_id
         if response_data.successes:
-            self.uploaded_assets_ids.append(asset_id)
-            data_for_save = {asset_id: response_data.dict_for_save}
-            with open(self.collection_data_keeper, 'a+') as f:
-                yaml.dump(data_for_save, f)
+            self.upload_latency = self._ewma(self.upload_latency, response_data.time_spent_on_upload, self.latency_smoothing)
+            self.pending_index.mark_uploaded(asset_id)
+            self.data_keeper.record(asset_id, response_data.dict_for_save)
+            if self.staging is not None:
+                self.staging.release(asset_id)
             return True
+        elif response_data.throttled:
+            self.asset_upload_throttled(asset_id)
+            return False
         else:
-            self.asset_uploading_failed(asset_id)
+            self.asset_uploading_failed(asset_id, response_data.error_description)
             return False
 
-    def _get_image_data_for_uploading(self) -> Optional[dict]:
+    def _asset_holder(self, asset_id: int) -> SingleAssetData:
+        return self.AssetHolderClass(
+            self.manifest.get(self.pending_index.manifest_key(asset_id)),
+            collection_info=self.collection_info
+        )
+
+    def _lookahead_holder(self, asset_id: int) -> Optional[SingleAssetData]:
+        """
+        :return: Holder of the upcoming asset, None if its entry can`t be read now(error is reported on dispatch)
+        """
+        asset, _ = self._preflight_window.get(asset_id, (None, None))
+        if asset is not None:
+            return asset
+        try:
+            return self._asset_holder(asset_id)
+        except self.manifest_read_errors:
+            return None
+
+    def _preflight_lookahead(self) -> None:
+        """Submit validation of the next pending assets, so results will be ready when assets are dispatched"""
+        for asset_id in self.pending_index.peek(self.preflight_window_size):
+            if asset_id not in self._preflight_window:
+                asset = self._lookahead_holder(asset_id)
+                if asset is not None:
+                    self._preflight_window[asset_id] = (asset, self.preflight.submit(asset.path))
+        while len(self._preflight_window) > 2*self.preflight_window_size: # assets dispatched out of order(e.g. retries)
+            self._preflight_window.popitem(last=False)
+
+    def _read_ahead_lookahead(self) -> None:
+        """Warm page cache for the files of the next pending assets. See assets_manage.read_ahead"""
+        upcoming = self.pending_index.peek(self.read_ahead_files)
+        self.read_ahead.retain(upcoming)
+        for asset_id in upcoming:
+            if asset_id in self.read_ahead:
+                continue
+            asset = self._lookahead_holder(asset_id)
+            if asset is not None and not self.read_ahead.prefetch(asset_id, asset.path):
+                break # budget is exhausted
+
+    def _staging_lookahead(self, dispatching_id: int) -> None:
+        """
+        Copy files of the next pending assets to the staging dir. See assets_manage.staging
+
+        :param dispatching_id: Asset which is dispatching now, its copy must not be evicted
+        """
+        upcoming = self.pending_index.peek(self.staging_files)
+        keep = set(upcoming)
+        keep.add(dispatching_id)
+        for asset_id in upcoming:
+            if asset_id in self.staging:
+                continue
+            asset = self._lookahead_holder(asset_id)
+            if asset is not None and not self.staging.stage(asset_id, asset.path, keep):
+                break # budget is exhausted
+
+    def _use_staged_file(self, asset: SingleAssetData) -> SingleAssetData:
+        if self.staging is not None:
+            staged_path = self.staging.dispatch(asset.id)
+            if staged_path is not None:
+                asset.use_staged_file(staged_path)
+        return asset
+
+    def _reject_asset(self, asset_id: int, result: PreflightResult) -> None:
+        """Asset file not passed validation. Asset will not be dispatched and will be added to the report"""
+        self.pending_index.mark_rejected(asset_id)
+        if self.staging is not None:
+            self.staging.release(asset_id)
+        with open(self.collection_preflight_report, "a") as f:
+            f.write(json.dumps({"id": asset_id, "path": result.path, "error": result.error}) + "\n")
+        self.output_bus.put(EventHolder(ServerEvent.AH_ASSET_REJECTED, UploadErrorHolder(asset_id, result.error)))
+
+    def _submit_background(self, fn) -> Future:
+        """Run fn on the background thread. Producer is woken when it is done"""
+        if self._background is None:
+            self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="MNU-Background")
+        future = self._background.submit(fn)
+        future.add_done_callback(self._on_background_done)
+        return future
+
+    def _on_background_done(self, _: Future) -> None:
+        self._background_done = True
+        self._wake_producer()
+
+    def _find_duplicates(self) -> None:
+        """
+        Hash all asset files in the background(dispatching is not blocked) and search assets with identical content.
+        Result is applied on the producer thread, see _apply_duplicates
+        """
+        assets = []
+        for asset_id in list(self.pending_index.asset_ids()):
+            try:
+                assets.append((asset_id, self._asset_holder(asset_id).path))
+            except self.manifest_read_errors:
+                continue # reported on dispatch
+
+        def hash_files() -> ContentHashIndex:
+            content_index = ContentHashIndex(self.collection_content_hashes, workers=self.preflight_workers)
+            content_index.build(assets, stop_event=self.stop_event)
+            return content_index
+
+        self._duplicates_search = self._submit_background(hash_files)
+
+    def _asset_metadata(self, asset_id: int) -> dict:
+        """:return: Manifest entry of the asset without fields of the file"""
+        asset_data = self.manifest.get(self.pending_index.manifest_key(asset_id))
+        return {key: value for key, value in asset_data.items() if key not in self.file_fields}
+
+    def _apply_duplicates(self) -> None:
+        """
+        Groups of assets with identical files are saved to the report. If duplicate_assets is "skip",
+        only one asset of each group is uploaded(already uploaded or in progress one, otherwise first in manifest).
+        Assets with different metadata(traits, description...) are not skipped. Assets dispatched before
+        the search was finished are uploaded anyway
+        """
+        if self._duplicates_search is None or not self._duplicates_search.done():
+            return
+        duplicates_search, self._duplicates_search = self._duplicates_search, None
+        if self.stop_event.is_set():
+            return
+        skip = self.collection_config.duplicate_assets == "skip"
+
+        index = self.pending_index
+        groups, skipped, metadata_differs = [], [], []
+        for content_hash, asset_ids in duplicates_search.result().duplicates().items():
+            kept = next((asset_id for asset_id in asset_ids if index.is_uploaded(asset_id)), None)
+            if kept is None:
+                kept = next((asset_id for asset_id in asset_ids if index.is_in_progress(asset_id)), asset_ids[0])
+            try:
+                kept_metadata = self._asset_metadata(kept)
+                group_skipped, group_differs = [], []
+                for asset_id in asset_ids:
+                    if asset_id == kept or index.is_uploaded(asset_id) or index.is_in_progress(asset_id) or index.is_dead(asset_id):
+                        continue
+                    (group_skipped if self._asset_metadata(asset_id) == kept_metadata else group_differs).append(asset_id)
+            except self.manifest_read_errors:
+                continue # manifest is being rewritten
+            groups.append({"sha256": content_hash, "ids": asset_ids, "kept": kept, "metadata_differs": group_differs})
+            skipped.extend(group_skipped)
+            metadata_differs.extend(group_differs)
+
+        if skip:
+            for asset_id in skipped:
+                index.mark_rejected(asset_id)
+                if self.staging is not None:
+                    self.staging.release(asset_id)
+        with open(self.collection_duplicates_report, "w") as f:
+            json.dump({"skipped": skipped if skip else [], "groups": groups}, f, indent=2)
+        if groups:
+            self.output_bus.put(EventHolder(
+                ServerEvent.AH_DUPLICATED_ASSETS,
+                {"groups": len(groups), "skipped": skipped if skip else [], "metadata_differs": metadata_differs}
+            ))
+
+    def _detect_changes(self) -> None:
+        """
+        Compare fingerprints of the manifest with the previous run(see assets_manage.fingerprints). Fingerprints are built
+        in the background(every asset file is checked), dispatching is not blocked: only dead assets are affected
+        by the result, they stay out of the queue until it is applied(see _apply_changes)
+        """
+        use_absolute_path = self.collection_config.use_absolute_path is not False
+
+        def compare() -> Optional[ManifestDiff]:
+            current = ManifestFingerprints.build(
+                self.manifest, self.collection_dir,
+                use_absolute_path=use_absolute_path,
+                workers=self.preflight_workers, stop_event=self.stop_event
+            )
+            if self.stop_event.is_set():
+                return None # fingerprints are incomplete
+            previous = ManifestFingerprints.load(self.collection_fingerprints)
+            current.save(self.collection_fingerprints)
+            return previous.diff(current) if previous is not None else None
+
+        self._changes_detection = self._submit_background(compare)
+
+    def _apply_changes(self) -> None:
+        """
+        Changed dead assets are returned to the queue. Changed uploaded assets are only reported(uploading again would mint a copy),
+        changed pending assets are uploaded with the current data anyway
+        """
+        if self._changes_detection is None or not self._changes_detection.done():
+            return
+        changes_detection, self._changes_detection = self._changes_detection, None
+        try:
+            diff = changes_detection.result()
+        except self.manifest_read_errors:
+            return # manifest was rewritten meanwhile, changes are detected on the next run
+        if not diff or self.stop_event.is_set():
+            return
+        changed = diff.changed
+        requeued = [asset_id for asset_id in changed if self.pending_index.is_dead(asset_id) and self.pending_index.revive(asset_id)]
+        if requeued:
+            self.dead_letters.remove(*requeued)
+        self.output_bus.put(EventHolder(ServerEvent.AH_MANIFEST_CHANGED, {
+            "added": len(diff.added), "removed": len(diff.removed), "changed": changed, "requeued": requeued
+        }))
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0 # reported by preflight validation
+
+    def _measure_sizes(self) -> None:
+        """
+        Sizes of the asset files by rows of the pending index are measured in the background, dispatching starts
+        in the manifest order meanwhile(see _apply_dispatch_order). "size" of the manifest entry is used if present(see build_manifest),
+        other files are checked in the thread pool. Uploaded and dead assets are not checked(size 0)
+        """
+        if self.dispatch_order == "manifest":
+            return
+        index = self.pending_index
+        asset_ids = list(index.asset_ids())
+        rows = {asset_id: row for row, asset_id in enumerate(asset_ids) if not index.is_uploaded(asset_id) and not index.is_dead(asset_id)}
+        use_absolute_path = self.collection_config.use_absolute_path is not False
+
+        def measure() -> array:
+            sizes = array("q", [0]) * len(asset_ids)
+            missing_rows, missing_paths = [], []
+            for asset_id, file_name, path, size in self.manifest.file_entries():
+                row = rows.pop(asset_id, None)
+                if row is None:
+                    continue # duplicated id, or asset is already uploaded
+                if size is not None:
+                    sizes[row] = size
+                    continue
+                file_path = ManifestFingerprints.asset_path(self.collection_dir, file_name, path, use_absolute_path)
+                if file_path is not None:
+                    missing_rows.append(row)
+                    missing_paths.append(file_path)
+            with ThreadPoolExecutor(max_workers=self.preflight_workers, thread_name_prefix="MNU-Sizes") as executor:
+                for row, size in zip(missing_rows, executor.map(self._file_size, missing_paths, chunksize=256)):
+                    sizes[row] = size
+            return sizes
+
+        self._sizes_measure = self._submit_background(measure)
+
+    def _apply_dispatch_order(self) -> None:
+        """Reorder pending assets by file sizes, when they are measured. See assets_manage.dispatch_order"""
+        if self._sizes_measure is None or not self._sizes_measure.done():
+            return
+        sizes_measure, self._sizes_measure = self._sizes_measure, None
+        try:
+            sizes = sizes_measure.result()
+        except self.manifest_read_errors:
+            return # manifest was rewritten meanwhile, manifest order is kept
+        if self.stop_event.is_set():
+            return
+        rows_count = len(self.pending_index)
+        if len(sizes) < rows_count: # assets found by watch mode meanwhile
+            sizes.extend([0]*(rows_count-len(sizes)))
+        self.pending_index.set_order(DISPATCH_ORDERS[self.dispatch_order](sizes, self.active_workers))
+
+    def _get_asset_for_uploading(self) -> Optional[SingleAssetData]:
         """
-        Searching for not uploaded asset and returning it
+        Searching for not uploaded asset with valid file and returning it. Lease is issued for returned asset
 
         :return: Asset data for upload
         """
-        #TODO: use iterator for finding not uploaded asset
-        for asset_name, data in self.manifest_data["assets_data"].items():
-            if not data.get("upload_in_progress", False) and data["id"] not in self.uploaded_assets_ids:
-                self.manifest_data["assets_data"][asset_name]["upload_in_progress"] = True
-                return data
-        return None
+        while True:
+            asset_id = self.pending_index.pop_next(self.lease_time)
+            if asset_id is None:
+                return None
+            if self.read_ahead is not None:
+                self.read_ahead.dispatched(asset_id)
+                self._read_ahead_lookahead()
+            if self.staging is not None:
+                self._staging_lookahead(asset_id)
+            asset, validation = self._preflight_window.pop(asset_id, (None, None))
+            if asset is None:
+                try:
+                    asset = self._asset_holder(asset_id)
+                except self.manifest_read_errors as e: # retried later, manifest may be rewritten meanwhile
+                    self.asset_uploading_failed(asset_id, f"Manifest entry can`t be read: {e!r}")
+                    continue
+            if self.preflight is None:
+                return self._use_staged_file(asset)
+
+            if validation is None:
+                validation = self.preflight.submit(asset.path)
+            self._preflight_lookahead()
+            result = validation.result() # type: PreflightResult
+            if result.valid:
+                return self._use_staged_file(asset)
+            self._reject_asset(asset_id, result)
+
+    def _reap_expired_leases(self) -> None:
+        """Return assets with expired leases to the queue. See PendingAssetsIndex.reap_expired"""
+        now = time.monotonic()
+        if now < self._next_lease_reap:
+            return
+        self._next_lease_reap = now + self.lease_reap_interval
+        reaped = self.pending_index.reap_expired()
+        if self.staging is not None:
+            for asset_id in reaped:
+                self.staging.unlock(asset_id)
+        if reaped:
+            self.output_bus.put(EventHolder(ServerEvent.AH_ASSETS_LEASES_EXPIRED, reaped))
+
+    def _append_new_files(self) -> None:
+        """
+        Append files added to the collection dir to the manifest(see assets_manage.build_manifest).
+        Only modified dirs are listed again and files of the manifest are tracked between the scans,
+        so the manifest is read once. New files are described in this(background) thread
+        """
+        collection_files = list(scan_collection_dir(self.collection_dir, self._dir_listings))
+        listing = hash(tuple(collection_files))
+        if listing == self._collection_files:
+            return
+        manifest_path = self.collection_manifest_stream if isinstance(self.manifest, StreamingManifest) else self.collection_manifest
+        if self._known_files is None:
+            self._known_files, self._next_asset_id = manifest_files(manifest_path)
+        try:
+            added, _ = build_manifest(
+                self.collection_dir, manifest_path, incremental=True, workers=0,
+                files=collection_files, known_files=self._known_files, next_id=self._next_asset_id
+            )
+        except BaseException:
+            self._known_files = None # partially appended manifest is read again
+            raise
+        self._next_asset_id += added
+        self._collection_files = listing
+
+    def _scan_collection_dir(self) -> bool:
+        """
+        Collection dir is scanned in the background(new files are hashed), so producer is not blocked.
+        Scan and manifest refresh alternate on the watch checks
+
+        :return: True if scan is finished and manifest may be refreshed
+        """
+        if self._dir_scan is None:
+            self._dir_scan = self._submit_background(self._append_new_files)
+            return False
+        if not self._dir_scan.done():
+            return False
+        dir_scan, self._dir_scan = self._dir_scan, None
+        dir_scan.result() # errors of the scan are raised on the producer thread
+        return True
+
+    def _remap_manifest_keys(self) -> None:
+        """
+        Manifest was rewritten(not appended): keys of the known assets are taken from the new manifest.
+        Not uploaded assets removed from the manifest are rejected
+        """
+        self._manifest_keys_version = self.manifest.keys_version
+        self._preflight_window.clear() # holders of the previous entries
+        for asset_id in self.pending_index.remap_keys(self.manifest.entries()):
+            if self.pending_index.is_uploaded(asset_id) or self.pending_index.is_dead(asset_id):
+                continue
+            self.pending_index.mark_rejected(asset_id)
+            if self.staging is not None:
+                self.staging.release(asset_id)
+            self.output_bus.put(EventHolder(ServerEvent.AH_ASSET_REJECTED, UploadErrorHolder(asset_id, "Removed from the manifest")))
+
+    def _watch_manifest(self) -> int:
+        """
+        Queue assets added to the manifest since the last check. See watch_mode
+
+        :return: Amount of queued assets
+        """
+        now = time.monotonic()
+        dir_scan_done = self._dir_scan is not None and self._dir_scan.done() # manifest is refreshed without waiting
+        if self.watch_mode == "off" or (now < self._next_watch and not dir_scan_done):
+            return 0
+        self._next_watch = now + self.watch_interval
+        try:
+            if self.watch_mode == "dir" and not self._scan_collection_dir():
+                return 0
+            new_entries = self.manifest.refresh()
+        except (OSError, ManifestFileCorrupted):
+            return 0 # manifest is being written, next check will pick up changes
+        if self.manifest.keys_version != self._manifest_keys_version:
+            self._remap_manifest_keys()
+        queued = sum(self.pending_index.add(manifest_key, asset_id) for manifest_key, asset_id in new_entries)
+        if queued:
+            self.output_bus.put(EventHolder(ServerEvent.AH_NEW_ASSETS_FOUND, queued))
+            self._wake_producer()
+        return queued
+
+    @property
+    def uploaded_assets_ids(self) -> set:
+        return self.pending_index.uploaded_ids
 
     @property
     def uploaded_assets_count(self):
-        return len(self.uploaded_assets_ids)
+        return self.pending_index.uploaded_count
 
     @property
     def assets_count(self):
-        return len(self.manifest_data["assets_data"])
+        return len(self.manifest)
 
     def start(self, emulate_recaptcha_workers=True) -> None:
+        if self.collection_config.detect_changes:
+            self._detect_changes()
+        if (self.collection_config.duplicate_assets or "off") != "off":
+            self._find_duplicates()
+        self._measure_sizes()
+
         if emulate_recaptcha_workers:
-            threshold = 0.1
             recaptcha_token = RecaptchaTokenHolder(self.workers_emulate_data, can_be_expire=False)
+            bus = self.assets_uploader_bus
+            assets_are_over = False # reported once, until new assets are found
             while not self.stop_event.is_set():
-                if self.assets_uploader_bus.qsize() < 20:
-                    asset_data = self._get_image_data_for_uploading()
-                    if asset_data is not None:
-                        self.assets_uploader_bus.put(
-                            EventHolder(
-                                ServerEvent.INCOMING_TOKEN,
-                                UploadDataHolder(
-                                    recaptcha_token,
-                                    self.AssetHolderClass(
-                                        asset_data,
-                                        collection_info=self.collection_config.dict_like
-                                    )
-                                )
-                            )
+                self._reap_expired_leases()
+                self._background_done = False
+                self._apply_duplicates()
+                self._apply_dispatch_order()
+                self._apply_changes()
+                if self._watch_manifest():
+                    assets_are_over = False
+                # predicate is evaluated under Queue.mutex, so internal _qsize is used(qsize() would deadlock)
+                if not self._wait_producer_wakeup(lambda: bus._qsize() < self.prefetch_depth):
+                    continue
+                produce_start = time.monotonic()
+                asset = self._get_asset_for_uploading()
+                if asset is not None:
+                    bus.put(
+                        EventHolder(
+                            ServerEvent.INCOMING_TOKEN,
+                            UploadDataHolder(recaptcha_token, asset, self.pending_index.lease(asset.id))
                         )
-                    else:
-                        self.output_bus.put(EventHolder(ServerEvent.AH_ASSETS_ARE_OVER))
-                        break
+                    )
+                    self.produce_latency = self._ewma(self.produce_latency, time.monotonic()-produce_start, self.latency_smoothing)
+                elif self.pending_index.in_progress_count > 0 or self.pending_index.retry_count > 0:
+                    # leased assets may return to the queue(failed or expired), failed assets wait for retry.
+                    # New retry may be due before the current timeout, so wait is recalculated
+                    retry_count = self.pending_index.retry_count
+                    self._wait_producer_wakeup(lambda: self.pending_index.pending_count > 0 or self.pending_index.retry_count != retry_count)
+                elif self._changes_detection is not None:
+                    self._wait_producer_wakeup(lambda: False) # changed dead assets may return to the queue
                 else:
-                    time.sleep(0.5)
-                    continue
-                time.sleep(threshold)
+                    if not assets_are_over:
+                        if self.read_ahead is not None:
+                            self.output_bus.put(EventHolder(ServerEvent.AH_READ_AHEAD_STATS, self.read_ahead.stats))
+                        if self.staging is not None:
+                            self.output_bus.put(EventHolder(ServerEvent.AH_STAGING_STATS, self.staging.stats))
+                        self.output_bus.put(EventHolder(ServerEvent.AH_ASSETS_ARE_OVER, {"watching": self.watch_mode != "off"}))
+                        assets_are_over = True
+                    if self.watch_mode == "off":
+                        break
+                    # drivers stay warm, new assets are picked up by _watch_manifest
+                    self._wait_producer_wakeup(lambda: self.pending_index.pending_count > 0)
         else:
             while not self.stop_event.is_set():
                 try:
@@ -187,7 +744,18 @@ class AssetsHandler:
 
     def stop(self) -> None:
         self.stop_event.set()
+        self._wake_producer()
         self.assets_handler_thread.join()
+        if self._background is not None:
+            self._background.shutdown(wait=True, cancel_futures=True)
+        if self.preflight is not None:
+            self.preflight.close()
+        if self.read_ahead is not None:
+            self.read_ahead.close()
+        if self.staging is not None:
+            self.staging.close()
+        self.manifest.close()
+        self.data_keeper.stop()
 
 
 if __name__ == "__main__":
@@ -1,29 +1,62 @@
 from events import ServerEvent as SE, EventHolder
-from data_holders import UploadDataHolder
-from driver_init import init_driver_before_success, driver_upload_asset, MNUDriverInitError
-from config import MetamaskConfig, CollectionConfig
+from data_holders import UploadDataHolder, UploadErrorHolder, UploadResponseHolder
+from driver_init import MNUDriverInitError
+from config import CollectionConfig
 from assets_manage.assets_handler import AssetsHandler
+from assets_manage.upload_backends import UploadBackend, BackendFactory, UPLOAD_BACKENDS
+from assets_manage.rate_limiter import TokenBucketLimiter
+from assets_manage.exceptions import UnknownUploadBackend
 from mnu_utils import console
 
-from typing import Union, Literal, Dict
-from time import time as UnixTimestamp
+from dataclasses import dataclass
+from functools import partial
+from typing import Union, Literal, Dict, Optional
+from time import time as UnixTimestamp, monotonic
 from threading import Thread, Event, Lock
 from queue import Queue, Empty as QueueEmptyException
 
-from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
 from selenium.common.exceptions import TimeoutException
 
 from urllib3.exceptions import HTTPError
 
 
+@dataclass
+class UploadInFlight:
+    payload: UploadDataHolder
+    deadline: float # time.monotonic()
+
+
+class StandbyInitBus:
+    """
+    Output bus of the backend init of the standby worker. Readiness of the not activated worker is reported
+    as WORKER_STANDBY, so it is not counted as initialization of the active driver
+    """
+
+    def __init__(self, worker: "DriverInstance") -> None:
+        self.worker = worker
+
+    def put(self, event: EventHolder) -> None:
+        if event.check(SE.WORKER_READY) and not self.worker.activated.is_set():
+            self.worker.standby_reported = True
+            event = EventHolder(SE.WORKER_STANDBY, event.payload)
+        self.worker.output_bus.put(event)
+
+
 class DriverInstance:
     """
     Class of workers, which will upload assets
+
+    Worker uploads up to backend.slots assets concurrently. Each upload takes a token of the rate limiter(shared by workers)
+    Standby worker initializes the backend and waits for activation, before taking assets
     """
 
-    DriverStatus = Literal["Created", "Working", "Stopped", "Error"]
+    DriverStatus = Literal["Created", "Standby", "Working", "Stopped", "Error"]
+
+    poll_interval: float = 1 # seconds, max waiting for the completed uploads while some slots are free
+    max_backend_failures: int = 3 # consecutive failures of the backend(all started uploads are lost), then worker is stopped as crashed
 
-    def __init__(self, input_bus: Queue, output_bus: Queue, auth_lock: Lock, input_bus_lock: Event, worker_id: int) -> None:
+    def __init__(self, input_bus: Queue, output_bus: Queue, auth_lock: Lock, input_bus_lock: Event, worker_id: int, backend: UploadBackend,
+                 max_upload_time: float = 60, rate_limiter: Optional[TokenBucketLimiter] = None, standby: bool = False) -> None:
         self.status         = "Created" # type: DriverInstance.DriverStatus
 
         self.input_bus      = input_bus
@@ -32,11 +65,19 @@ class DriverInstance:
         self.input_bus_lock = input_bus_lock
 
         self.worker_id = worker_id
+        self.max_upload_time = max_upload_time # type: float # seconds
 
-        self.driver = None # type: Union[RemoteWebDriver, None]
+        self.backend = backend # type: UploadBackend # see assets_manage.upload_backends
+        self.rate_limiter = rate_limiter # type: Optional[TokenBucketLimiter] # see assets_manage.rate_limiter
+        self.in_flight = dict() # type: Dict[int, UploadInFlight] # slot -> started upload
+        self.backend_failures = 0 # type: int # consecutive, see max_backend_failures
         self.driver_init_time = None # type: Union[int, None] # UnixTimestamp
+        self.standby_reported = False # type: bool # readiness was reported as WORKER_STANDBY, see StandbyInitBus
 
         self.close_event = Event()
+        self.activated = Event() # standby worker starts taking assets
+        if not standby:
+            self.activated.set()
         #self._prepare_for_work()
         self.working_thread = Thread(name=f"MNU-Worker-{self.worker_id}", target=self._prepare_for_work)
         self.working_thread.start()
@@ -48,84 +89,175 @@ class DriverInstance:
         :param join_thread: Indicates to wait until the main thread will completed
         """
         self.close_event.set()
+        self.activated.set() # standby worker is closed without taking assets
         if join_thread:
             self.working_thread.join()
 
+    def activate(self) -> None:
+        """Standby worker starts taking assets(immediately if backend is initialized)"""
+        self.activated.set()
+
     def _prepare_for_work(self) -> None:
         """Configure driver and start listen for events"""
         self.output_bus.put(EventHolder(SE.WORKER_PREPARE, self.worker_id))
         try:
-            self._configure()
+            if not self._configure():
+                self.status = "Error"
+                self.close_event.set()
+                self.backend.close()
+                self.output_bus.put(EventHolder(SE.WORKER_STOPPED, self.worker_id))
+                return
         except HTTPError as e:
             console.log(f"App was closed before, driver(worker_id={self.worker_id}) was initialized. You may close Browser by yourself", style="yellow")
         except MNUDriverInitError as e:
             self.close_event.set()
             self.status = "Error"
+            self.output_bus.put(EventHolder(SE.WORKER_STOPPED, self.worker_id))
             return
 
+        if not self.activated.is_set():
+            self.status = "Standby"
+            self.activated.wait()
+        if self.standby_reported and not self.close_event.is_set():
+            self.output_bus.put(EventHolder(SE.WORKER_READY, self.worker_id)) # activated, init time was reported by WORKER_STANDBY
         self._listen_events()
 
-    def _configure(self) -> None:
-        self.driver = init_driver_before_success(
-            self.worker_id,
-            self.output_bus,
-            MetamaskConfig().secret_phase,
-            MetamaskConfig().temp_password,
-            auth_lock=self.auth_lock
-        )
-
+    def _configure(self) -> bool:
+        """
+        :return: True if backend is ready
+        """
+        init_bus = self.output_bus if self.activated.is_set() else StandbyInitBus(self)
+        if not self.backend.init(self.worker_id, init_bus, self.auth_lock):
+            return False
         self.driver_init_time = UnixTimestamp()
+        return True
 
     def _listen_events(self) -> None:
         self.status = "Working"
-        while not self.close_event.is_set():
-
-            if not self.input_bus_lock.wait(2):
-                continue
-            try:
-                incoming_event = self.input_bus.get(timeout=2)
-            except QueueEmptyException:
-                continue
-
-            if not isinstance(incoming_event, EventHolder):
-                self.output_bus.put(EventHolder(SE.WORKER_RECEIVED_NON_EVENT_HOLDER_OBJECT))
-                continue
-
-            if incoming_event.check(SE.INCOMING_TOKEN):
-                incoming_payload = incoming_event.payload # type: UploadDataHolder
-
-                if not isinstance(incoming_payload, UploadDataHolder):
-                    self.output_bus.put(EventHolder(SE.WORKER_RECEIVED_NON_U_D_HOLDER_OBJECT))
-                    continue
-
-                if incoming_payload.token_expired:
-                    self.output_bus.put(EventHolder(SE.WORKER_TOKEN_EXPIRED, incoming_payload.token))
-                    continue
-                self._try_upload(incoming_payload)
-
-        if self.close_event.is_set():
-            self.output_bus.put(EventHolder(SE.WORKER_STOPPED, self.worker_id))
+        try:
+            while not self.close_event.is_set():
+                free_slot = next((slot for slot in range(self.backend.slots) if slot not in self.in_flight), None)
+                if free_slot is not None:
+                    incoming_payload = self._next_payload(block=not self.in_flight)
+                    if incoming_payload is not None:
+                        self._start_upload(free_slot, incoming_payload)
+                        continue # fill other free slots first
+                if self.in_flight:
+                    self._collect_uploads()
+            self._drain_uploads()
             self.status = "Stopped"
+        except Exception as e: # crashed worker is replaced by the upload manager(see replace_failed_drivers)
+            console.log(f"[red]Driver(worker_id={self.worker_id}) crashed: {e!r}[/]")
+            for upload in self.in_flight.values():
+                self.output_bus.put(EventHolder(SE.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD, UploadErrorHolder(upload.payload.asset_id, repr(e))))
+            self.in_flight.clear()
+            self.close_event.set()
+            self.status = "Error"
+
+        self.output_bus.put(EventHolder(SE.WORKER_STOPPED, self.worker_id))
+        self.backend.close()
 
-        if self.driver is not None:
-            self.driver.quit()
+    def _drain_uploads(self) -> None:
+        """
+        Worker is closing: wait for the started uploads(up to their deadlines) and report them before the backend is closed,
+        so uploads already accepted by the server are recorded and not uploaded again after the lease expiry
+        """
+        while self.in_flight:
+            self._collect_uploads()
 
-    def _try_upload(self, incoming_payload: UploadDataHolder) -> None:
-        asset_id = incoming_payload.asset_id
+    def _next_payload(self, block: bool) -> Optional[UploadDataHolder]:
+        """
+        Take asset for the free slot. Token of the rate limiter is taken first, so lease of the asset is not spent on waiting
 
+        :param block: Wait for the asset(and the token) up to 2 seconds
+        :return: Asset with claimed lease, None if nothing to upload now
+        """
+        timeout = 2 if block else 0
+        if not self.input_bus_lock.wait(timeout):
+            return None
+        if self.rate_limiter is not None and not self.rate_limiter.acquire(timeout):
+            return None
+        try:
+            incoming_event = self.input_bus.get(block, timeout=timeout)
+        except QueueEmptyException:
+            incoming_event = None
+        incoming_payload = self._accept_event(incoming_event) if incoming_event is not None else None
+        if incoming_payload is None and self.rate_limiter is not None:
+            self.rate_limiter.refund()
+        return incoming_payload
+
+    def _accept_event(self, incoming_event: EventHolder) -> Optional[UploadDataHolder]:
+        if not isinstance(incoming_event, EventHolder):
+            self.output_bus.put(EventHolder(SE.WORKER_RECEIVED_NON_EVENT_HOLDER_OBJECT))
+            return None
+
+        if incoming_event.check(SE.INCOMING_TOKEN):
+            incoming_payload = incoming_event.payload # type: UploadDataHolder
+
+            if not isinstance(incoming_payload, UploadDataHolder):
+                self.output_bus.put(EventHolder(SE.WORKER_RECEIVED_NON_U_D_HOLDER_OBJECT))
+                return None
+
+            if incoming_payload.token_expired:
+                self.output_bus.put(EventHolder(SE.WORKER_TOKEN_EXPIRED, incoming_payload.token))
+                return None
+            if not incoming_payload.claim_lease():
+                return None # lease expired, asset was already returned to the queue
+            return incoming_payload
+        return None
+
+    def _start_upload(self, slot: int, incoming_payload: UploadDataHolder) -> None:
         try:
-            upload_response = driver_upload_asset(
-                asset_data=incoming_payload.asset_data_for_upload,
-                asset_id=asset_id,
-                asset_abs_file_path=incoming_payload.file_path,
-                driver=self.driver,
-                wait_in_sec=CollectionConfig().max_upload_time
-            )
-            self.output_bus.put(EventHolder(SE.WORKER_COMPLETED_UPLOAD, upload_response))
-        except TimeoutException:
-            self.output_bus.put(EventHolder(SE.WORKER_UPLOAD_TIMEOUT_EXCEPTION, asset_id))
-        except Exception:
-            self.output_bus.put(EventHolder(SE.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD, asset_id))
+            self.backend.start_upload(incoming_payload, slot)
+        except Exception as e:
+            self.output_bus.put(EventHolder(SE.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD, UploadErrorHolder(incoming_payload.asset_id, repr(e))))
+            return
+        self.in_flight[slot] = UploadInFlight(incoming_payload, monotonic() + self.max_upload_time)
+
+    def _collect_uploads(self) -> None:
+        """Wait for the completed uploads(until the nearest deadline, or poll_interval if some slots are free) and report them"""
+        timeout = min(upload.deadline for upload in self.in_flight.values()) - monotonic()
+        if len(self.in_flight) < self.backend.slots:
+            timeout = min(timeout, self.poll_interval)
+            token_in = self.rate_limiter.time_to_token() if self.rate_limiter is not None else 0
+            if token_in > 0: # free slot waits for the token, not for the asset
+                timeout = min(timeout, token_in)
+        try:
+            completed = self.backend.wait_uploads(max(timeout, 0))
+        except Exception as e:
+            self.backend_failures += 1
+            if self.backend_failures >= self.max_backend_failures:
+                raise e
+            for upload in self.in_flight.values():
+                self.output_bus.put(EventHolder(SE.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD, UploadErrorHolder(upload.payload.asset_id, repr(e))))
+            self.in_flight.clear()
+            return
+        self.backend_failures = 0
+
+        for slot, result in completed.items():
+            asset_id = self.in_flight.pop(slot).payload.asset_id
+            if isinstance(result, (TimeoutException, TimeoutError)):
+                self.output_bus.put(EventHolder(SE.WORKER_UPLOAD_TIMEOUT_EXCEPTION, UploadErrorHolder(asset_id, "Upload timeout")))
+            elif isinstance(result, Exception):
+                self.output_bus.put(EventHolder(SE.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD, UploadErrorHolder(asset_id, repr(result))))
+            else:
+                self._adapt_rate(result)
+                self.output_bus.put(EventHolder(SE.WORKER_COMPLETED_UPLOAD, result))
+
+        now = monotonic()
+        for slot in [slot for slot, upload in self.in_flight.items() if upload.deadline <= now]:
+            asset_id = self.in_flight.pop(slot).payload.asset_id
+            self.backend.abort_upload(slot)
+            self.output_bus.put(EventHolder(SE.WORKER_UPLOAD_TIMEOUT_EXCEPTION, UploadErrorHolder(asset_id, "Upload timeout")))
+
+    def _adapt_rate(self, upload_response: UploadResponseHolder) -> None:
+        if self.rate_limiter is None:
+            return
+        if upload_response.throttled:
+            if self.rate_limiter.throttled():
+                self.output_bus.put(EventHolder(SE.WORKER_UPLOAD_THROTTLED, {"id": self.worker_id, "rate": self.rate_limiter.rate_per_minute}))
+        elif upload_response.successes:
+            self.rate_limiter.succeeded()
 
 
 class AssetsUploadManager:
@@ -135,7 +267,25 @@ class AssetsUploadManager:
 
     _maximum_drivers = 4
 
-    def __init__(self, server_event_bus: Queue) -> None:
+    def __init__(self, server_event_bus: Queue, backend_factory: Optional[BackendFactory] = None, collection_config: Optional[CollectionConfig] = None) -> None:
+        """
+        :param backend_factory: Creates backend for each driver. By default upload_backend(with upload_slots) of the collection config is used
+        :param collection_config: See AssetsHandler
+        """
+        collection_config = collection_config if collection_config is not None else CollectionConfig()
+        self.max_upload_time = collection_config.max_upload_time or 60 # type: float
+        if backend_factory is None:
+            backend_name = collection_config.upload_backend or "selenium"
+            if backend_name not in UPLOAD_BACKENDS:
+                raise UnknownUploadBackend(backend_name, list(UPLOAD_BACKENDS))
+            backend_factory = partial(UPLOAD_BACKENDS[backend_name], slots=collection_config.upload_slots or 1, max_upload_time=self.max_upload_time)
+        self.backend_factory = backend_factory # type: BackendFactory
+
+        self.standby_drivers = collection_config.standby_drivers or 0 # type: int # initialized drivers kept ready for add_driver
+        self.rate_limiter = None # type: Optional[TokenBucketLimiter] # shared by drivers
+        if collection_config.upload_rate_limit:
+            self.rate_limiter = TokenBucketLimiter.per_minute(collection_config.upload_rate_limit)
+
         self.workers_bus = Queue() # type: Queue[EventHolder] # pushing to this queue assets nested in a UploadDataHolder # EventHolder(SE.INCOMING_TOKEN, payload=UploadDataHolder())
         self.output_bus = server_event_bus
 
@@ -144,10 +294,11 @@ class AssetsUploadManager:
 
         self.lock_drivers_input_bus()
 
-        self.last_worker_id = 0 # type: int
+        self.last_worker_id = 0 # type: int # id of the next driver
         self.workers_pool = dict() # type: Dict[int, DriverInstance]
+        self.standby_pool = dict() # type: Dict[int, DriverInstance] # drivers which don't take assets until activation
 
-        self.assets_handler = AssetsHandler(self.workers_bus, self.output_bus)
+        self.assets_handler = AssetsHandler(self.workers_bus, self.output_bus, collection_config=collection_config)
 
     def init_drivers(self, amount: int = 1) -> None:
         if len(self.workers_pool)<1:
@@ -162,19 +313,77 @@ class AssetsUploadManager:
         for i in range(amount):
             self.add_driver()
 
+    def _new_driver(self, standby: bool = False) -> DriverInstance:
+        driver = DriverInstance(
+            self.workers_bus,
+            self.output_bus,
+            self.auth_lock,
+            self.workers_bus_lock,
+            self.last_worker_id,
+            self.backend_factory(),
+            max_upload_time=self.max_upload_time,
+            rate_limiter=self.rate_limiter,
+            standby=standby
+        )
+        self.last_worker_id+=1
+        return driver
+
+    def fill_standby(self) -> None:
+        """
+        Start standby drivers up to standby_drivers. Drivers are initialized in their threads.
+        Standby drivers failed initialization are dropped
+        """
+        for worker_id in [worker_id for worker_id, driver in self.standby_pool.items() if driver.status in ("Error", "Stopped")]:
+            self.standby_pool.pop(worker_id)
+        while len(self.standby_pool) < self.standby_drivers:
+            driver = self._new_driver(standby=True)
+            self.standby_pool[driver.worker_id] = driver
+
+    def _activate_standby(self) -> Optional[DriverInstance]:
+        """
+        :return: Activated standby driver(initialized first), None if there are no standby drivers
+        """
+        candidates = [worker_id for worker_id, driver in self.standby_pool.items() if driver.status in ("Standby", "Created")]
+        if not candidates:
+            return None
+        worker_id = min(candidates, key=lambda i: self.standby_pool[i].status != "Standby")
+        driver = self.standby_pool.pop(worker_id)
+        driver.activate()
+        self.fill_standby()
+        return driver
+
     def add_driver(self) -> None:
+        """Activate standby driver, or start new one. Standby pool is refilled in background"""
         if self.drivers_count+1 <= self.maximum_drivers:
-            self.workers_pool[self.last_worker_id] = DriverInstance(
-                self.workers_bus,
-                self.output_bus,
-                self.auth_lock,
-                self.workers_bus_lock,
-                self.last_worker_id
-            )
-            self.last_worker_id+=1
+            driver = self._activate_standby() or self._new_driver()
+            self.workers_pool[driver.worker_id] = driver
+            self.assets_handler.set_active_workers(self.upload_slots_count)
+            self.fill_standby()
         else:
             console.log("[yellow]Drivers limit exceed[/]")
 
+    def replace_failed_drivers(self) -> int:
+        """
+        Remove dead drivers(failed initialization, crashed or stopped) from the pool, replace them by the standby drivers(if any)
+
+        :return: Amount of replaced drivers
+        """
+        failed = [
+            worker_id for worker_id, driver in self.workers_pool.items()
+            if driver.status in ("Error", "Stopped") or not driver.working_thread.is_alive()
+        ]
+        replaced = 0
+        for worker_id in failed:
+            self.workers_pool.pop(worker_id)
+            driver = self._activate_standby()
+            if driver is not None:
+                self.workers_pool[driver.worker_id] = driver
+                replaced += 1
+        if failed:
+            self.assets_handler.set_active_workers(self.upload_slots_count)
+            self.fill_standby()
+        return replaced
+
     def stop_drivers(self, amount: int = 1) -> None:
         """Stop a certain amount of drivers"""
         amount = amount if amount <= self.drivers_count else self.drivers_count
@@ -183,8 +392,9 @@ class AssetsUploadManager:
 
     def stop_last_drive(self) -> None:
         if self.drivers_count>0:
-            self.last_worker_id -= 1
-            self.workers_pool.pop(self.last_worker_id).close(join_thread=False)
+            worker_id, driver = self.workers_pool.popitem() # last added
+            driver.close(join_thread=False)
+            self.assets_handler.set_active_workers(self.upload_slots_count)
 
     def stop_target_driver(self, driver_id: str) -> None:
         """
@@ -198,14 +408,20 @@ class AssetsUploadManager:
 
         for driver in self.workers_pool.values():
             driver.close(join_thread=True)
-        self.last_worker_id = 0
         self.workers_pool.clear()
+        self.assets_handler.set_active_workers(0)
+
+    def close_standby_drivers(self) -> None:
+        for driver in self.standby_pool.values():
+            driver.close(join_thread=True)
+        self.standby_pool.clear()
 
     def on_stop(self):
         """Called when app is closing"""
         self.lock_drivers_input_bus()
         self.assets_handler.stop()
         self.close_drivers()
+        self.close_standby_drivers()
 
     def lock_drivers_input_bus(self) -> None:
         self.workers_bus_lock.clear()
@@ -227,6 +443,16 @@ class AssetsUploadManager:
     def drivers_count(self) -> int:
         return len(self.workers_pool)
 
+    @property
+    def standby_drivers_count(self) -> int:
+        """Standby drivers ready for activation"""
+        return sum(driver.status == "Standby" for driver in self.standby_pool.values())
+
+    @property
+    def upload_slots_count(self) -> int:
+        """Concurrent uploads of all drivers"""
+        return sum(worker.backend.slots for worker in self.workers_pool.values())
+
     @property
     def maximum_drivers(self) -> int:
         return self._maximum_drivers
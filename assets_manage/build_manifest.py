@@ -0,0 +1,320 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from typing import Optional, Iterator, Iterable, Tuple, List, Set
+
+import os
+import re
+import json
+
+from assets_manage.manifest import InMemoryManifest, StreamingManifest
+from assets_manage.preflight import sniff_media_type, read_head
+from assets_manage.content_index import file_sha256
+
+
+MNU_FILES_PREFIX = ( # files of MNU in the collection dir(see assets_handler.AssetsHandler)
+    "0manifest", "0data_keeper", "0dead_letters", "0preflight", "0content_hashes", "0duplicates_report", "0fingerprints"
+)
+MNU_FILES_SUFFIX = (".idx", ".mnuc", ".tmp") # manifest index, cache, files being written
+METADATA_SUFFIX = ".json" # sidecar with traits: ASSET_FILE_STEM.json
+
+
+def _natural_key(path: str) -> list:
+    """asset_2.png < asset_10.png"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", path)]
+
+
+def is_ignored_file(name: str) -> bool:
+    """
+    :return: True for MNU files and hidden files. Other files(e.g. 0.png, 007.png) are candidates
+    """
+    return name.startswith(".") or name.startswith(MNU_FILES_PREFIX) or name.endswith(MNU_FILES_SUFFIX)
+
+
+def scan_collection_dir(collection_dir: str, listings: Optional[dict] = None) -> Iterator[str]:
+    """
+    Recursive scan of the collection dir via os.scandir
+
+    :param listings: Listings of the previous scan({relative dir: (st_mtime_ns, files, sub dirs)}), updated in place.
+                     Directories which were not modified since are not listed again
+    :return: Paths of candidate files relative to collection_dir, in natural order(per directory)
+    """
+    stack = [""]
+    visited = set()
+    while stack:
+        rel_dir = stack.pop()
+        dir_path = os.path.join(collection_dir, rel_dir)
+        listing = None
+        if listings is not None:
+            mtime_ns = os.stat(dir_path).st_mtime_ns # before listing: dir modified meanwhile is listed again next time
+            visited.add(rel_dir)
+            listing = listings.get(rel_dir, None)
+            if listing is not None and listing[0] != mtime_ns:
+                listing = None
+        if listing is None:
+            with os.scandir(dir_path) as entries:
+                entries = sorted((e for e in entries if not is_ignored_file(e.name)), key=lambda e: _natural_key(e.name))
+            files, sub_dirs = [], []
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    sub_dirs.append(rel_path)
+                elif entry.is_file() and not entry.name.endswith(METADATA_SUFFIX):
+                    files.append(rel_path)
+            if listings is not None:
+                listing = listings[rel_dir] = (mtime_ns, files, sub_dirs)
+        else:
+            _, files, sub_dirs = listing
+        yield from files
+        stack.extend(reversed(sub_dirs))
+    if listings is not None:
+        for rel_dir in listings.keys() - visited: # removed dirs
+            del listings[rel_dir]
+
+
+def extract_traits(metadata: dict) -> dict:
+    """
+    Convert ERC-721 metadata(as produced by common art generators) into asset "props"(see data_holders.SingleAssetData)
+        {"name": STR, "description": STR, "attributes": [{"trait_type": STR, "value": STR or NUMBER, "display_type": STR, "max_value": NUMBER}]}
+
+    String attributes become properties, numeric - levels(or stats with "display_type": "number")
+    """
+    props = dict()
+    for key in ("name", "description"):
+        if metadata.get(key, None):
+            props[key] = metadata[key]
+    properties, levels, stats = [], [], []
+    for attr in metadata.get("attributes", []):
+        if not isinstance(attr, dict) or "value" not in attr:
+            continue
+        name, value = str(attr.get("trait_type", "")), attr["value"]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            trait = {"name": name, "value": value, "max": attr.get("max_value", value)}
+            (stats if attr.get("display_type", None) == "number" else levels).append(trait)
+        else:
+            properties.append({"name": name, "value": str(value)})
+    for key, traits in (("properties", properties), ("levels", levels), ("stats", stats)):
+        if traits:
+            props[key] = traits
+    return props
+
+
+def describe_asset_file(task: Tuple[str, str, Optional[str], bool]) -> Optional[dict]:
+    """
+    Worker of the process pool
+
+    :param task: (collection dir, relative path, metadata dir or None, calculate hash)
+    :return: Asset entry without id, or None if file is not accepted for uploading
+    """
+    collection_dir, rel_path, metadata_dir, with_hash = task
+    path = os.path.abspath(os.path.join(collection_dir, rel_path))
+    try:
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            media_type = sniff_media_type(read_head(f), path)
+    except OSError:
+        return None
+    if media_type is None or stat.st_size == 0:
+        return None
+
+    entry = {"file_name": rel_path, "path": path, "size": stat.st_size, "media_type": media_type}
+    if with_hash:
+        entry["sha256"] = file_sha256(path)
+
+    stem = os.path.splitext(rel_path)[0]
+    metadata_path = os.path.join(metadata_dir, os.path.basename(stem)) if metadata_dir else os.path.join(collection_dir, stem)
+    try:
+        with open(metadata_path + METADATA_SUFFIX, "r") as f:
+            props = extract_traits(json.load(f))
+    except (OSError, ValueError, AttributeError):
+        props = None
+    if props:
+        entry["props"] = props
+    return entry
+
+
+def describe_asset_files(tasks: List[Tuple[str, str, Optional[str], bool]]) -> List[Optional[dict]]:
+    """Chunk of tasks for the single pool call. See describe_asset_file"""
+    return [describe_asset_file(task) for task in tasks]
+
+
+def _describe_in_pool(executor: ProcessPoolExecutor, tasks: Iterable[tuple], chunk_size: int, window: int) -> Iterator[Optional[dict]]:
+    """
+    Ordered results of describe_asset_file. Only `window` chunks are in flight,
+    so the scan, the pool and the writing go concurrently with bounded memory
+    """
+    tasks = iter(tasks)
+    in_flight = deque()
+    while True:
+        while len(in_flight) < window:
+            chunk = list(islice(tasks, chunk_size))
+            if not chunk:
+                break
+            in_flight.append(executor.submit(describe_asset_files, chunk))
+        if not in_flight:
+            return
+        yield from in_flight.popleft().result()
+
+
+def _existing_entries(manifest_path: str) -> List[Tuple[Optional[str], dict]]:
+    if manifest_path.endswith(".jsonl"):
+        manifest = StreamingManifest(manifest_path)
+        try:
+            return [(None, manifest.get(key)) for key, _ in manifest.entries()]
+        finally:
+            manifest.close()
+    manifest = InMemoryManifest.load(manifest_path, use_cache=False)
+    return [(manifest.asset_name(row), manifest.get(row)) for row, _ in manifest.entries()]
+
+
+def manifest_files(manifest_path: str) -> Tuple[Set[str], int]:
+    """
+    Files of the existing manifest for the incremental builds(see known_files of build_manifest).
+    Compiled cache of YAML manifest is used
+
+    :return: (normalized relative paths, next asset id)
+    """
+    manifest = StreamingManifest(manifest_path) if manifest_path.endswith(".jsonl") else InMemoryManifest.load(manifest_path)
+    try:
+        known_files, next_id = set(), 0
+        for asset_id, file_name, _, _ in manifest.file_entries():
+            known_files.add(os.path.normpath(file_name or ""))
+            next_id = max(next_id, asset_id + 1)
+        return known_files, next_id
+    finally:
+        manifest.close()
+
+
+def _yaml_append_offset(manifest_path: str) -> Optional[int]:
+    """
+    YAML manifest can be appended in place if "assets_data" is its last block(optionally followed by "assets_count"
+    as written by build_manifest) and entries are indented by 2 spaces
+
+    :return: Offset where new entries are written(trailing "assets_count" is overwritten), None if manifest must be rewritten
+    """
+    top_level = [] # type: List[Tuple[str, int]] # (key, offset of the line)
+    entries_indent = None # type: Optional[int]
+    offset = 0
+    with open(manifest_path, "rb") as f:
+        for line in f:
+            text = line.rstrip()
+            if text and not text.startswith(b"#"):
+                indent = len(text) - len(text.lstrip(b" "))
+                if indent == 0:
+                    top_level.append((text.split(b":", 1)[0].decode(errors="replace"), offset))
+                elif entries_indent is None and top_level and top_level[-1][0] == "assets_data":
+                    entries_indent = indent
+            offset += len(line)
+        if offset and line[-1:] != b"\n":
+            return None
+    if top_level and top_level[-1][0] == "assets_count":
+        offset = top_level.pop()[1]
+    if not top_level or top_level[-1][0] != "assets_data" or entries_indent not in (None, 2):
+        return None
+    return offset
+
+
+def build_manifest(collection_dir: str, manifest_path: str, incremental: bool = False, workers: Optional[int] = None,
+                   metadata_dir: Optional[str] = None, with_hash: bool = True, chunk_size: int = 64,
+                   files: Optional[Iterable[str]] = None, known_files: Optional[Set[str]] = None, next_id: int = 0) -> Tuple[int, int]:
+    """
+    Scan collection dir and write manifest. Files are described(type, hash, traits) in the process pool,
+    entries are written as soon as they are ready, in the scan order
+
+    :param manifest_path: Output. JSON Lines(.jsonl) - streaming manifest, otherwise YAML
+    :param incremental: Keep existing manifest and append only new files(in place, unless YAML manifest can`t be appended)
+    :param workers: Processes of the pool. Default: CPU count. 0 - files are described in the calling thread
+    :param metadata_dir: Directory with sidecar metadata files. By default they searched near asset files
+    :param with_hash: Calculate sha256 of files
+    :param files: Candidate files relative to collection_dir. By default collection dir is scanned
+    :param known_files: Files of the existing manifest with ids below next_id, tracked by the caller of the incremental
+                        builds(see manifest_files), so manifest is parsed only if it can`t be appended in place.
+                        Paths of the added files are added to the set
+    :return: (added assets, skipped files)
+    """
+    collection_dir = os.path.abspath(collection_dir)
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    manifest_exists = incremental and os.path.isfile(manifest_path)
+    if known_files is None:
+        known_files, next_id = manifest_files(manifest_path) if manifest_exists else (set(), 0)
+
+    as_jsonl = manifest_path.endswith(".jsonl")
+    append_offset = None # type: Optional[int]
+    if manifest_exists and known_files:
+        append_offset = os.path.getsize(manifest_path) if as_jsonl else _yaml_append_offset(manifest_path)
+    append_only = append_offset is not None
+    existing = _existing_entries(manifest_path) if manifest_exists and not append_only else []
+    existing_count = len(known_files) if append_only else len(existing)
+    out_path = manifest_path if append_only else manifest_path + ".tmp"
+
+    added = skipped = 0
+    tasks = (
+        (collection_dir, rel_path, metadata_dir, with_hash)
+        for rel_path in (scan_collection_dir(collection_dir) if files is None else files)
+        if os.path.normpath(rel_path) not in known_files
+    )
+    if append_only:
+        os.truncate(manifest_path, append_offset) # trailing "assets_count" of YAML is written again
+    with open(out_path, "a" if append_only else "w") as out, (ProcessPoolExecutor(max_workers=workers) if workers else nullcontext()) as executor:
+        def write_entry(asset_name: str, asset_data: dict) -> None:
+            if as_jsonl:
+                out.write(json.dumps({asset_name: asset_data}) + "\n")
+            else:
+                out.write(f"  {json.dumps(asset_name)}: {json.dumps(asset_data)}\n") # JSON is valid YAML flow style
+
+        if not as_jsonl and not append_only:
+            out.write("assets_data:\n")
+        if not append_only:
+            for asset_name, asset_data in existing:
+                write_entry(asset_name if asset_name is not None else f"asset {asset_data['id']}", asset_data)
+
+        entries = _describe_in_pool(executor, tasks, chunk_size, window=4*workers) if workers else map(describe_asset_file, tasks)
+        for entry in entries:
+            if entry is None:
+                skipped += 1
+                continue
+            write_entry(f"asset {next_id}", {"id": next_id, **entry})
+            known_files.add(os.path.normpath(entry["file_name"]))
+            next_id += 1
+            added += 1
+
+        if not as_jsonl:
+            out.write(f"assets_count: {existing_count + added}\n")
+    if not append_only:
+        os.replace(out_path, manifest_path)
+    return added, skipped
+
+
+if __name__ == "__main__":
+    """
+    run module:
+    >python -m assets_manage.build_manifest
+    >python -m assets_manage.build_manifest COLLECTION_DIR --incremental
+    """
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build manifest of the collection by scanning collection dir")
+    parser.add_argument("collection_dir", action="store", nargs="?", default=None, help="By default collection_dir_local_path from the config")
+    parser.add_argument("--output", help="Manifest path. Default: COLLECTION_DIR/0manifest.jsonl(use .yaml extension for YAML manifest)", default=None)
+    parser.add_argument("--incremental", help="Append only files which are not in the existing manifest", action="store_true", default=False)
+    parser.add_argument("--metadata-dir", help="Directory with ASSET_FILE_STEM.json metadata files(traits)", default=None)
+    parser.add_argument("--no-hash", help="Don`t calculate sha256 of files", action="store_true", default=False)
+    parser.add_argument("--workers", help="Processes of the pool. Default: CPU count, 0 - no pool", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.collection_dir is None:
+        from config import CollectionConfig
+        args.collection_dir = CollectionConfig().collection_dir_local_path
+
+    start = time.perf_counter()
+    added, skipped = build_manifest(
+        args.collection_dir,
+        args.output or os.path.join(args.collection_dir, "0manifest.jsonl"),
+        incremental=args.incremental,
+        workers=args.workers,
+        metadata_dir=args.metadata_dir,
+        with_hash=not args.no_hash
+    )
+    print(f"{added} assets added, {skipped} files skipped in {time.perf_counter()-start:.1f}s")
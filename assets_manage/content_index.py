@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from threading import Event
+from typing import Optional, Dict, List, Iterable, Tuple
+
+import os
+import hashlib
+
+from assets_manage.stat_cache import FileStatCache
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    content_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+class ContentHashIndex:
+    """
+    Index of asset files content(sha256). Used for searching assets with identical files
+
+    Files are hashed in the thread pool(hashlib releases GIL on big chunks).
+    Hashes are cached in the file by (path, size, mtime), so unchanged files are not rehashed
+    """
+
+    chunk_size: int = 1024 # files hashed between checks of the stop event
+
+    def __init__(self, cache_path: Optional[str] = None, workers: int = 4) -> None:
+        """
+        :param cache_path: Path to the cache file. Cache is not persisted if None
+        :param workers: Threads of the pool
+        """
+        self.workers = workers
+        self.hashes = dict() # type: Dict[int, str] # asset id -> sha256
+        self._cache = FileStatCache(cache_path)
+
+    def _hash(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+            cached = self._cache.get(path, stat)
+            if cached is not None:
+                return cached["sha256"]
+            content_hash = file_sha256(path)
+        except OSError:
+            return None # missing files are reported by preflight validation
+        self._cache.put(path, stat, {"sha256": content_hash})
+        return content_hash
+
+    def build(self, assets: Iterable[Tuple[int, str]], stop_event: Optional[Event] = None) -> Dict[int, str]:
+        """
+        :param assets: Iterable of (asset_id, absolute path to the asset file)
+        :param stop_event: Interrupts building. Index will be incomplete
+        :return: Asset id -> sha256 of the file. Not accessible files are skipped
+        """
+        assets = iter(assets)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="MNU-Hashing") as executor:
+                while stop_event is None or not stop_event.is_set():
+                    chunk = list(islice(assets, self.chunk_size))
+                    if not chunk:
+                        break
+                    asset_ids, paths = zip(*chunk)
+                    for asset_id, content_hash in zip(asset_ids, executor.map(self._hash, paths)):
+                        if content_hash is not None:
+                            self.hashes[asset_id] = content_hash
+        finally:
+            self._cache.close()
+        return self.hashes
+
+    def duplicates(self) -> Dict[str, List[int]]:
+        """
+        :return: sha256 -> ids of assets with identical files(in build order). Only hashes shared by several assets
+        """
+        groups = dict() # type: Dict[str, List[int]]
+        for asset_id, content_hash in self.hashes.items():
+            groups.setdefault(content_hash, []).append(asset_id)
+        return {content_hash: ids for content_hash, ids in groups.items() if len(ids) > 1}
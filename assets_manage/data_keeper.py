@@ -0,0 +1,440 @@
+from concurrent.futures import Future
+from queue import Queue, Empty as QueueEmptyException
+from threading import Thread, Condition
+from typing import Any, Callable, Iterable, Iterator, List, Literal, Optional, Tuple
+
+import os
+import re
+import json
+import time
+import zlib
+import yaml
+
+from assets_manage.exceptions import DataKeeperFileCorrupted
+
+
+class DataKeeper:
+    """
+    Journal of uploaded assets(blockchain data received after upload)
+
+    Append-only log, one record per line:
+        ASSET_ID: {JSON encoded data} #crc32:CHECKSUM
+    Checksum covers everything before " #crc32:". The whole file is still a valid YAML dict {asset_id: data}
+
+    Records are written by the dedicated thread. All records received while the previous commit
+    was in progress(or during flush interval) are written as a single group commit, so the caller never blocks on disk.
+    Until the commit completes, records exist only in memory
+
+    After each commit ids of written records are appended to the ids index(sidecar file),
+    followed by commit mark "@KEEPER_FILE_SIZE". On startup uploaded ids are read from the index,
+    and only the part of data keeper written after the last commit mark is scanned
+
+    On startup torn trailing record(process was killed during the write) is truncated.
+    When the log exceeds compaction threshold, it is rewritten into a snapshot(without duplicated and broken records)
+    by the compaction thread, while the writer keeps committing. Writer appends records committed meanwhile
+    to the snapshot and replaces the log with it
+    """
+
+    ids_index_suffix = ".ids"
+    corrupted_suffix = ".corrupted" # broken records, dropped during compaction, are moved to this file
+    _record_pattern = re.compile(rb"^(-?\d+): (.*) #crc32:([0-9a-f]{8})\r?\n$")
+
+    FsyncPolicy = Literal["commit", "interval", "never"]
+    # commit   - fsync after each group commit(results are durable as soon as they are committed)
+    # interval - fsync not more often than once per fsync_interval seconds
+    # never    - leave it to the OS
+
+    fsync_interval = 1.0 # seconds, used with "interval" policy
+    max_batch_size = 1024 # records in a single commit
+    retry_delay = 1.0 # seconds between attempts to write a batch after write error
+    tail_check_size = 64 * 1024 # bytes from the end of the file, checked for a torn record on startup
+
+    _stop_record = object()
+    _wakeup_record = object() # compaction is finished
+
+    def __init__(self,
+                 file_path: str,
+                 flush_interval: float = 0.0,
+                 fsync_policy: FsyncPolicy = "commit",
+                 on_error: Optional[Callable[[Exception], Any]] = None,
+                 compaction_threshold: int = 64 * 1024 * 1024
+                 ) -> None:
+        """
+        :param file_path: Path to the data keeper file
+        :param flush_interval: Time(in seconds) for accumulating records before commit. 0 - commit as soon as possible
+        :param fsync_policy: See DataKeeper.FsyncPolicy
+        :param on_error: Called from the writer thread when commit failed
+        :param compaction_threshold: Size of the log(in bytes) after which it will be compacted
+        """
+        if fsync_policy not in ("commit", "interval", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+
+        self.file_path = file_path
+        self.ids_index_path = file_path + self.ids_index_suffix
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.on_error = on_error
+        self.compaction_threshold = compaction_threshold
+
+        self._records = Queue() # type: Queue[Tuple[int, dict]]
+        self._commit_condition = Condition()
+        self._submitted = 0 # amount of records passed to record()
+        self._committed = 0 # amount of records written to the file
+        self._last_fsync = 0.0
+        self._next_compaction_size = compaction_threshold
+
+        self._writer_thread = Thread(name="DataKeeperWriterThread", target=self._writer, daemon=True)
+        self._writer_thread.start()
+
+    @staticmethod
+    def encode_record(asset_id: int, data: dict) -> bytes:
+        body = f"{asset_id}: {json.dumps(data, default=str)}".encode("utf-8") # e.g. dates of legacy YAML data keeper
+        return body + b" #crc32:%08x\n" % zlib.crc32(body)
+
+    @classmethod
+    def decode_record(cls, line: bytes, with_data: bool = True) -> Optional[Tuple[int, Optional[dict]]]:
+        """
+        :return: (asset_id, data) or None if record is broken
+        """
+        match = cls._record_pattern.match(line)
+        if match is None:
+            return None
+        if zlib.crc32(line[:match.end(2)]) != int(match.group(3), 16):
+            return None
+        return int(match.group(1)), json.loads(match.group(2)) if with_data else None
+
+    def iter_records(self, offset: int = 0, with_data: bool = True) -> Iterator[Tuple[int, Optional[dict]]]:
+        """
+        :return: Iterator of (asset_id, data). Broken records are skipped
+        """
+        with open(self.file_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                record = self.decode_record(line, with_data=with_data)
+                if record is not None:
+                    yield record
+
+    def load_uploaded_ids(self) -> list:
+        """
+        Read ids of uploaded assets without parsing of the records.
+        Also repairs the data keeper after unclean shutdown
+
+        :return: Ids of assets which already uploaded
+        """
+        if not os.path.isfile(self.file_path):
+            return []
+        self._recover()
+        keeper_size = os.path.getsize(self.file_path)
+
+        uploaded_ids, indexed_size = self._read_ids_index()
+        if indexed_size > keeper_size:
+            uploaded_ids, indexed_size = [], 0 # data keeper was replaced, index is not actual
+
+        if indexed_size < keeper_size:
+            tail_ids = [asset_id for asset_id, _ in self.iter_records(indexed_size, with_data=False)]
+            uploaded_ids.extend(tail_ids)
+            self._write_ids_index(tail_ids, keeper_size, rewrite=indexed_size == 0)
+        return uploaded_ids
+
+    def _recover(self) -> None:
+        """
+        Truncate torn trailing record. Data keeper of MNU <= 0.7.4(multiline YAML) is converted to the log
+        """
+        with open(self.file_path, "rb") as f:
+            first_line = f.readline()
+            if first_line.strip() and b" #crc32:" not in first_line:
+                legacy_format = True
+            else:
+                legacy_format = False
+                size = f.seek(0, os.SEEK_END)
+                tail_start = f.seek(max(0, size - self.tail_check_size))
+                tail = f.read()
+
+        if legacy_format:
+            self._migrate_legacy()
+            return
+        if not tail:
+            return
+
+        if not tail.endswith(b"\n"):
+            valid_size = tail_start + tail.rfind(b"\n") + 1
+        else:
+            last_line_start = tail.rfind(b"\n", 0, len(tail)-1) + 1
+            valid_size = size if self.decode_record(tail[last_line_start:], with_data=False) is not None else tail_start + last_line_start
+        if valid_size != size:
+            with open(self.file_path, "r+b") as f:
+                f.truncate(valid_size)
+                os.fsync(f.fileno())
+
+    def _migrate_legacy(self) -> None:
+        with open(self.file_path, "r") as f:
+            try:
+                data_keeper = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) # type: dict
+            except yaml.YAMLError:
+                raise DataKeeperFileCorrupted(f"Error while decoding {self.file_path}")
+        if data_keeper is None:
+            data_keeper = {}
+        if not isinstance(data_keeper, dict):
+            raise DataKeeperFileCorrupted(type(data_keeper))
+        self._write_snapshot(data_keeper.items())
+
+    def _write_snapshot(self, records: Iterable[Tuple[int, dict]]) -> int:
+        """
+        Atomically replace the data keeper and ids index
+
+        :return: Size of the new data keeper
+        """
+        return self._replace_with_snapshot(*self._write_snapshot_file(records))
+
+    def _write_snapshot_file(self, records: Iterable[Tuple[int, dict]]) -> Tuple[list, int]:
+        """
+        :return: (ids of the records, size) of the snapshot, written to the temporary file
+        """
+        ids = []
+        with open(self.file_path + ".tmp", "wb") as f:
+            for asset_id, data in records:
+                f.write(self.encode_record(asset_id, data))
+                ids.append(asset_id)
+            f.flush()
+            os.fsync(f.fileno())
+            return ids, f.tell()
+
+    def _replace_with_snapshot(self, ids: list, size: int) -> int:
+        os.replace(self.file_path + ".tmp", self.file_path)
+        self._write_ids_index(ids, size, rewrite=True)
+        return size
+
+    def _compacted_records(self, size: int) -> Iterable[Tuple[int, dict]]:
+        """
+        Only the last record of each asset is kept, broken records are moved to the file with corrupted_suffix
+
+        :param size: Size of the log part to compact. Records appended after it are not read
+        """
+        records = {} # type: dict[int, dict]
+        corrupted = []
+        with open(self.file_path, "rb") as f:
+            for line in f:
+                if size <= 0:
+                    break
+                size -= len(line)
+                record = self.decode_record(line)
+                if record is None:
+                    corrupted.append(line)
+                else:
+                    records[record[0]] = record[1]
+        if corrupted:
+            with open(self.file_path + self.corrupted_suffix, "ab") as f:
+                f.writelines(corrupted)
+        return records.items()
+
+    def compact(self) -> int:
+        """
+        Rewrite the log into a snapshot(see _compacted_records).
+        Must not be called concurrently with commits(writer thread compacts the log by _start_compaction)
+
+        :return: Size of the new data keeper
+        """
+        return self._write_snapshot(self._compacted_records(os.path.getsize(self.file_path)))
+
+    def _start_compaction(self, size: int) -> Future:
+        """
+        Snapshot of the first `size` bytes of the log is written by the separate thread, so commits are not delayed.
+        Writer is woken up when it is written
+
+        :return: Future of (ids, size) of the snapshot, see _finish_compaction
+        """
+        compaction = Future()
+
+        def compact() -> None:
+            try:
+                compaction.set_result(self._write_snapshot_file(self._compacted_records(size)))
+            except BaseException as e:
+                compaction.set_exception(e)
+            self._records.put(self._wakeup_record)
+
+        Thread(name="DataKeeperCompactionThread", target=compact, daemon=True).start()
+        return compaction
+
+    def _finish_compaction(self, compaction: Future, compacted_size: int, committed_size: int) -> int:
+        """
+        Append records committed during the compaction to the snapshot and replace the log with it.
+        Called by the writer thread with the log closed
+
+        :return: Size of the new data keeper
+        """
+        ids, size = compaction.result()
+        with open(self.file_path, "rb") as f:
+            f.seek(compacted_size)
+            tail = f.read(committed_size - compacted_size)
+        if tail:
+            with open(self.file_path + ".tmp", "ab") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            for line in tail.splitlines(keepends=True):
+                record = self.decode_record(line, with_data=False)
+                if record is not None:
+                    ids.append(record[0])
+        return self._replace_with_snapshot(ids, size)
+
+    def _read_ids_index(self) -> Tuple[list, int]:
+        """
+        :return: (ids confirmed by the last commit mark, data keeper size at the last commit mark)
+        """
+        uploaded_ids, confirmed_ids, indexed_size = [], [], 0
+        if not os.path.isfile(self.ids_index_path):
+            return confirmed_ids, indexed_size
+        with open(self.ids_index_path, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break # torn write
+                try:
+                    if line.startswith("@"):
+                        indexed_size = int(line[1:])
+                        confirmed_ids.extend(uploaded_ids)
+                        uploaded_ids.clear()
+                    else:
+                        uploaded_ids.append(int(line))
+                except ValueError:
+                    return [], 0
+        return confirmed_ids, indexed_size
+
+    def _write_ids_index(self, ids: list, keeper_size: int, rewrite: bool = False) -> None:
+        try:
+            with open(self.ids_index_path, "w" if rewrite else "a") as f:
+                self._append_ids_index(f, ids, keeper_size)
+        except OSError:
+            ... # index will be rebuilt from the data keeper on the next start
+
+    @staticmethod
+    def _append_ids_index(f, ids: list, keeper_size: int) -> None:
+        f.write("".join(f"{asset_id}\n" for asset_id in ids))
+        f.write(f"@{keeper_size}\n")
+        f.flush()
+
+    def record(self, asset_id: int, data: dict) -> None:
+        """
+        Queue record for writing
+        """
+        with self._commit_condition:
+            self._submitted += 1
+        self._records.put((asset_id, data))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all records queued before the call are committed
+
+        :return: True if records committed, False on timeout
+        """
+        with self._commit_condition:
+            target = self._submitted
+            return self._commit_condition.wait_for(lambda: self._committed >= target, timeout)
+
+    def stop(self) -> None:
+        """Commit queued records and stop the writer thread"""
+        self._records.put(self._stop_record)
+        self._writer_thread.join()
+
+    def _collect_batch(self, first_record) -> Tuple[List[Tuple[int, dict]], bool]:
+        """
+        :return: (batch of records, stop requested)
+        """
+        batch, stop = [], False
+        deadline = time.monotonic() + self.flush_interval
+        record = first_record
+        while True:
+            if record is self._stop_record:
+                stop = True
+            elif record is not self._wakeup_record:
+                batch.append(record)
+            if stop or len(batch) >= self.max_batch_size:
+                break
+            try:
+                timeout = deadline - time.monotonic()
+                record = self._records.get(timeout=timeout) if timeout > 0 else self._records.get_nowait()
+            except QueueEmptyException:
+                break
+        return batch, stop
+
+    def _commit(self, f, index_f, batch: List[Tuple[int, dict]]) -> None:
+        f.write(b"".join(self.encode_record(asset_id, data) for asset_id, data in batch))
+        f.flush()
+        now = time.monotonic()
+        fsync = self.fsync_policy == "commit" or (self.fsync_policy == "interval" and now - self._last_fsync >= self.fsync_interval)
+        if fsync:
+            os.fsync(f.fileno())
+            self._last_fsync = now
+
+        # index is written only after the records, so it never contains ids which are not in the data keeper
+        try:
+            self._append_ids_index(index_f, [asset_id for asset_id, _ in batch], f.tell())
+            if fsync:
+                os.fsync(index_f.fileno())
+        except OSError:
+            ... # not critical, tail of the data keeper will be scanned on the next start
+
+    def _open_for_append(self, committed_size: Optional[int]):
+        """
+        :param committed_size: Size of the data keeper after the last successful commit. Anything after it is a partial write and will be dropped
+        """
+        f = open(self.file_path, "ab")
+        try:
+            if committed_size is not None and f.tell() > committed_size:
+                f.truncate(committed_size)
+            return f, open(self.ids_index_path, "a")
+        except OSError:
+            f.close()
+            raise
+
+    def _writer(self) -> None:
+        stop = False
+        f = index_f = None
+        committed_size = None # type: Optional[int]
+        compaction = None # type: Optional[Future] # see _start_compaction
+        compacted_size = 0
+        try:
+            while not stop:
+                batch, stop = self._collect_batch(self._records.get())
+                while batch:
+                    try:
+                        if f is None:
+                            f, index_f = self._open_for_append(committed_size)
+                        self._commit(f, index_f, batch)
+                        committed_size = f.tell()
+                    except OSError as e:
+                        f = self._close(f)
+                        index_f = self._close(index_f)
+                        if callable(self.on_error):
+                            self.on_error(e)
+                        if stop:
+                            break # records will be lost, but the app must be closed
+                        time.sleep(self.retry_delay)
+                        continue
+                    with self._commit_condition:
+                        self._committed += len(batch)
+                        self._commit_condition.notify_all()
+                    break
+
+                if compaction is not None and (compaction.done() or stop): # on stop compaction is awaited
+                    f = self._close(f)
+                    index_f = self._close(index_f)
+                    try:
+                        committed_size = self._finish_compaction(compaction, compacted_size, committed_size)
+                    except (OSError, ValueError) as e:
+                        if callable(self.on_error):
+                            self.on_error(e)
+                    compaction = None
+                    self._next_compaction_size = max(self.compaction_threshold, committed_size*2)
+                elif compaction is None and not stop and committed_size is not None and committed_size >= self._next_compaction_size:
+                    compaction, compacted_size = self._start_compaction(committed_size), committed_size
+        finally:
+            if f is not None and self.fsync_policy != "never":
+                os.fsync(f.fileno())
+            self._close(f)
+            self._close(index_f)
+
+    @staticmethod
+    def _close(f) -> None:
+        if f is not None:
+            f.close()
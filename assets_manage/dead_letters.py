@@ -0,0 +1,84 @@
+from threading import Lock
+from typing import Optional, Dict
+
+import os
+import json
+import time
+
+
+class DeadLetterStore:
+    """
+    Persisted list of assets which failed uploading too many times(see PendingAssetsIndex.max_attempts).
+    Such assets are not dispatched anymore, until they removed from the store
+
+    File is JSON Lines, each line: {"id": INT, "attempts": INT, "error": STR or NULL, "time": UNIX_TIMESTAMP}.
+    Last line of the asset wins
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self._lock = Lock()
+
+    def load(self) -> Dict[int, dict]:
+        """
+        :return: Dead assets: asset id -> last record
+        """
+        records = dict() # type: Dict[int, dict]
+        if not os.path.isfile(self.file_path):
+            return records
+        with open(self.file_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    records[int(record["id"])] = record
+                except (ValueError, KeyError, TypeError):
+                    continue # torn tail after crash
+        return records
+
+    def add(self, asset_id: int, attempts: int, error: Optional[str]) -> dict:
+        record = {"id": asset_id, "attempts": attempts, "error": error, "time": time.time()}
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.file_path, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        return record
+
+    def remove(self, *asset_ids: int) -> int:
+        """
+        Return assets to uploading(on the next start)
+
+        :param asset_ids: Ids of assets. All assets if empty
+        :return: Amount of removed assets
+        """
+        with self._lock:
+            records = self.load()
+            removed = [asset_id for asset_id in (asset_ids or list(records)) if records.pop(asset_id, None) is not None]
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for record in records.values():
+                    f.write(json.dumps(record) + "\n")
+            os.replace(tmp_path, self.file_path)
+        return len(removed)
+
+
+if __name__ == "__main__":
+    """
+    run module:
+    >python -m assets_manage.dead_letters COLLECTION_DIR
+    >python -m assets_manage.dead_letters COLLECTION_DIR --requeue [ID ...]
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or requeue assets, which failed uploading too many times")
+    parser.add_argument("collection_dir", action="store")
+    parser.add_argument("--requeue", help="Return assets to uploading. All if ids not specified", nargs="*", type=int, default=None)
+    args = parser.parse_args()
+
+    store = DeadLetterStore(os.path.join(args.collection_dir, "0dead_letters.jsonl"))
+    if args.requeue is not None:
+        print(f"{store.remove(*args.requeue)} assets returned to uploading")
+    else:
+        for asset_id, record in store.load().items():
+            print(f"{asset_id}: attempts={record['attempts']} error={record['error']}")
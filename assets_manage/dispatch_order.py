@@ -0,0 +1,63 @@
+"""
+Dispatch ordering policies. Policy takes sizes of the asset files(row = position of the asset in the manifest)
+and amount of drivers, and returns rows in dispatch order(None for the manifest order).
+See PendingAssetsIndex.set_order
+
+Drivers take assets from the shared bus, so each asset goes to the first free driver(greedy list scheduling).
+Makespan of the batch depends on the order: a run of large files at the end keeps single driver busy, while others idle
+"""
+from array import array
+from typing import Callable, Dict, Optional, Sequence
+
+import heapq
+
+
+def manifest_order(sizes: Sequence[int], workers: int) -> Optional[array]:
+    return None
+
+
+def smallest_first(sizes: Sequence[int], workers: int) -> Optional[array]:
+    """Maximum of assets uploaded early, but the largest files are left for the tail"""
+    return array("q", sorted(range(len(sizes)), key=sizes.__getitem__))
+
+
+def largest_first(sizes: Sequence[int], workers: int) -> Optional[array]:
+    """Longest processing time first(LPT): small files at the end fill the gaps between drivers"""
+    return array("q", sorted(range(len(sizes)), key=sizes.__getitem__, reverse=True))
+
+
+def interleaved_buckets(sizes: Sequence[int], workers: int, buckets: int = 4) -> Optional[array]:
+    """
+    Rows are split into size buckets(quantiles), then taken round-robin from the largest bucket to the smallest,
+    so drivers upload a mix of sizes during the whole run. Inside the bucket the largest files go first,
+    so the last round contains the smallest file of each bucket
+    """
+    by_size = sorted(range(len(sizes)), key=sizes.__getitem__, reverse=True)
+    bucket_size = -(-len(by_size) // buckets) or 1
+    parts = [by_size[i:i+bucket_size] for i in range(0, len(by_size), bucket_size)]
+    order = array("q")
+    for position in range(bucket_size):
+        order.extend(part[position] for part in parts if position < len(part))
+    return order
+
+
+DISPATCH_ORDERS: Dict[str, Callable[[Sequence[int], int], Optional[array]]] = {
+    "manifest": manifest_order,
+    "smallest_first": smallest_first,
+    "lpt": largest_first,
+    "interleaved": interleaved_buckets,
+}
+
+
+def simulate_makespan(durations: Sequence[float], order: Optional[Sequence[int]], workers: int) -> float:
+    """
+    Greedy list scheduling: each asset goes to the driver which becomes free first
+
+    :param durations: Upload time of each row
+    :param order: Rows in dispatch order, None for the manifest order
+    :return: Time when the last asset is uploaded
+    """
+    free_at = [0.0]*workers
+    for row in (order if order is not None else range(len(durations))):
+        heapq.heapreplace(free_at, free_at[0] + durations[row])
+    return max(free_at)
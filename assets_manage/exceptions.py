@@ -0,0 +1,30 @@
+class MNUAssetsHandlerException(Exception):
+    """Base exception for assets_handler module"""
+
+
+class CollectionDirNotFound(MNUAssetsHandlerException):
+    """Assets handler can`t find the collection dir"""
+
+
+class ManifestNotFound(MNUAssetsHandlerException):
+    """Assets handler can`t find the manifest file"""
+
+
+class ManifestFileCorrupted(MNUAssetsHandlerException):
+    """Manifest file have unknown format or corrupted"""
+
+
+class DataKeeperFileCorrupted(MNUAssetsHandlerException):
+    """Data keeper file have unknown format or corrupted"""
+
+
+class UnknownDispatchOrder(MNUAssetsHandlerException):
+    """Collection config contains unknown dispatch order policy"""
+
+
+class UnknownWatchMode(MNUAssetsHandlerException):
+    """Collection config contains unknown watch mode"""
+
+
+class UnknownUploadBackend(MNUAssetsHandlerException):
+    """Collection config contains unknown upload backend"""
@@ -0,0 +1,258 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from threading import Event
+from typing import Optional, List
+
+import os
+import sys
+import struct
+import hashlib
+
+from assets_manage.manifest import Manifest
+
+
+@dataclass
+class ManifestDiff:
+    """Ids of the changed assets, sorted"""
+    added: List[int] = field(default_factory=list)
+    removed: List[int] = field(default_factory=list)
+    changed_meta: List[int] = field(default_factory=list) # manifest entry changed
+    changed_file: List[int] = field(default_factory=list) # size or mtime of the file changed(or file appeared/disappeared)
+
+    @property
+    def changed(self) -> List[int]:
+        return sorted(set(self.changed_meta).union(self.changed_file))
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed_meta or self.changed_file)
+
+    def as_dict(self) -> dict:
+        return {"added": self.added, "removed": self.removed, "changed_meta": self.changed_meta, "changed_file": self.changed_file}
+
+
+class ManifestFingerprints:
+    """
+    Fingerprint of each manifest entry: 64-bit blake2b of the raw entry(see Manifest.raw_entries),
+    size and mtime of the asset file. Used for detecting assets changed between runs
+
+    Columns are arrays sorted by asset id, so two fingerprints are compared by the single merge pass.
+    Persisted as binary file: header, then ids, hashes, sizes and mtimes
+    Raw entries differ between manifest formats, so hashes are compared only if format was not changed
+    """
+
+    missing: int = -1 # size and mtime of not accessible file
+    chunk_size: int = 4096 # files checked by the pool at once
+
+    _header = struct.Struct("<8s24sqq") # magic, manifest format, assets count, flags
+    _magic = b"MNUFPRT1"
+    WITH_FILES = 1
+
+    def __init__(self, manifest_format: str = "", with_files: bool = True) -> None:
+        self.manifest_format = manifest_format # type: str # name of the Manifest class
+        self.with_files = with_files # type: bool # sizes and mtimes are collected
+
+        self.ids    = array("q") # type: array # sorted
+        self.hashes = array("Q") # type: array
+        self.sizes  = array("q") # type: array
+        self.mtimes = array("q") # type: array # ns
+
+    @staticmethod
+    def entry_hash(raw_entry: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(raw_entry, digest_size=8).digest(), "little")
+
+    @classmethod
+    def _files_stat(cls, paths: List[Optional[str]]) -> array:
+        """
+        :return: Flat (size, mtime) pairs
+        """
+        result = array("q")
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                result.append(stat.st_size)
+                result.append(stat.st_mtime_ns)
+            except (OSError, TypeError):
+                result.append(cls.missing)
+                result.append(cls.missing)
+        return result
+
+    @staticmethod
+    def asset_path(collection_dir: str, file_name: Optional[str], path: Optional[str], use_absolute_path: bool = True) -> Optional[str]:
+        """
+        Same file as data_holders.SingleAssetData.path(path is not normalized)
+
+        :param collection_dir: Absolute path of the collection dir
+        """
+        if use_absolute_path and path:
+            return path
+        if file_name is None:
+            return None
+        return os.path.join(collection_dir, file_name)
+
+    @classmethod
+    def build(cls, manifest: Manifest, collection_dir: str, use_absolute_path: bool = True, with_files: bool = True,
+              workers: int = 4, stop_event: Optional[Event] = None) -> "ManifestFingerprints":
+        """
+        Single pass over the manifest. Files are checked(os.stat) in the thread pool
+
+        :param with_files: Collect sizes and mtimes of the asset files
+        :param stop_event: Interrupts building. Fingerprints will be incomplete
+        :return: Fingerprints. Duplicated ids are skipped(first entry wins)
+        """
+        fingerprints = cls(type(manifest).__name__, with_files)
+        collection_dir = os.path.abspath(collection_dir)
+        ids, digests, stats = array("q"), bytearray(), array("q") # type: array, bytearray, array # stats: flat (size, mtime) pairs
+        asset_path = cls.asset_path
+        entries = manifest.raw_entries()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="MNU-Fingerprints") as executor:
+            while stop_event is None or not stop_event.is_set():
+                chunk = list(islice(entries, cls.chunk_size))
+                if not chunk:
+                    break
+                paths = []
+                for asset_id, raw_entry, file_name, path in chunk:
+                    ids.append(asset_id)
+                    digests += hashlib.blake2b(raw_entry, digest_size=8).digest()
+                    if with_files:
+                        paths.append(asset_path(collection_dir, file_name, path, use_absolute_path))
+                if with_files: # one task per worker, os.stat releases GIL
+                    step = -(-len(paths) // workers)
+                    for part in executor.map(cls._files_stat, [paths[i:i+step] for i in range(0, len(paths), step)]):
+                        stats.extend(part)
+                else:
+                    stats.extend(array("q", [cls.missing]) * (2*len(chunk)))
+        hashes = array("Q")
+        hashes.frombytes(digests)
+        if sys.byteorder != "little":
+            hashes.byteswap() # same values as entry_hash
+        sizes, mtimes = stats[0::2], stats[1::2]
+
+        if all(ids[i] < ids[i+1] for i in range(len(ids)-1)):
+            fingerprints.ids, fingerprints.hashes, fingerprints.sizes, fingerprints.mtimes = ids, hashes, sizes, mtimes
+            return fingerprints
+        seen = set()
+        for row in sorted(range(len(ids)), key=ids.__getitem__): # stable, first entry of duplicated id goes first
+            if ids[row] in seen:
+                continue
+            seen.add(ids[row])
+            fingerprints.ids.append(ids[row])
+            fingerprints.hashes.append(hashes[row])
+            fingerprints.sizes.append(sizes[row])
+            fingerprints.mtimes.append(mtimes[row])
+        return fingerprints
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional["ManifestFingerprints"]:
+        """
+        :return: Fingerprints, None if file doesn't exist or corrupted
+        """
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, "rb") as f:
+            header = f.read(cls._header.size)
+            if len(header) != cls._header.size:
+                return None
+            magic, manifest_format, count, flags = cls._header.unpack(header)
+            if magic != cls._magic:
+                return None
+            fingerprints = cls(manifest_format.rstrip(b"\0").decode(), bool(flags & cls.WITH_FILES))
+            try:
+                for column in (fingerprints.ids, fingerprints.hashes, fingerprints.sizes, fingerprints.mtimes):
+                    column.fromfile(f, count)
+            except EOFError:
+                return None
+        return fingerprints
+
+    def save(self, file_path: str) -> None:
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._header.pack(self._magic, self.manifest_format.encode(), len(self.ids), self.WITH_FILES if self.with_files else 0))
+            for column in (self.ids, self.hashes, self.sizes, self.mtimes):
+                column.tofile(f)
+        os.replace(tmp_path, file_path)
+
+    def diff(self, new: "ManifestFingerprints") -> ManifestDiff:
+        """
+        Merge pass over both fingerprints
+
+        :param new: Fingerprints of the current manifest
+        :return: Changes from self to new
+        """
+        result = ManifestDiff()
+        compare_meta = self.manifest_format == new.manifest_format
+        compare_files = self.with_files and new.with_files
+        old_ids, new_ids = self.ids, new.ids
+        i, j, old_count, new_count = 0, 0, len(old_ids), len(new_ids)
+        while i < old_count and j < new_count:
+            old_id, new_id = old_ids[i], new_ids[j]
+            if old_id == new_id:
+                if compare_meta and self.hashes[i] != new.hashes[j]:
+                    result.changed_meta.append(new_id)
+                if compare_files and (self.sizes[i] != new.sizes[j] or self.mtimes[i] != new.mtimes[j]):
+                    result.changed_file.append(new_id)
+                i += 1
+                j += 1
+            elif old_id < new_id:
+                result.removed.append(old_id)
+                i += 1
+            else:
+                result.added.append(new_id)
+                j += 1
+        result.removed.extend(islice(old_ids, i, None))
+        result.added.extend(islice(new_ids, j, None))
+        return result
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+if __name__ == "__main__":
+    """
+    run module:
+    >python -m assets_manage.fingerprints COLLECTION_DIR
+    >python -m assets_manage.fingerprints COLLECTION_DIR --save --output diff.json
+    """
+    import argparse
+    import json
+    import time
+
+    from assets_manage.manifest import InMemoryManifest, StreamingManifest
+
+    parser = argparse.ArgumentParser(description="Show assets added, removed or changed since fingerprints were saved")
+    parser.add_argument("collection_dir", action="store")
+    parser.add_argument("--save", help="Save fingerprints of the current manifest", action="store_true")
+    parser.add_argument("--output", help="Write diff to the JSON file", default=None)
+    parser.add_argument("--no-files", help="Compare manifest entries only, asset files are not checked", action="store_true")
+    parser.add_argument("--relative-paths", help="Ignore \"path\" of the entries(use_absolute_path=False)", action="store_true")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    fingerprints_path = os.path.join(args.collection_dir, "0fingerprints.bin")
+    jsonl_path = os.path.join(args.collection_dir, "0manifest.jsonl")
+    start = time.perf_counter()
+    if os.path.isfile(jsonl_path):
+        manifest = StreamingManifest(jsonl_path)
+    else:
+        manifest = InMemoryManifest.load(os.path.join(args.collection_dir, "0manifest.yaml"))
+    current = ManifestFingerprints.build(
+        manifest, args.collection_dir, use_absolute_path=not args.relative_paths, with_files=not args.no_files, workers=args.workers
+    )
+    manifest.close()
+    previous = ManifestFingerprints.load(fingerprints_path)
+    if previous is None:
+        print("No saved fingerprints, all assets are added")
+        previous = ManifestFingerprints(current.manifest_format, current.with_files)
+    elif previous.manifest_format != current.manifest_format:
+        print(f"Manifest format changed({previous.manifest_format} -> {current.manifest_format}), entries are not compared")
+    diff = previous.diff(current)
+    print(
+        f"{len(current)} assets in {time.perf_counter()-start:.2f}s: added={len(diff.added)} removed={len(diff.removed)}"
+        f" changed={len(diff.changed)}(meta={len(diff.changed_meta)} file={len(diff.changed_file)})"
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(diff.as_dict(), f)
+    if args.save:
+        current.save(fingerprints_path)
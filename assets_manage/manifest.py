@@ -0,0 +1,664 @@
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, Iterator, Tuple, Optional, BinaryIO, Type, List
+
+import os
+import sys
+import json
+import struct
+import hashlib
+import marshal
+import yaml
+
+from assets_manage.exceptions import ManifestFileCorrupted
+from assets_manage.traits import TraitsInternTable, TRAIT_KEYS
+
+
+YAMLSafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader) # libyaml based loader, if PyYAML was built with it
+
+
+def entry_size(asset_data: dict) -> Optional[int]:
+    """:return: "size" of the asset entry(see build_manifest), None if absent or invalid"""
+    size = asset_data.get("size", None)
+    return size if isinstance(size, int) and not isinstance(size, bool) and size >= 0 else None
+
+
+class Manifest:
+    """
+    Read-only access to the collection manifest. See manifest_structure.puml for example
+
+    Each asset entry is addressed by a manifest key. What the key is depends on implementation
+    (asset name for the YAML manifest, line offset for the JSON Lines manifest)
+    """
+
+    keys_version: int = 0 # incremented when keys of the known entries are changed by refresh(manifest was rewritten), keys must be taken from entries() again
+
+    def entries(self) -> Iterator[Tuple[Hashable, int]]:
+        """
+        :return: Iterator of (manifest_key, asset_id) pairs in manifest order
+        """
+        raise NotImplementedError
+
+    def get(self, manifest_key: Hashable) -> dict:
+        """
+        :return: Asset entry, like: {"id": INT, "path": STR_ABSOLUTE_PATH, "file_name": STR, ...}
+        """
+        raise NotImplementedError
+
+    def refresh(self) -> List[Tuple[Hashable, int]]:
+        """
+        Pick up entries added to the manifest file since loading(or previous refresh)
+
+        :return: New (manifest_key, asset_id) pairs
+        """
+        return []
+
+    def raw_entries(self) -> Iterator[Tuple[int, bytes, Optional[str], Optional[str]]]:
+        """
+        Single pass over the manifest for fingerprinting(see assets_manage.fingerprints)
+
+        :return: Iterator of (asset_id, raw entry, "file_name", "path") in manifest order.
+                 Raw entry is any bytes which change when asset entry changes
+        """
+        for manifest_key, asset_id in self.entries():
+            asset_data = self.get(manifest_key)
+            yield asset_id, json.dumps(asset_data, sort_keys=True, default=str).encode(), asset_data.get("file_name", None), asset_data.get("path", None)
+
+    def file_entries(self) -> Iterator[Tuple[int, Optional[str], Optional[str], Optional[int]]]:
+        """
+        Single pass over the manifest for the asset files(see AssetsHandler._measure_sizes).
+        Unlike get(), may be used from the background thread
+
+        :return: Iterator of (asset_id, "file_name", "path", "size") in manifest order. "size" is None if absent
+        """
+        for manifest_key, asset_id in self.entries():
+            asset_data = self.get(manifest_key)
+            yield asset_id, asset_data.get("file_name", None), asset_data.get("path", None), entry_size(asset_data)
+
+    def close(self) -> None:
+        ...
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryManifest(Manifest):
+    """
+    Whole manifest is parsed and kept in memory, in columnar form(row = position of the asset in the manifest):
+        - ids        - array of asset ids
+        - names      - asset names(None for default "asset ID")
+        - file_names - file names
+        - path_dirs  - directories of the absolute paths(interned, shared by all assets of the directory)
+        - path_names - base names of the paths(None if equal to the file name)
+        - extras     - rest of the entry("props", "attrs", ...) as compact JSON, None if empty
+        - trait_starts - start of the row traits in `trait_refs`, -1 if asset has no interned traits
+        - trait_refs   - flat refs of the trait entries in the `traits` table. For the row:
+                         length of "properties", its entries refs, then the same for "levels" and "stats"(length -1 if absent)
+    Asset entry dict is materialized only by get(). Manifest key is the row
+
+    Trait entries are interned(see assets_manage.traits): assets share read-only trait entries objects,
+    and their JSON fragments are encoded once for all uploads
+    """
+
+    _no_path = None # path_dirs value for entries without "path"
+    intern_traits = True # default, see intern_traits of the collection config
+
+    def __init__(self, manifest: dict, intern_traits: Optional[bool] = None) -> None:
+        """
+        :param intern_traits: Share read-only trait entries between assets. Otherwise get() builds new trait lists
+        """
+        if intern_traits is not None:
+            self.intern_traits = intern_traits
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("assets_data", None), dict):
+            raise ManifestFileCorrupted(type(manifest), manifest.keys() if isinstance(manifest, dict) else None)
+        self.header = {key: value for key, value in manifest.items() if key != "assets_data"} # type: dict # e.g. assets_count
+
+        self.ids        = array("q") # type: array
+        self.names      = [] # type: List[Optional[str]]
+        self.file_names = [] # type: List[Optional[str]]
+        self.path_dirs  = [] # type: List[Optional[str]]
+        self.path_names = [] # type: List[Optional[str]]
+        self.extras     = [] # type: list[bytes | dict | None]
+        self.manifest_path = None # type: Optional[str] # set by load, see refresh
+        self._stat_key = None # type: Optional[Tuple[int, int]] # manifest size and mtime_ns when it was parsed
+
+        self.trait_starts = array("q") # type: array
+        self.trait_refs   = array("i") # type: array
+        self.traits       = TraitsInternTable() # type: TraitsInternTable
+
+        for asset_name, asset_data in manifest["assets_data"].items():
+            self._append(asset_name, asset_data)
+
+    def _append(self, asset_name: str, asset_data: dict) -> None:
+        try:
+            asset_id = asset_data["id"]
+            self.ids.append(asset_id)
+        except (TypeError, KeyError, OverflowError):
+            raise ManifestFileCorrupted(f"Asset entry {asset_name!r} has no valid id")
+        extra = {key: value for key, value in asset_data.items() if key not in ("id", "file_name", "path")}
+
+        file_name = asset_data.get("file_name", None)
+        if file_name is not None and not isinstance(file_name, str):
+            extra["file_name"], file_name = file_name, None
+        path = asset_data.get("path", None)
+        if isinstance(path, str) and path:
+            path_dir, path_name = os.path.split(path)
+            self.path_dirs.append(sys.intern(path_dir))
+            self.path_names.append(None if file_name is not None and path_name == os.path.basename(file_name) else path_name)
+        else:
+            if "path" in asset_data:
+                extra["path"] = path
+            self.path_dirs.append(self._no_path)
+            self.path_names.append(None)
+
+        self.names.append(None if asset_name == f"asset {asset_id}" else asset_name)
+        self.file_names.append(file_name)
+        self._intern_traits(extra)
+        if not extra:
+            self.extras.append(None)
+        else:
+            try:
+                self.extras.append(json.dumps(extra, separators=(",", ":")).encode())
+            except (TypeError, ValueError):
+                self.extras.append(extra) # not JSON serializable YAML values(e.g. dates)
+
+    def _intern_traits(self, extra: dict) -> None:
+        """Moves trait lists of the "props" into the traits table"""
+        props = extra.get("props", None)
+        refs, interned_keys = [], []
+        if self.intern_traits and isinstance(props, dict):
+            for key in TRAIT_KEYS:
+                try:
+                    traits_refs = self.traits.intern(props[key]) if isinstance(props.get(key, None), list) else None
+                except (TypeError, ValueError):
+                    traits_refs = None # stays in extras
+                if traits_refs is None:
+                    refs.append(-1)
+                else:
+                    refs.append(len(traits_refs))
+                    refs.extend(traits_refs)
+                    interned_keys.append(key)
+        if not interned_keys:
+            self.trait_starts.append(-1)
+            return
+        self.trait_starts.append(len(self.trait_refs))
+        self.trait_refs.extend(refs)
+        props = {key: value for key, value in props.items() if key not in interned_keys}
+        if props:
+            extra["props"] = props
+        else:
+            del extra["props"]
+
+    @classmethod
+    def load(cls, manifest_path: str, use_cache: bool = True, intern_traits: Optional[bool] = None) -> "InMemoryManifest":
+        """
+        Load manifest from compiled cache if it is up to date, otherwise parse YAML and compile cache
+
+        :param manifest_path: Path to YAML manifest
+        :param use_cache: Use compiled cache(see CompiledManifestCache)
+        :param intern_traits: See InMemoryManifest
+        """
+        stat = os.stat(manifest_path)
+        cache = CompiledManifestCache(manifest_path) if use_cache else None
+        manifest = cache.load() if cache is not None else None
+        if manifest is None:
+            manifest = cls(parse_yaml_manifest(manifest_path), intern_traits)
+            if cache is not None:
+                cache.save(manifest)
+        elif intern_traits is not None:
+            manifest.intern_traits = intern_traits # trait lists of the cache are copied by get() if interning is disabled
+        manifest.manifest_path = manifest_path
+        manifest._stat_key = (stat.st_size, stat.st_mtime_ns)
+        return manifest
+
+    def refresh(self) -> List[Tuple[Hashable, int]]:
+        """
+        YAML can`t be tailed: changed manifest is parsed again and entries with new ids are appended.
+        build_manifest appends entries in place as single flow style lines, so a half-written tail either
+        fails to parse(ManifestFileCorrupted, the file is parsed again on the next refresh) or ends at the line
+        boundary, where an entry without the data yet is skipped.
+        Manifests which were not loaded from the file are not refreshed
+        """
+        if self.manifest_path is None:
+            return []
+        stat = os.stat(self.manifest_path)
+        if (stat.st_size, stat.st_mtime_ns) == self._stat_key:
+            return []
+        manifest = parse_yaml_manifest(self.manifest_path)
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("assets_data", None), dict):
+            raise ManifestFileCorrupted(type(manifest), manifest.keys() if isinstance(manifest, dict) else None)
+        self._stat_key = (stat.st_size, stat.st_mtime_ns)
+        known, new = set(self.ids), []
+        for asset_name, asset_data in manifest["assets_data"].items():
+            if isinstance(asset_data, dict) and asset_data.get("id", None) not in known:
+                self._append(asset_name, asset_data)
+                known.add(self.ids[-1])
+                new.append((len(self.ids)-1, self.ids[-1]))
+        return new
+
+    def to_columns(self) -> tuple:
+        """
+        :return: Columns in marshal-able form. See from_columns
+        """
+        return (
+            self.header, self.ids.tobytes(), self.names, self.file_names, self.path_dirs, self.path_names, self.extras,
+            self.trait_starts.tobytes(), self.trait_refs.tobytes(), self.traits.fragments
+        )
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "InMemoryManifest":
+        """Restore manifest without materializing entries dicts"""
+        manifest = cls.__new__(cls)
+        manifest.manifest_path, manifest._stat_key = None, None
+        manifest.header, ids, manifest.names, manifest.file_names, manifest.path_dirs, manifest.path_names, manifest.extras, \
+            trait_starts, trait_refs, trait_fragments = columns
+        manifest.ids = array("q")
+        manifest.ids.frombytes(ids)
+        manifest.trait_starts, manifest.trait_refs = array("q"), array("i")
+        manifest.trait_starts.frombytes(trait_starts)
+        manifest.trait_refs.frombytes(trait_refs)
+        manifest.traits = TraitsInternTable.from_fragments(trait_fragments)
+        if not len(manifest.ids) == len(manifest.names) == len(manifest.file_names) == len(manifest.path_dirs) \
+                == len(manifest.path_names) == len(manifest.extras) == len(manifest.trait_starts):
+            raise ValueError("Columns have different length")
+        return manifest
+
+    def asset_name(self, row: int) -> str:
+        name = self.names[row]
+        return name if name is not None else f"asset {self.ids[row]}"
+
+    def entries(self) -> Iterator[Tuple[Hashable, int]]:
+        return enumerate(self.ids)
+
+    def get(self, manifest_key: Hashable) -> dict:
+        row = manifest_key
+        if not isinstance(row, int) or not 0 <= row < len(self.ids):
+            raise KeyError(manifest_key)
+        asset_data = {"id": self.ids[row]}
+        file_name = self.file_names[row]
+        if file_name is not None:
+            asset_data["file_name"] = file_name
+        path = self._path(row)
+        if path is not None:
+            asset_data["path"] = path
+        extra = self.extras[row]
+        if extra is not None:
+            asset_data.update(json.loads(extra) if isinstance(extra, bytes) else extra)
+        start = self.trait_starts[row]
+        if start != -1:
+            props = asset_data["props"] = dict(asset_data.get("props", {}))
+            for key in TRAIT_KEYS:
+                length = self.trait_refs[start]
+                start += 1
+                if length != -1:
+                    refs = self.trait_refs[start:start+length]
+                    props[key] = self.traits.traits(refs) if self.intern_traits else self.traits.copies(refs)
+                    start += length
+        return asset_data
+
+    def _path(self, row: int) -> Optional[str]:
+        path_dir = self.path_dirs[row]
+        if path_dir is self._no_path:
+            return None
+        path_name = self.path_names[row]
+        return os.path.join(path_dir, path_name if path_name is not None else os.path.basename(self.file_names[row]))
+
+    def raw_entries(self) -> Iterator[Tuple[int, bytes, Optional[str], Optional[str]]]:
+        """Raw entry is built from the columns, entries dicts are not materialized"""
+        fragments = self.traits.fragments
+        for row in range(len(self.ids)): # rows appended by refresh meanwhile are not included
+            asset_id, file_name, path, extra = self.ids[row], self.file_names[row], self._path(row), self.extras[row]
+            parts = [self.asset_name(row), file_name or "", path or ""]
+            if isinstance(extra, bytes):
+                parts.append(extra.decode())
+            elif extra is not None:
+                parts.append(json.dumps(extra, sort_keys=True, default=str))
+            start = self.trait_starts[row]
+            if start != -1:
+                for key in TRAIT_KEYS:
+                    length = self.trait_refs[start]
+                    start += 1
+                    if length != -1:
+                        parts.append(key)
+                        parts.extend(fragments[ref] for ref in self.trait_refs[start:start+length])
+                        start += length
+            yield asset_id, "\0".join(parts).encode(), file_name, path
+
+    def file_entries(self) -> Iterator[Tuple[int, Optional[str], Optional[str], Optional[int]]]:
+        """Only extras which contain "size" are decoded"""
+        for row in range(len(self.ids)):
+            extra, size = self.extras[row], None
+            if isinstance(extra, bytes):
+                if b'"size"' in extra:
+                    size = entry_size(json.loads(extra))
+            elif extra is not None:
+                size = entry_size(extra)
+            yield self.ids[row], self.file_names[row], self._path(row), size
+
+    @property
+    def manifest_data(self) -> dict:
+        """
+        :return: Manifest in original(dict) form. Materializes all entries
+        """
+        return {
+            "assets_data": {self.asset_name(row): self.get(row) for row in range(len(self.ids))},
+            **self.header
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class CompiledManifestCache:
+    """
+    Binary sidecar of the YAML manifest, which allows to skip YAML parsing on restart
+
+    File layout: header(magic, manifest size, manifest mtime_ns, sha256 of manifest, payload length) + marshal encoded
+    columns of InMemoryManifest(see InMemoryManifest.to_columns), so restart doesn't build the entries dicts at all.
+    Cache is valid only while size, mtime and content hash of the manifest are the same
+    """
+
+    cache_suffix = ".mnuc"
+    _magic = b"MNUCT%03d" % marshal.version
+    _header = struct.Struct("<8sqq32sq")
+
+    def __init__(self, manifest_path: str) -> None:
+        self.manifest_path = manifest_path
+        self.cache_path = manifest_path + self.cache_suffix
+
+    def _manifest_key(self) -> Tuple[int, int, bytes]:
+        stat = os.stat(self.manifest_path)
+        content_hash = hashlib.sha256()
+        with open(self.manifest_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                content_hash.update(chunk)
+        return stat.st_size, stat.st_mtime_ns, content_hash.digest()
+
+    def load(self) -> Optional[InMemoryManifest]:
+        """
+        :return: Manifest if cache is up to date, None otherwise
+        """
+        if not os.path.isfile(self.cache_path):
+            return None
+        with open(self.cache_path, "rb") as f:
+            header = f.read(self._header.size)
+            if len(header) != self._header.size:
+                return None
+            magic, size, mtime_ns, content_hash, payload_len = self._header.unpack(header)
+            if magic != self._magic or (size, mtime_ns, content_hash) != self._manifest_key():
+                return None
+            payload = f.read(payload_len)
+        if len(payload) != payload_len:
+            return None
+        try:
+            return InMemoryManifest.from_columns(marshal.loads(payload))
+        except (ValueError, EOFError, TypeError):
+            return None
+
+    def save(self, manifest: InMemoryManifest) -> bool:
+        """
+        Compile manifest into the cache file. Errors are ignored(e.g. collection dir is read-only)
+
+        :return: True if cache was saved
+        """
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            payload = marshal.dumps(manifest.to_columns())
+            with open(tmp_path, "wb") as f:
+                f.write(self._header.pack(self._magic, *self._manifest_key(), len(payload)))
+                f.write(payload)
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, ValueError):
+            return False
+        return True
+
+
+class StreamingManifest(Manifest):
+    """
+    JSON Lines manifest. Each line is a single asset: {"ASSET_NAME": {"id": INT, "file_name": STR, ...}}
+
+    Only ids and line offsets are kept in memory(also cached in the on-disk offset index).
+    Asset entries are read from the disk on demand, with read-ahead of a small window of lines
+    """
+
+    index_suffix = ".idx"
+    _index_magic = b"MNUMIDX2"
+    _index_header = struct.Struct("<8sqqqq") # magic, manifest size, manifest mtime_ns, assets count, indexed size
+
+    def __init__(self, manifest_path: str, window_size: int = 256) -> None:
+        self.manifest_path = manifest_path
+        self.index_path = manifest_path + self.index_suffix
+        self.window_size = window_size
+
+        self._window = OrderedDict() # type: OrderedDict[int, bytes] # line offset -> raw line
+        self._lock = Lock()
+        self._file: Optional[BinaryIO] = None
+
+        self._indexed_size = 0 # type: int # end of the last indexed line. Line which is being appended is not indexed
+        stat_key = self._manifest_stat_key()
+        index = self._load_index(stat_key)
+        if index is None:
+            index = array("q"), array("q")
+            self._indexed_size = self._index_lines(0, *index, seen=set())
+            self._save_index(*index, stat_key)
+        self.ids, self.offsets = index # type: array, array
+        self._stat_key = stat_key # type: Tuple[int, int]
+        self._inode = os.stat(manifest_path).st_ino # type: int # manifest replaced by another file(os.replace) is reindexed
+
+    def _manifest_stat_key(self) -> Tuple[int, int]:
+        stat = os.stat(self.manifest_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load_index(self, stat_key: Optional[Tuple[int, int]] = None) -> Optional[Tuple[array, array]]:
+        """
+        :param stat_key: Manifest size and mtime. Current by default
+        :return: (ids, offsets) if index exists and matches the manifest, None otherwise
+        """
+        stat_key = stat_key or self._manifest_stat_key()
+        if not os.path.isfile(self.index_path):
+            return None
+        with open(self.index_path, "rb") as f:
+            header = f.read(self._index_header.size)
+            if len(header) != self._index_header.size:
+                return None
+            magic, size, mtime_ns, count, indexed_size = self._index_header.unpack(header)
+            if magic != self._index_magic or (size, mtime_ns) != stat_key:
+                return None
+            ids, offsets = array("q"), array("q")
+            try:
+                ids.fromfile(f, count)
+                offsets.fromfile(f, count)
+            except EOFError:
+                return None
+        self._indexed_size = indexed_size
+        return ids, offsets
+
+    def _save_index(self, ids: array, offsets: array, stat_key: Tuple[int, int]) -> None:
+        """
+        :param stat_key: Manifest size and mtime before indexing
+        """
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._index_header.pack(self._index_magic, *stat_key, len(ids), self._indexed_size))
+            ids.tofile(f)
+            offsets.tofile(f)
+        os.replace(tmp_path, self.index_path)
+
+    def _index_lines(self, offset: int, ids: array, offsets: array, seen: set) -> int:
+        """
+        Streaming pass over the manifest from the offset
+
+        :param seen: Ids already in the index. Duplicated ids are skipped(first entry wins)
+        :return: End of the last indexed line
+        """
+        with open(self.manifest_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    try:
+                        self._parse_line(line, offset)
+                    except ManifestFileCorrupted:
+                        break # line is being appended
+                if line.strip():
+                    asset_id = self._parse_line(line, offset)["id"]
+                    if asset_id not in seen:
+                        seen.add(asset_id)
+                        ids.append(asset_id)
+                        offsets.append(offset)
+                offset += len(line)
+        return offset
+
+    def refresh(self) -> List[Tuple[Hashable, int]]:
+        """
+        Index lines appended to the manifest. If manifest was rewritten(replaced by another file or became shorter),
+        it is reopened and reindexed: offsets of the known entries are changed(keys_version is incremented)
+        and only entries with new ids are returned
+        """
+        with self._lock:
+            stat = os.stat(self.manifest_path)
+            stat_key = (stat.st_size, stat.st_mtime_ns)
+            if stat_key == self._stat_key and stat.st_ino == self._inode:
+                return []
+            rewritten = stat.st_ino != self._inode or stat.st_size < self._indexed_size
+            self._stat_key, self._inode = stat_key, stat.st_ino
+            rows_count = len(self.ids)
+            if rewritten:
+                if self._file is not None:
+                    self._file.close() # opened file may be the replaced one
+                    self._file = None
+                self._window.clear()
+                known = set(self.ids)
+                ids, offsets = array("q"), array("q")
+                self._indexed_size = self._index_lines(0, ids, offsets, seen=set())
+                self.ids, self.offsets = ids, offsets
+                self.keys_version += 1
+                new = [(offset, asset_id) for offset, asset_id in zip(offsets, ids) if asset_id not in known]
+            else:
+                self._indexed_size = self._index_lines(self._indexed_size, self.ids, self.offsets, seen=set(self.ids))
+                new = list(zip(self.offsets[rows_count:], self.ids[rows_count:]))
+            self._save_index(self.ids, self.offsets, stat_key)
+            return new
+
+    def _parse_line(self, line: bytes, offset: int) -> dict:
+        try:
+            record = json.loads(line)
+            (_, asset_data), = record.items()
+            if not isinstance(asset_data, dict) or not isinstance(asset_data.get("id", None), int):
+                raise ValueError
+        except (ValueError, AttributeError):
+            raise ManifestFileCorrupted(f"Error while decoding {self.manifest_path} at offset {offset}")
+        return asset_data
+
+    def _read_ahead(self, offset: int) -> None:
+        if self._file is None:
+            self._file = open(self.manifest_path, "rb")
+        self._file.seek(offset)
+        for _ in range(self.window_size):
+            line = self._file.readline()
+            if not line:
+                break
+            if line.strip() and offset not in self._window:
+                self._window[offset] = line
+            offset += len(line)
+        while len(self._window) > self.window_size:
+            self._window.popitem(last=False)
+
+    def entries(self) -> Iterator[Tuple[Hashable, int]]:
+        return zip(self.offsets, self.ids)
+
+    def get(self, manifest_key: Hashable) -> dict:
+        with self._lock:
+            line = self._window.pop(manifest_key, None)
+            if line is None:
+                self._read_ahead(manifest_key)
+                line = self._window.pop(manifest_key, None)
+            if line is None:
+                raise KeyError(manifest_key)
+        return self._parse_line(line, manifest_key)
+
+    def _indexed_lines(self) -> Iterator[Tuple[int, bytes, dict]]:
+        """
+        Sequential read of the indexed lines, window is not used(safe for the background thread)
+
+        :return: Iterator of (asset_id, raw line, asset entry)
+        """
+        ids, offsets = self.ids, self.offsets
+        position, rows_count = 0, len(offsets)
+        with open(self.manifest_path, "rb") as f:
+            offset = 0
+            for line in f:
+                if position >= rows_count:
+                    break
+                if offset == offsets[position]:
+                    yield ids[position], line, self._parse_line(line, offset)
+                    position += 1
+                offset += len(line)
+
+    def raw_entries(self) -> Iterator[Tuple[int, bytes, Optional[str], Optional[str]]]:
+        """Raw entry is the manifest line"""
+        for asset_id, line, asset_data in self._indexed_lines():
+            yield asset_id, line.rstrip(b"\r\n"), asset_data.get("file_name", None), asset_data.get("path", None)
+
+    def file_entries(self) -> Iterator[Tuple[int, Optional[str], Optional[str], Optional[int]]]:
+        for asset_id, _, asset_data in self._indexed_lines():
+            yield asset_id, asset_data.get("file_name", None), asset_data.get("path", None), entry_size(asset_data)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._window.clear()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def parse_yaml_manifest(manifest_path: str, loader: Type[yaml.SafeLoader] = YAMLSafeLoader) -> dict:
+    """
+    Full parse of the YAML manifest
+
+    :return: Manifest dict
+    """
+    with open(manifest_path, "r") as f:
+        try:
+            return yaml.load(f, Loader=loader)
+        except yaml.YAMLError:
+            raise ManifestFileCorrupted(f"Error while decoding {manifest_path}")
+
+
+def convert_to_jsonl(yaml_manifest_path: str, jsonl_manifest_path: str) -> int:
+    """
+    Convert YAML manifest to the JSON Lines manifest, which can be used by StreamingManifest
+
+    :return: Amount of converted assets
+    """
+    manifest = InMemoryManifest.load(yaml_manifest_path, use_cache=False)
+    with open(jsonl_manifest_path, "w") as f:
+        for row, _ in manifest.entries():
+            f.write(json.dumps({manifest.asset_name(row): manifest.get(row)}))
+            f.write("\n")
+    return len(manifest)
+
+
+if __name__ == "__main__":
+    """
+    run module:
+    >python -m assets_manage.manifest COLLECTION_DIR
+    >python -m assets_manage.manifest COLLECTION_DIR --compile
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert 0manifest.yaml into the streaming manifest(0manifest.jsonl)")
+    parser.add_argument("collection_dir", action="store")
+    parser.add_argument("--compile", help="Compile binary cache of 0manifest.yaml instead of converting", action="store_true", default=False)
+    args = parser.parse_args()
+
+    yaml_manifest_path = os.path.join(args.collection_dir, "0manifest.yaml")
+    if args.compile:
+        compiled = CompiledManifestCache(yaml_manifest_path).save(InMemoryManifest(parse_yaml_manifest(yaml_manifest_path)))
+        print(f"Manifest {'compiled' if compiled else 'NOT compiled'}")
+    else:
+        converted = convert_to_jsonl(yaml_manifest_path, os.path.join(args.collection_dir, "0manifest.jsonl"))
+        print(f"{converted} assets converted")
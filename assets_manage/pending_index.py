@@ -0,0 +1,485 @@
+from array import array
+from collections import deque
+from itertools import islice
+from threading import Lock
+from typing import Hashable, Iterable, Iterator, Optional, Tuple, List, Set
+from time import monotonic
+
+import heapq
+import random
+
+
+class AssetLease:
+    """
+    Lease of the dispatched asset. Travels with the asset to the driver(see data_holders.UploadDataHolder)
+
+    Lease is issued when asset is dispatched and claimed(renewed) by the driver, when it starts uploading.
+    Expired lease is revoked by PendingAssetsIndex.reap_expired and asset returns to the queue
+    """
+
+    def __init__(self, index: "PendingAssetsIndex", asset_id: int, serial: int, lease_time: float) -> None:
+        self._index = index
+        self.asset_id   = asset_id
+        self.serial     = serial # type: int # leases are issued in dispatch order
+        self.lease_time = lease_time # type: float # seconds
+        self.deadline   = monotonic() + lease_time # type: float
+        self.claimed    = False # type: bool
+        self.revoked    = False # type: bool
+
+    def claim(self) -> bool:
+        """
+        Renew lease for the uploading time
+
+        :return: False if lease was revoked and asset must not be uploaded
+        """
+        return self._index.claim(self)
+
+    @property
+    def expired(self) -> bool:
+        return monotonic() >= self.deadline
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} asset_id={self.asset_id} claimed={self.claimed} revoked={self.revoked}>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class PendingAssetsIndex:
+    """
+    Index of assets, which still must be uploaded
+
+    Built once from the manifest. State is kept in columns(row = position of the asset in the manifest):
+        - ids   - array of asset ids
+        - flags - bytearray of asset status(UPLOADED, LEASED, DEAD)
+        - keys of the asset entries in the manifest(array if keys are int)
+    Asset id -> row lookup is an array for dense ids(common case: 0..N), dict otherwise.
+
+    All dispatch operations are O(1)(amortized):
+        - fresh assets are dispatched by the cursor, which moves over rows in manifest order
+          or in the order set by set_order(see assets_manage.dispatch_order)
+        - requeued - ids returned to the head of the queue(expired leases)
+        - leases   - ids handed out to the drivers -> AssetLease
+
+    Failed assets are not mixed with fresh work: they wait in the retry lane(heap by retry time) with exponential
+    backoff and jitter. Ready retries are dispatched before pending assets.
+    After max_attempts failures asset is marked as dead and never dispatched again(see mark_failed)
+    """
+
+    UPLOADED = 1
+    LEASED   = 2
+    DEAD     = 4
+
+    retry_base_delay: float = 5 # seconds, backoff after the first failure. Doubled with each failure
+    retry_max_delay: float = 300 # seconds
+
+    def __init__(self, manifest_entries: Iterable[Tuple[Hashable, int]] = (), uploaded_ids: Iterable[int] = (),
+                 dead_ids: Iterable[int] = (), max_attempts: int = 5) -> None:
+        """
+        :param manifest_entries: Iterable of (manifest_key, asset_id) pairs
+        :param uploaded_ids: Ids of assets which already uploaded
+        :param dead_ids: Ids of assets which must not be dispatched(see assets_manage.dead_letters)
+        :param max_attempts: Failed uploads allowed per asset
+        """
+        self._lock = Lock()
+
+        self.ids   = array("q") # type: array # row -> asset id
+        self.flags = bytearray() # type: bytearray # row -> UPLOADED | LEASED | DEAD
+        self._keys = array("q") # type: array | list # row -> manifest key
+        self._dense_rows  = array("q") # type: array # asset id -> row, -1 if absent
+        self._sparse_rows = dict() # type: dict[int, int] # asset id -> row, for ids far from 0..len
+
+        self._uploaded_ids = set(uploaded_ids) # type: set[int] # uploaded, but not in the manifest(yet)
+        self._dead_ids     = set(dead_ids) # type: set[int] # dead, but not in the manifest(yet)
+        self._uploaded_count = 0 # type: int # rows flagged as UPLOADED
+        self._dead_count     = 0 # type: int # rows flagged as DEAD
+
+        self._cursor = 0 # type: int # position of the next row for fresh dispatch
+        self._order     = None # type: Optional[array] # position -> row, None for manifest order
+        self._positions = None # type: Optional[array] # row -> position
+        self._fresh_pending = 0 # type: int # not flagged rows after the cursor
+
+        self.requeued = deque() # type: deque[int]
+        self.leases   = dict() # type: dict[int, AssetLease] # assets in progress
+        self.retries  = [] # type: list[tuple[float, int]] # heap of (retry time, asset id)
+        self.attempts = dict() # type: dict[int, int] # asset id -> failed uploads
+
+        self.max_attempts = max_attempts
+
+        self._lease_serial = 0 # type: int
+        self._last_claimed_serial = 0 # type: int
+
+        for manifest_key, asset_id in manifest_entries:
+            self.add(manifest_key, asset_id)
+
+    def _row(self, asset_id: int) -> int:
+        """
+        :return: Row of the asset, -1 if asset is not in the manifest
+        """
+        if 0 <= asset_id < len(self._dense_rows):
+            row = self._dense_rows[asset_id]
+            if row >= 0:
+                return row
+        return self._sparse_rows.get(asset_id, -1)
+
+    def _set_row(self, asset_id: int, row: int) -> None:
+        if 0 <= asset_id < max(1024, 2*len(self.ids)): # dense enough for the array
+            if asset_id >= len(self._dense_rows):
+                self._dense_rows.extend(array("q", [-1]) * (asset_id + 1 - len(self._dense_rows)))
+            self._dense_rows[asset_id] = row
+        else:
+            self._sparse_rows[asset_id] = row
+
+    def _position(self, row: int) -> int:
+        return row if self._positions is None else self._positions[row]
+
+    def _row_at(self, position: int) -> int:
+        return position if self._order is None else self._order[position]
+
+    def _set_flag(self, row: int, flag: int) -> None:
+        if not self.flags[row] and self._position(row) >= self._cursor:
+            self._fresh_pending -= 1
+        self.flags[row] |= flag
+
+    def add(self, manifest_key: Hashable, asset_id: int) -> bool:
+        """
+        Register asset from the manifest
+
+        :return: True if asset was queued for uploading
+        """
+        with self._lock:
+            if self._row(asset_id) >= 0:
+                return False # duplicated id, first entry wins
+            row = len(self.ids)
+            self.ids.append(asset_id)
+            if isinstance(self._keys, array) and not isinstance(manifest_key, int):
+                self._keys = self._keys.tolist()
+            self._keys.append(manifest_key)
+            self._set_row(asset_id, row)
+            if self._order is not None:
+                self._positions.append(len(self._order))
+                self._order.append(row)
+
+            flag = 0
+            if asset_id in self._uploaded_ids:
+                self._uploaded_ids.discard(asset_id)
+                self._uploaded_count += 1
+                flag |= self.UPLOADED
+            if asset_id in self._dead_ids:
+                self._dead_ids.discard(asset_id)
+                self._dead_count += 1
+                flag |= self.DEAD
+            self.flags.append(flag)
+            if flag:
+                return False
+            self._fresh_pending += 1
+            return True
+
+    def _skip_flagged(self) -> None:
+        """Rows after the cursor can be flagged only as UPLOADED or DEAD, they are never dispatched"""
+        flags, cursor, rows_count = self.flags, self._cursor, len(self.flags)
+        if self._order is None:
+            while cursor < rows_count and flags[cursor]:
+                cursor += 1
+        else:
+            order = self._order
+            while cursor < rows_count and flags[order[cursor]]:
+                cursor += 1
+        self._cursor = cursor
+
+    def _issue_lease(self, row: int, lease_time: float) -> int:
+        asset_id = self.ids[row]
+        self.flags[row] |= self.LEASED
+        self._lease_serial += 1
+        self.leases[asset_id] = AssetLease(self, asset_id, self._lease_serial, lease_time)
+        return asset_id
+
+    def pop_next(self, lease_time: float = float("inf")) -> Optional[int]:
+        """
+        Take next asset for uploading, mark it as in progress and issue lease for it(see lease)
+
+        :param lease_time: Lease duration in seconds. Lease never expires by default
+        :return: Asset id or None if nothing to dispatch
+        """
+        with self._lock:
+            now = monotonic()
+            ready = []
+            while self.retries and self.retries[0][0] <= now:
+                ready.append(heapq.heappop(self.retries)[1])
+            self.requeued.extendleft(reversed(ready))
+
+            while self.requeued:
+                row = self._row(self.requeued.popleft())
+                if row >= 0 and not self.flags[row]:
+                    return self._issue_lease(row, lease_time)
+
+            self._skip_flagged()
+            if self._cursor < len(self.ids):
+                row = self._row_at(self._cursor)
+                self._cursor += 1
+                self._fresh_pending -= 1
+                return self._issue_lease(row, lease_time)
+            return None
+
+    def peek(self, count: int) -> List[int]:
+        """
+        :return: Ids of the next pending assets(retry lane is not included). Used for lookahead
+        """
+        with self._lock:
+            result = list(islice(self.requeued, count))
+            self._skip_flagged()
+            position, rows_count = self._cursor, len(self.ids)
+            while len(result) < count and position < rows_count:
+                row = self._row_at(position)
+                if not self.flags[row]:
+                    result.append(self.ids[row])
+                position += 1
+            return result
+
+    def set_order(self, rows: Optional[Iterable[int]]) -> None:
+        """
+        Change order of the fresh dispatch. Rows already passed by the cursor are kept before it
+
+        :param rows: Permutation of all rows(see assets_manage.dispatch_order), None for manifest order
+        :raises: :exc:`ValueError` if rows are not a permutation
+        """
+        with self._lock:
+            if rows is None and self._cursor == 0:
+                self._order = self._positions = None
+                return
+            rows = array("q", range(len(self.ids)) if rows is None else rows)
+            positions = array("q", [-1]) * len(self.ids)
+            if len(rows) != len(self.ids):
+                raise ValueError(f"Order contains {len(rows)} rows, index contains {len(self.ids)}")
+            order = array("q", (self._row_at(position) for position in range(self._cursor)))
+            for position, row in enumerate(order):
+                positions[row] = position
+            for row in rows:
+                if not 0 <= row < len(self.ids) or positions[row] != -1 and positions[row] >= self._cursor:
+                    raise ValueError(f"Invalid or duplicated row {row}")
+                if positions[row] == -1:
+                    positions[row] = len(order)
+                    order.append(row)
+            self._order, self._positions = order, positions
+
+    def lease(self, asset_id: int) -> Optional[AssetLease]:
+        """
+        :return: Active lease of the asset in progress
+        """
+        return self.leases.get(asset_id, None)
+
+    def claim(self, lease: AssetLease) -> bool:
+        """
+        Renew lease for lease.lease_time. See AssetLease.claim
+        """
+        with self._lock:
+            if lease.revoked:
+                return False
+            lease.claimed = True
+            lease.deadline = monotonic() + lease.lease_time
+            self._last_claimed_serial = max(self._last_claimed_serial, lease.serial)
+            return True
+
+    def reap_expired(self) -> List[int]:
+        """
+        Revoke expired leases and return their assets to the head of the queue
+
+        Claimed lease expires if uploading was not finished in time(e.g. driver thread died).
+        Not claimed lease is revoked only if some later issued lease was already claimed:
+        drivers take assets from the bus in FIFO order, so asset was lost before reaching the driver.
+        Otherwise asset is still waiting in the bus(e.g. bus is locked) and lease is kept
+
+        :return: Ids of returned assets
+        """
+        with self._lock:
+            reaped = sorted((
+                lease for lease in self.leases.values()
+                if lease.expired and (lease.claimed or lease.serial < self._last_claimed_serial)
+            ), key=lambda l: l.serial)
+            for lease in reversed(reaped): # keep dispatch order at the head of the queue
+                self._release(lease.asset_id)
+                self.requeued.appendleft(lease.asset_id)
+            return [lease.asset_id for lease in reaped]
+
+    def _release(self, asset_id: int) -> bool:
+        lease = self.leases.pop(asset_id, None)
+        if lease is None:
+            return False
+        lease.revoked = True
+        row = self._row(asset_id)
+        if row >= 0:
+            self.flags[row] &= ~self.LEASED
+        return True
+
+    def _mark_dead(self, asset_id: int) -> None:
+        row = self._row(asset_id)
+        if row < 0:
+            self._dead_ids.add(asset_id)
+        elif not self.flags[row] & self.DEAD:
+            self._set_flag(row, self.DEAD)
+            self._dead_count += 1
+
+    def mark_uploaded(self, asset_id: int) -> None:
+        with self._lock:
+            self._release(asset_id)
+            row = self._row(asset_id)
+            if row < 0:
+                self._uploaded_ids.add(asset_id)
+            elif not self.flags[row] & self.UPLOADED:
+                self._set_flag(row, self.UPLOADED)
+                self._uploaded_count += 1
+
+    def mark_failed(self, asset_id: int) -> Optional[int]:
+        """
+        Count failed attempt and schedule retry of the asset.
+        If attempts are exceeded, asset is marked as dead
+
+        :return: Attempts count, or None if asset was not in progress
+        """
+        with self._lock:
+            if not self._release(asset_id):
+                return None
+            attempts = self.attempts.get(asset_id, 0) + 1
+            self.attempts[asset_id] = attempts
+            if attempts >= self.max_attempts:
+                self._mark_dead(asset_id)
+            else:
+                heapq.heappush(self.retries, (monotonic() + self.retry_delay(attempts), asset_id))
+            return attempts
+
+    def requeue(self, asset_id: int) -> bool:
+        """
+        Return asset to the head of the queue without counting failed attempt(e.g. upload was throttled by API)
+
+        :return: True if asset was in progress
+        """
+        with self._lock:
+            if not self._release(asset_id):
+                return False
+            self.requeued.appendleft(asset_id)
+            return True
+
+    def mark_rejected(self, asset_id: int) -> None:
+        """
+        Asset can not be uploaded at all(e.g. invalid file) and must not be dispatched again
+        """
+        with self._lock:
+            self._release(asset_id)
+            self._mark_dead(asset_id)
+
+    def revive(self, asset_id: int) -> bool:
+        """
+        Return dead asset to uploading(e.g. its file was fixed). Failed attempts are reset
+
+        :return: True if asset was queued
+        """
+        with self._lock:
+            self.attempts.pop(asset_id, None)
+            row = self._row(asset_id)
+            if row < 0:
+                self._dead_ids.discard(asset_id)
+                return False
+            if not self.flags[row] & self.DEAD:
+                return False
+            self.flags[row] &= ~self.DEAD
+            self._dead_count -= 1
+            if self.flags[row]:
+                return False # uploaded
+            if self._position(row) >= self._cursor:
+                self._fresh_pending += 1
+            else:
+                self.requeued.append(asset_id)
+            return True
+
+    def retry_delay(self, attempts: int) -> float:
+        """
+        Exponential backoff with jitter(random delay in [delay/2, delay]), so assets failed together
+        will not be retried together
+
+        :param attempts: Failed attempts of the asset
+        """
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def next_retry_in(self) -> Optional[float]:
+        """
+        :return: Seconds until the nearest retry, None if retry lane is empty
+        """
+        with self._lock:
+            return max(self.retries[0][0] - monotonic(), 0) if self.retries else None
+
+    def _has_flag(self, asset_id: int, flag: int, unknown_ids: set) -> bool:
+        row = self._row(asset_id)
+        return bool(self.flags[row] & flag) if row >= 0 else asset_id in unknown_ids
+
+    def is_dead(self, asset_id: int) -> bool:
+        return self._has_flag(asset_id, self.DEAD, self._dead_ids)
+
+    def is_uploaded(self, asset_id: int) -> bool:
+        return self._has_flag(asset_id, self.UPLOADED, self._uploaded_ids)
+
+    def is_in_progress(self, asset_id: int) -> bool:
+        """Asset is leased(dispatched to the driver or being prepared for dispatching)"""
+        return asset_id in self.leases
+
+    def manifest_key(self, asset_id: int) -> Hashable:
+        row = self._row(asset_id)
+        if row < 0:
+            raise KeyError(asset_id)
+        return self._keys[row]
+
+    def remap_keys(self, manifest_entries: Iterable[Tuple[Hashable, int]]) -> List[int]:
+        """
+        Manifest was rewritten: manifest keys of the known assets are replaced(see Manifest.keys_version)
+
+        :param manifest_entries: Iterable of (manifest_key, asset_id) pairs of the rewritten manifest
+        :return: Ids of the assets which are not in the manifest anymore
+        """
+        with self._lock:
+            found = bytearray(len(self.ids))
+            for manifest_key, asset_id in manifest_entries:
+                row = self._row(asset_id)
+                if row < 0 or found[row]:
+                    continue # new or duplicated id
+                if isinstance(self._keys, array) and not isinstance(manifest_key, int):
+                    self._keys = self._keys.tolist()
+                self._keys[row] = manifest_key
+                found[row] = 1
+            return [self.ids[row] for row in range(len(self.ids)) if not found[row]]
+
+    def asset_ids(self) -> Iterator[int]:
+        """
+        :return: Ids of all assets in manifest order
+        """
+        return iter(self.ids)
+
+    @property
+    def uploaded_ids(self) -> Set[int]:
+        """Materialized set of uploaded ids. Use is_uploaded for checks"""
+        with self._lock:
+            uploaded = set(self._uploaded_ids)
+            uploaded.update(asset_id for asset_id, flag in zip(self.ids, self.flags) if flag & self.UPLOADED)
+            return uploaded
+
+    @property
+    def uploaded_count(self) -> int:
+        return self._uploaded_count + len(self._uploaded_ids)
+
+    @property
+    def pending_count(self) -> int:
+        return self._fresh_pending + len(self.requeued)
+
+    @property
+    def retry_count(self) -> int:
+        return len(self.retries)
+
+    @property
+    def dead_count(self) -> int:
+        return self._dead_count + len(self._dead_ids)
+
+    @property
+    def in_progress_count(self) -> int:
+        return len(self.leases)
+
+    def __len__(self) -> int:
+        return len(self.ids)
@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+import os
+
+from assets_manage.stat_cache import FileStatCache
+
+
+# (offset, magic bytes, media type). Accepted by the uploading form: image/*, video/*, audio/*, .glb, .gltf
+MAGIC_SIGNATURES = (
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (4, b"ftypavif", "image/avif"),
+    (4, b"ftypqt", "video/quicktime"),
+    (4, b"ftyp", "video/mp4"),
+    (0, b"\x1a\x45\xdf\xa3", "video/webm"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"glTF", "model/gltf-binary"),
+)
+RIFF_SIGNATURES = {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}
+
+SNIFF_SIZE = 1024 # bytes read from the head of the file
+XML_SNIFF_SIZE = 64*1024 # XML declaration, comments and DOCTYPE may precede "<svg"
+_TEXT_PADDING = b"\xef\xbb\xbf \t\r\n" # BOM and whitespaces
+
+
+def _frame_sync_media_type(head: bytes) -> Optional[str]:
+    """
+    MPEG audio without ID3 tag and ADTS AAC start with the frame header: 11 set sync bits, version and layer
+    """
+    if len(head) < 2 or head[0] != 0xff or head[1] & 0xe0 != 0xe0:
+        return None
+    version, layer = (head[1] >> 3) & 3, (head[1] >> 1) & 3
+    if layer == 0:
+        return "audio/aac" if version in (2, 3) else None # ADTS: MPEG-4 or MPEG-2 AAC
+    return "audio/mpeg" if version != 1 else None # version 1 is reserved
+
+
+def read_head(f: BinaryIO) -> bytes:
+    """
+    :return: Head of the file for sniff_media_type. XML files are read up to XML_SNIFF_SIZE bytes until "<svg"
+    """
+    head = f.read(SNIFF_SIZE)
+    if head.lstrip(_TEXT_PADDING).startswith(b"<") and b"<svg" not in head:
+        head += f.read(XML_SNIFF_SIZE - len(head))
+    return head
+
+
+def sniff_media_type(head: bytes, file_name: str = "") -> Optional[str]:
+    """
+    Detect media type of the file by magic bytes
+
+    :param head: Head of the file, see read_head
+    :param file_name: Used only for text formats(.gltf)
+    :return: Media type or None if file type is not accepted for uploading
+    """
+    if head[:4] == b"RIFF":
+        return RIFF_SIGNATURES.get(head[8:12], None)
+    for offset, magic, media_type in MAGIC_SIGNATURES:
+        if head[offset:offset+len(magic)] == magic:
+            return media_type
+    media_type = _frame_sync_media_type(head)
+    if media_type is not None:
+        return media_type
+    text = head.lstrip(_TEXT_PADDING)
+    if text.startswith(b"<") and b"<svg" in head:
+        return "image/svg+xml"
+    if text.startswith(b"{") and file_name.lower().endswith(".gltf"):
+        return "model/gltf+json"
+    return None
+
+
+@dataclass
+class PreflightResult:
+    path: str
+    media_type: Optional[str] = None
+    error: Optional[str] = None # None if asset file can be uploaded
+
+    @property
+    def valid(self) -> bool:
+        return self.error is None
+
+
+class PreflightValidator:
+    """
+    Validates asset files before dispatching them to the drivers: file exists, not empty, not exceeds size limit
+    and has accepted type(by magic bytes, see sniff_media_type). Files are validated in the thread pool
+
+    Sniffing results are cached in the file(JSON Lines) by (path, size, mtime), so re-runs read only changed files
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, max_file_size: int = 100*1024*1024, workers: int = 4) -> None:
+        """
+        :param cache_path: Path to the cache file. Cache is not persisted if None
+        :param max_file_size: Max size of the asset file in bytes
+        :param workers: Threads of the pool
+        """
+        self.max_file_size = max_file_size
+
+        self._cache = FileStatCache(cache_path) # media_type of the files
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="MNU-Preflight")
+
+    def validate(self, path: str) -> PreflightResult:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            return PreflightResult(path, error=f"File not accessible: {e.strerror}")
+        if stat.st_size == 0:
+            return PreflightResult(path, error="File is empty")
+        if stat.st_size > self.max_file_size:
+            return PreflightResult(path, error=f"File size {stat.st_size} exceeds limit {self.max_file_size}")
+
+        cached = self._cache.get(path, stat)
+        if cached is not None:
+            media_type = cached["media_type"]
+        else:
+            try:
+                with open(path, "rb") as f:
+                    head = read_head(f)
+            except OSError as e:
+                return PreflightResult(path, error=f"File not readable: {e.strerror}")
+            media_type = sniff_media_type(head, path)
+            self._cache.put(path, stat, {"media_type": media_type})
+
+        if media_type is None:
+            return PreflightResult(path, error="Unsupported file type")
+        return PreflightResult(path, media_type=media_type)
+
+    def submit(self, path: str) -> "Future[PreflightResult]":
+        return self._executor.submit(self.validate, path)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._cache.close()
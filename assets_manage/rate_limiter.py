@@ -0,0 +1,123 @@
+from threading import Condition
+from typing import Callable
+
+import time
+
+
+class TokenBucketLimiter:
+    """
+    Limits rate of the upload requests of all drivers. Each upload takes a token from the bucket,
+    tokens are refilled with the current rate up to burst
+
+    Rate is adapted to the throttling responses(AIMD): multiplied by backoff_factor on throttling and
+    recovered by recovery_step(share of the ceiling) on each successful upload, up to the configured ceiling
+    """
+
+    backoff_factor: float = 0.5
+    recovery_step: float = 0.05
+    min_rate_share: float = 0.05 # lower limit of the rate, share of the ceiling
+    backoff_cooldown: float = 5 # seconds, throttling responses of the requests already in flight are counted once
+
+    def __init__(self, max_rate: float, burst: float = 1, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param max_rate: Ceiling of the rate, requests per second
+        :param burst: Max tokens in the bucket(requests which may be sent at once)
+        """
+        if max_rate <= 0:
+            raise ValueError(f"max_rate must be positive: {max_rate}")
+        self.max_rate = max_rate
+        self.burst = max(burst, 1)
+        self._clock = clock
+
+        self._condition = Condition()
+        self.rate = max_rate # type: float # current rate, requests per second
+        self._tokens = self.burst # type: float
+        self._refilled_at = clock() # type: float
+        self._backoff_at = None # type: float | None
+        self.throttled_count = 0 # type: int # throttling responses
+        self.backoff_count = 0 # type: int
+
+    @classmethod
+    def per_minute(cls, max_rate_per_minute: float, burst: float = 1) -> "TokenBucketLimiter":
+        return cls(max_rate_per_minute/60, burst)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now-self._refilled_at)*self.rate)
+        self._refilled_at = now
+
+    def time_to_token(self) -> float:
+        """
+        :return: Seconds until the token will be available, 0 if available now
+        """
+        with self._condition:
+            self._refill()
+            return max(1-self._tokens, 0)/self.rate
+
+    def acquire(self, timeout: float = 0) -> bool:
+        """
+        Take a token, wait for it up to timeout
+
+        :return: True if token was taken
+        """
+        deadline = self._clock() + timeout
+        with self._condition:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(min(remaining, (1-self._tokens)/self.rate))
+
+    def refund(self) -> None:
+        """Token was taken, but request was not sent"""
+        with self._condition:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens+1)
+            self._condition.notify()
+
+    def throttled(self) -> bool:
+        """
+        Request was rejected due to rate limiting. Rate is decreased and tokens are dropped
+
+        :return: True if rate was decreased(not in cooldown after the previous back off)
+        """
+        with self._condition:
+            self.throttled_count += 1
+            now = self._clock()
+            if self._backoff_at is not None and now-self._backoff_at < self.backoff_cooldown:
+                return False
+            self._refill()
+            self._backoff_at = now
+            self.backoff_count += 1
+            self.rate = max(self.max_rate*self.min_rate_share, self.rate*self.backoff_factor)
+            self._tokens = min(self._tokens, 0)
+            return True
+
+    def succeeded(self) -> None:
+        """Request was accepted. Rate is recovered toward the ceiling"""
+        with self._condition:
+            if self.rate < self.max_rate:
+                self._refill()
+                self.rate = min(self.max_rate, self.rate + self.max_rate*self.recovery_step)
+                self._condition.notify_all()
+
+    @property
+    def rate_per_minute(self) -> float:
+        return self.rate*60
+
+    @property
+    def stats(self) -> dict:
+        """
+        :return: {"rate_per_minute": FLOAT, "max_rate_per_minute": FLOAT, "throttled": INT, "backoffs": INT}
+        """
+        with self._condition:
+            return {
+                "rate_per_minute": round(self.rate*60, 2),
+                "max_rate_per_minute": round(self.max_rate*60, 2),
+                "throttled": self.throttled_count,
+                "backoffs": self.backoff_count,
+            }
@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import Lock
+from typing import Dict, Iterable, Tuple
+
+import os
+
+
+class FileReadAhead:
+    """
+    Warms page cache for the asset files which will be dispatched soon, so the browser doesn't stall on cold I/O
+    (spinning disks, NFS) while uploading
+
+    Modes:
+        - "fadvise" - posix_fadvise(POSIX_FADV_WILLNEED), kernel reads the file in background. No data is copied
+        - "read"    - file is read in the thread pool and data is dropped(platforms without posix_fadvise)
+
+    Budget limits bytes of the files which were warmed, but not dispatched yet.
+    Asset is counted as warm, if its read-ahead was finished before the dispatch
+    """
+
+    chunk_size: int = 1 << 20 # bytes per read in the "read" mode
+
+    def __init__(self, byte_budget: int, mode: str = "auto", workers: int = 2) -> None:
+        """
+        :param byte_budget: Max bytes of the warmed not dispatched files
+        :param mode: "fadvise", "read" or "auto"(fadvise if available)
+        :param workers: Threads of the pool
+        """
+        if mode == "auto":
+            mode = "fadvise" if hasattr(os, "posix_fadvise") else "read"
+        if mode not in ("fadvise", "read"):
+            raise ValueError(f"Unknown read-ahead mode {mode!r}")
+        self.mode = mode
+        self.byte_budget = byte_budget
+
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="MNU-ReadAhead")
+        self._pending = dict() # type: Dict[int, Tuple[int, Future]] # asset id -> (file size, read-ahead)
+        self._pending_bytes = 0 # type: int
+
+        self.dispatched_count = 0 # type: int
+        self.warm_count = 0 # type: int
+        self.warmed_bytes = 0 # type: int
+
+    def _warm(self, path: str) -> None:
+        with open(path, "rb") as f:
+            if self.mode == "fadvise":
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            else:
+                while f.read(self.chunk_size):
+                    pass
+
+    def prefetch(self, asset_id: int, path: str) -> bool:
+        """
+        Start read-ahead of the asset file, if it fits the budget
+
+        :return: True if read-ahead was started or already in progress
+        """
+        with self._lock:
+            if asset_id in self._pending:
+                return True
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                return False # reported by preflight validation
+            if self._pending and self._pending_bytes + size > self.byte_budget:
+                return False # first file is always warmed, even if it exceeds the budget
+            self._pending[asset_id] = (size, self._executor.submit(self._warm, path))
+            self._pending_bytes += size
+            return True
+
+    def dispatched(self, asset_id: int) -> bool:
+        """
+        Asset was dispatched to the drivers. Releases its budget
+
+        :return: True if asset file was warm
+        """
+        with self._lock:
+            self.dispatched_count += 1
+            size, warming = self._pending.pop(asset_id, (0, None))
+            self._pending_bytes -= size
+            warm = warming is not None and warming.done() and warming.exception() is None
+            if warm:
+                self.warm_count += 1
+                self.warmed_bytes += size
+            return warm
+
+    def retain(self, asset_ids: Iterable[int]) -> None:
+        """Release budget of the assets which left the lookahead window without dispatching(e.g. rejected)"""
+        asset_ids = set(asset_ids)
+        with self._lock:
+            for asset_id in [asset_id for asset_id in self._pending if asset_id not in asset_ids]:
+                size, _ = self._pending.pop(asset_id)
+                self._pending_bytes -= size
+
+    def __contains__(self, asset_id: int) -> bool:
+        return asset_id in self._pending
+
+    @property
+    def stats(self) -> dict:
+        """
+        :return: {"dispatched": INT, "warm": INT, "warm_ratio": FLOAT, "warmed_bytes": INT}
+        """
+        with self._lock:
+            return {
+                "dispatched": self.dispatched_count,
+                "warm": self.warm_count,
+                "warm_ratio": self.warm_count/self.dispatched_count if self.dispatched_count else 0.0,
+                "warmed_bytes": self.warmed_bytes
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional, Container
+
+import os
+import shutil
+
+
+@dataclass
+class StagedFile:
+    path: str
+    size: int
+    copying: Future
+    in_use: bool = False # dispatched and not uploaded yet, must not be evicted
+
+    @property
+    def ready(self) -> bool:
+        return self.copying.done() and self.copying.exception() is None
+
+
+class StagingCache:
+    """
+    Copies asset files from the slow storage(network mounts) to the fast local dir(or tmpfs) ahead of dispatching,
+    so drivers read local copies instead of reading the slow storage concurrently
+
+    Copies are made in the thread pool. Disk budget is limited, least recently used copies are evicted first.
+    Copies of the dispatched assets are kept until they are released(asset uploaded or dead).
+    Staged file keeps original file name: STAGING_DIR/mnu_staging/ASSET_ID-SERIAL/FILE_NAME
+    """
+
+    dir_name: str = "mnu_staging" # owned by the cache, removed on open and close
+
+    def __init__(self, staging_dir: str, byte_budget: int, workers: int = 2) -> None:
+        """
+        :param staging_dir: Local dir for the copies
+        :param byte_budget: Max bytes of the copies
+        :param workers: Threads of the pool(concurrent reads of the slow storage)
+        """
+        self.staging_dir = os.path.join(staging_dir, self.dir_name)
+        self.byte_budget = byte_budget
+
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="MNU-Staging")
+        self._files = OrderedDict() # type: OrderedDict[int, StagedFile] # asset id -> copy, LRU first
+        self._bytes = 0 # type: int
+        self._serial = 0 # type: int # copy of the same asset may be made again, while previous one is removing
+
+        self.dispatched_count = 0 # type: int
+        self.staged_count = 0 # type: int # dispatched from the staged copy
+
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    @staticmethod
+    def _copy(src_path: str, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(src_path, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _remove(self, asset_id: int) -> None:
+        staged = self._files.pop(asset_id)
+        self._bytes -= staged.size
+        staged.copying.add_done_callback(lambda _: shutil.rmtree(os.path.dirname(staged.path), ignore_errors=True))
+
+    def _evict(self, size: int, keep: Container[int]) -> bool:
+        """
+        Evict LRU copies which are not in use and not kept, until size fits the budget
+
+        :return: True if size fits the budget
+        """
+        for asset_id in [asset_id for asset_id, staged in self._files.items() if not staged.in_use and asset_id not in keep]:
+            if self._bytes + size <= self.byte_budget:
+                break
+            self._remove(asset_id)
+        return self._bytes + size <= self.byte_budget
+
+    def stage(self, asset_id: int, src_path: str, keep: Container[int] = ()) -> bool:
+        """
+        Start copying of the asset file, if it fits the budget
+
+        :param keep: Ids of assets which copies must not be evicted(lookahead window)
+        :return: True if copy is made or in progress
+        """
+        with self._lock:
+            if asset_id in self._files:
+                return True
+            try:
+                size = os.stat(src_path).st_size
+            except OSError:
+                return False # reported by preflight validation
+            if not self._evict(size, keep):
+                return False
+            self._serial += 1
+            path = os.path.join(self.staging_dir, f"{asset_id}-{self._serial}", os.path.basename(src_path))
+            self._files[asset_id] = StagedFile(path, size, self._executor.submit(self._copy, src_path, path))
+            self._bytes += size
+            return True
+
+    def __contains__(self, asset_id: int) -> bool:
+        return asset_id in self._files
+
+    def dispatch(self, asset_id: int) -> Optional[str]:
+        """
+        Asset is dispatched to the drivers. Ready copy is locked until release
+
+        :return: Path of the staged copy, None if copy is not ready(original file must be used)
+        """
+        with self._lock:
+            self.dispatched_count += 1
+            staged = self._files.get(asset_id, None)
+            if staged is None or not staged.ready:
+                return None
+            staged.in_use = True
+            self._files.move_to_end(asset_id)
+            self.staged_count += 1
+            return staged.path
+
+    def unlock(self, asset_id: int) -> None:
+        """Upload failed, copy is kept for retry, but can be evicted"""
+        with self._lock:
+            staged = self._files.get(asset_id, None)
+            if staged is not None:
+                staged.in_use = False
+
+    def release(self, asset_id: int) -> None:
+        """Asset will not be uploaded again(uploaded, rejected or dead). Copy is removed"""
+        with self._lock:
+            if asset_id in self._files:
+                self._remove(asset_id)
+
+    @property
+    def stats(self) -> dict:
+        """
+        :return: {"dispatched": INT, "staged": INT, "staged_bytes": INT}
+        """
+        with self._lock:
+            return {"dispatched": self.dispatched_count, "staged": self.staged_count, "staged_bytes": self._bytes}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
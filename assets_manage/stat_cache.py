@@ -0,0 +1,89 @@
+from threading import Lock
+from typing import Optional, Dict, TextIO
+
+import os
+import json
+
+
+class FileStatCache:
+    """
+    Persisted cache of the results computed from the file content(e.g. type, hash)
+
+    Result is valid while size and mtime of the file are the same.
+    File is JSON Lines, each line: {"path": STR, "size": INT, "mtime_ns": INT, ...result}. Last line of the path wins.
+    File is rewritten(only the last lines of the paths are kept) when stale lines exceed max_stale_ratio of the lines
+    """
+
+    max_stale_ratio = 0.5
+    min_compaction_lines = 1024 # smaller files are not rewritten
+
+    def __init__(self, cache_path: Optional[str] = None) -> None:
+        """
+        :param cache_path: Path to the cache file. Cache is kept only in memory if None
+        """
+        self.cache_path = cache_path
+        self._lock = Lock()
+        self._lines = 0 # lines of the cache file
+        self._records = self._load() # type: Dict[str, dict]
+        self._file: Optional[TextIO] = None
+        if self._compaction_needed():
+            self._compact()
+
+    def _load(self) -> Dict[str, dict]:
+        records = dict()
+        if self.cache_path is None or not os.path.isfile(self.cache_path):
+            return records
+        with open(self.cache_path, "rb") as f:
+            for line in f:
+                self._lines += 1
+                try:
+                    record = json.loads(line)
+                    records[record["path"]] = record
+                except (ValueError, KeyError, TypeError):
+                    continue # torn tail after crash
+        return records
+
+    def _compaction_needed(self) -> bool:
+        return self._lines >= self.min_compaction_lines and self._lines - len(self._records) > self.max_stale_ratio*self._lines
+
+    def _compact(self) -> None:
+        """Atomically rewrite the cache file with the actual records. Called under the lock(or from the constructor)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.writelines(json.dumps(record) + "\n" for record in self._records.values())
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            return # cache is still valid, it is rewritten on the next attempt
+        self._lines = len(self._records)
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[dict]:
+        """
+        :return: Cached record or None if file was changed
+        """
+        record = self._records.get(path, None)
+        if record is None or record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+            return None
+        return record
+
+    def put(self, path: str, stat: os.stat_result, result: dict) -> None:
+        record = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, **result}
+        with self._lock:
+            self._records[path] = record
+            if self.cache_path is None:
+                return
+            if self._file is None:
+                self._file = open(self.cache_path, "a")
+            self._file.write(json.dumps(record) + "\n")
+            self._lines += 1
+            if self._compaction_needed():
+                self._compact()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,114 @@
+from typing import List, Iterable
+
+import copy
+import json
+
+
+TRAIT_KEYS = ("properties", "levels", "stats") # trait lists of the asset "props"(see data_holders.SingleAssetData)
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} is shared by assets and read-only, change its copy(list(traits), dict(entry))")
+
+
+class TraitEntry(dict):
+    """
+    Interned trait entry({"name": STR, "value": ...}), shared by all assets with this trait. Read-only.
+    Copies(dict(entry), copy.copy(entry)) are plain dicts
+    """
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo: dict) -> dict:
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class InternedTraits(list):
+    """
+    Trait list built of the shared trait entries, with JSON fragment joined from the cached fragments of the entries.
+    List and its entries are read-only, so the cached JSON can`t become stale(return a new list from SingleAssetData overrides instead).
+    Copies(list(traits), traits + [...], copy.copy(traits)) are plain lists
+    """
+    __slots__ = ("json",)
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def __copy__(self) -> list:
+        return list(self)
+
+    def __deepcopy__(self, memo: dict) -> list:
+        return copy.deepcopy(list(self), memo)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+class TraitsInternTable:
+    """
+    Deduplicates trait entries({"name": STR, "value": ...}) of the manifest.
+    Each unique entry is kept once(addressed by ref = position in `entries`), along with its JSON fragment
+
+    In generated collections trait entries repeat across thousands of assets, while their combinations are mostly unique,
+    so trait list of the asset is stored as refs of its entries(see InMemoryManifest)
+    """
+
+    def __init__(self) -> None:
+        self.entries = [] # type: List[object] # ref -> shared entry(TraitEntry if entry is a dict)
+        self.fragments = [] # type: List[str] # ref -> JSON fragment of the entry
+        self._refs = dict() # type: dict[str, int] # JSON fragment -> ref
+
+    def intern(self, traits: Iterable) -> List[int]:
+        """
+        :return: Refs of the trait entries
+        :raises: :exc:`TypeError`, :exc:`ValueError` if entries are not JSON serializable
+        """
+        refs = []
+        for entry in traits:
+            fragment = json.dumps(entry, separators=(",", ":"))
+            ref = self._refs.get(fragment, None)
+            if ref is None:
+                ref = self._refs[fragment] = len(self.entries)
+                self.entries.append(TraitEntry(entry) if isinstance(entry, dict) else entry)
+                self.fragments.append(fragment)
+            refs.append(ref)
+        return refs
+
+    def traits(self, refs: Iterable[int]) -> InternedTraits:
+        refs = list(refs)
+        traits = InternedTraits(self.entries[ref] for ref in refs)
+        traits.json = "[" + ",".join([self.fragments[ref] for ref in refs]) + "]"
+        return traits
+
+    def copies(self, refs: Iterable[int]) -> list:
+        """:return: Trait list of the new(mutable) entries"""
+        return json.loads("[" + ",".join([self.fragments[ref] for ref in refs]) + "]")
+
+    @classmethod
+    def from_fragments(cls, fragments: List[str]) -> "TraitsInternTable":
+        table = cls()
+        table.intern(json.loads(fragment) for fragment in fragments)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def encode_upload_data(upload_data: dict) -> str:
+    """
+    json.dumps for the asset upload data, which uses cached fragments of the interned trait lists
+
+    :param upload_data: See data_holders.SingleAssetData.as_upload_data_dict()
+    """
+    interned = [(key, value) for key, value in upload_data.items() if type(value) is InternedTraits]
+    if not interned:
+        return json.dumps(upload_data)
+    tail = ", ".join(f"{json.dumps(key)}: {value.json}" for key, value in interned)
+    head = json.dumps({key: value for key, value in upload_data.items() if type(value) is not InternedTraits})
+    return f"{head[:-1]}, {tail}}}" if len(head) > 2 else f"{{{tail}}}"
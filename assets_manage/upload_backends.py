@@ -0,0 +1,263 @@
+"""
+Upload backends. Backend is used by the single worker(see assets_upload_manager.DriverInstance): initialized once,
+uploads assets by its slots(concurrent uploads) and closed when worker stops
+
+    - "selenium" - browser with Metamask and upload page(see driver_init). Slot is an input group of the upload page
+    - "fake"     - in-process simulation of the init time, upload latency and errors. No browser or network,
+                   used for load testing of the upload pipeline(AssetsUploadManager, MNUHandler)
+"""
+from events import EventHolder, ServerEvent
+from data_holders import UploadDataHolder, UploadResponseHolder
+from driver_init import init_driver_before_success, driver_start_upload, driver_wait_uploads, driver_reset_upload
+from config import MetamaskConfig
+
+from dataclasses import dataclass
+from threading import Lock, Event
+from queue import Queue
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import json
+import math
+import random
+import time
+
+
+UploadResult = Union[UploadResponseHolder, Exception] # response or error of the upload
+
+
+class UploadBackend:
+    """
+    Interface of the upload backend. Uploads are started by the slots and completed in any order
+    """
+
+    def __init__(self, slots: int = 1, max_upload_time: float = 60) -> None:
+        """
+        :param slots: Max concurrent uploads
+        :param max_upload_time: Max time of the single upload, seconds. Timeout of wait_uploads never exceeds it
+        """
+        self.slots = max(int(slots), 1) # type: int
+        self.max_upload_time = max_upload_time # type: float
+
+    def init(self, worker_id: int, output_bus: Queue, auth_lock: Lock) -> bool:
+        """
+        Prepare backend for uploading. Reports WORKER_READY(or init failures) to the output bus
+
+        :param auth_lock: Shared by workers of the same account
+        :return: True if backend is ready, False if init attempts are exceeded
+        :raises: :exc:`driver_init.MNUDriverInitError` if backend can't be initialized
+        """
+        raise NotImplementedError
+
+    def start_upload(self, upload_data: UploadDataHolder, slot: int) -> None:
+        """
+        Start uploading of the asset by the free slot
+
+        :raises: Exception if uploading can't be started
+        """
+        raise NotImplementedError
+
+    def wait_uploads(self, timeout: float) -> Dict[int, UploadResult]:
+        """
+        Wait until at least one of the started uploads is completed
+
+        :param timeout: Max time for waiting, seconds
+        :return: Results by slot, empty if nothing was completed in time
+        :raises: Exception if backend failed(all started uploads are lost)
+        """
+        raise NotImplementedError
+
+    def abort_upload(self, slot: int) -> None:
+        """Upload was not completed in time, slot is released. Late response must not be reported for the next upload of the slot"""
+        raise NotImplementedError
+
+    def upload(self, upload_data: UploadDataHolder, wait_in_sec: float) -> UploadResponseHolder:
+        """
+        Upload single asset by the slot 0
+
+        :param wait_in_sec: Max time for waiting response
+        :return: Result of uploading(response)
+        :raises: :exc:`TimeoutError` if response was not received in time
+        """
+        self.start_upload(upload_data, 0)
+        deadline = time.monotonic() + wait_in_sec
+        while True:
+            result = self.wait_uploads(max(deadline-time.monotonic(), 0)).get(0, None)
+            if isinstance(result, Exception):
+                raise result
+            if result is not None:
+                return result
+            if time.monotonic() >= deadline:
+                self.abort_upload(0)
+                raise TimeoutError(f"Upload timeout({wait_in_sec}s)")
+
+    def close(self) -> None:
+        """Release resources. Called from the worker thread"""
+
+
+class SeleniumBackend(UploadBackend):
+    """Browser based uploading. See driver_init"""
+
+    def __init__(self, slots: int = 1, max_upload_time: float = 60) -> None:
+        super().__init__(slots, max_upload_time)
+        self.driver = None
+        self._started = dict() # type: Dict[int, Tuple[float, int]] # slot -> (start time, asset id)
+
+    def init(self, worker_id: int, output_bus: Queue, auth_lock: Lock) -> bool:
+        self.driver = init_driver_before_success(
+            worker_id,
+            output_bus,
+            MetamaskConfig().secret_phase,
+            MetamaskConfig().temp_password,
+            auth_lock=auth_lock,
+            upload_slots=self.slots,
+            max_upload_time=self.max_upload_time
+        )
+        return self.driver is not None
+
+    def start_upload(self, upload_data: UploadDataHolder, slot: int) -> None:
+        start = time.time()
+        try:
+            driver_start_upload(upload_data.asset_data_for_upload, upload_data.file_path, self.driver, input_group_id=slot)
+        except Exception as e:
+            driver_reset_upload(self.driver, slot)
+            raise e
+        self._started[slot] = (start, upload_data.asset_id)
+
+    def wait_uploads(self, timeout: float) -> Dict[int, UploadResult]:
+        if not self._started:
+            return dict()
+        try:
+            completed = driver_wait_uploads(self.driver, list(self._started), timeout)
+        except Exception as e:
+            for slot in list(self._started):
+                self.abort_upload(slot)
+            raise e
+        return {slot: UploadResponseHolder(response, *self._started.pop(slot)) for slot, response in completed.items()}
+
+    def abort_upload(self, slot: int) -> None:
+        """Late response is dropped by the upload tag of the input group, see js_injections.upload_response_tagging"""
+        if self._started.pop(slot, None) is not None:
+            driver_reset_upload(self.driver, slot)
+
+    def close(self) -> None:
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+
+@dataclass
+class _FakeUpload:
+    start: float # time.time()
+    asset_id: int
+    completes_at: float # time.monotonic(), inf if upload is stuck
+    result: Union[str, Exception] # raw response or error
+
+
+class FakeBackend(UploadBackend):
+    """
+    Simulated backend. Durations are log-normal: (median seconds, sigma), sigma 0 gives constant duration.
+    Outcomes of the upload, by probability:
+        - timeout_rate   - response is never received(upload is stuck)
+        - error_rate     - exception in the middle of uploading(e.g. page crashed)
+        - api_error_rate - response with "errors"(rejected by API)
+        - throttle_rate  - response with status 429(rejected by rate limiting)
+        - otherwise the successful response, like the real API returns
+    """
+
+    max_init_attempts: int = 5
+
+    def __init__(self, init_time: Tuple[float, float] = (20, 0.3), upload_time: Tuple[float, float] = (8, 0.4),
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, api_error_rate: float = 0.0, init_failure_rate: float = 0.0,
+                 throttle_rate: float = 0.0, seed: Optional[int] = None, slots: int = 1, max_upload_time: float = 60) -> None:
+        super().__init__(slots, max_upload_time)
+        self.init_time = init_time
+        self.upload_time = upload_time
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.api_error_rate = api_error_rate
+        self.init_failure_rate = init_failure_rate
+        self.throttle_rate = throttle_rate
+
+        self._random = random.Random(seed)
+        self._closed = Event() # interrupts simulated waiting
+        self._uploads = dict() # type: Dict[int, _FakeUpload] # slot -> started upload
+        self.uploaded_count = 0 # type: int
+
+    def _duration(self, distribution: Tuple[float, float]) -> float:
+        median, sigma = distribution
+        return median * self._random.lognormvariate(0, sigma) if sigma > 0 else median
+
+    def init(self, worker_id: int, output_bus: Queue, auth_lock: Lock) -> bool:
+        for _ in range(self.max_init_attempts):
+            start = time.time()
+            with auth_lock: # account login is serialized, as in driver_init
+                self._closed.wait(self._duration(self.init_time))
+            if self._random.random() < self.init_failure_rate:
+                output_bus.put(EventHolder(ServerEvent.WORKER_DRIVER_INITIALIZING_FAILURE, worker_id))
+                continue
+            output_bus.put(EventHolder(ServerEvent.WORKER_READY, {"id": worker_id, "duration": time.time()-start}))
+            return True
+        output_bus.put(EventHolder(ServerEvent.WORKER_DRIVER_INIT_ATTEMPTS_EXCEEDED, worker_id))
+        return False
+
+    def start_upload(self, upload_data: UploadDataHolder, slot: int) -> None:
+        start = time.time()
+        now = time.monotonic()
+        _ = upload_data.asset_data_json # serialized as for the real upload
+        outcome = self._random.random()
+        duration = self._duration(self.upload_time)
+        if outcome < self.timeout_rate:
+            self._uploads[slot] = _FakeUpload(start, upload_data.asset_id, math.inf, "")
+            return
+        outcome -= self.timeout_rate
+        if outcome < self.error_rate:
+            self._uploads[slot] = _FakeUpload(start, upload_data.asset_id, now+self._random.uniform(0, duration), RuntimeError("Upload page crashed(fake)"))
+            return
+        outcome -= self.error_rate
+        if outcome < self.api_error_rate:
+            response = {"errors": [{"message": "Rejected by API(fake)", "locations": []}], "status": 200}
+        elif outcome - self.api_error_rate < self.throttle_rate:
+            response = {"errors": [{"message": "Too many requests(fake)"}], "status": 429}
+        else:
+            token_id = str(self._random.getrandbits(128))
+            response = {"data": {"assets": {"create": {
+                "tokenId": token_id,
+                "assetContract": {"address": "0x" + "f"*40, "chain": "MATIC", "id": "QXNzZXRDb250cmFjdFR5cGU6MA=="},
+                "id": "QXNzZXRUeXBlOjA="
+            }}}, "status": 200}
+        self._uploads[slot] = _FakeUpload(start, upload_data.asset_id, now+duration, json.dumps(response))
+
+    def wait_uploads(self, timeout: float) -> Dict[int, UploadResult]:
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            due = [slot for slot, upload in self._uploads.items() if upload.completes_at <= now]
+            if due or now >= deadline or self._closed.is_set():
+                break
+            next_completion = min((upload.completes_at for upload in self._uploads.values()), default=math.inf)
+            self._closed.wait(min(deadline, next_completion) - now)
+        completed = dict() # type: Dict[int, UploadResult]
+        for slot in due:
+            upload = self._uploads.pop(slot)
+            if isinstance(upload.result, Exception):
+                completed[slot] = upload.result
+                continue
+            response = UploadResponseHolder(upload.result, upload.start, upload.asset_id)
+            if response.successes:
+                self.uploaded_count += 1
+            completed[slot] = response
+        return completed
+
+    def abort_upload(self, slot: int) -> None:
+        self._uploads.pop(slot, None)
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+UPLOAD_BACKENDS = {
+    "selenium": SeleniumBackend,
+    "fake": FakeBackend,
+} # type: dict[str, type[UploadBackend]]
+
+BackendFactory = Callable[[], UploadBackend]
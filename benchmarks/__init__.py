@@ -0,0 +1,6 @@
+"""
+Micro-benchmarks of the uploading pipeline
+
+Each module can be run separately:
+>python -m benchmarks.<module_name> -h
+"""
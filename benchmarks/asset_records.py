@@ -0,0 +1,69 @@
+"""
+Asset records(see data_holders.SingleAssetData) built per second:
+    config per asset - collection info converted from the config for each record(CollectionConfig.dict_like)
+    shared info      - single CollectionInfo for all records, as AssetsHandler does
+Each mode is measured for path only(preflight, sizes, read-ahead lookahead) and for the full upload data(dispatch)
+
+run module:
+>python -m benchmarks.asset_records
+>python -m benchmarks.asset_records --assets 100000
+"""
+from config import CollectionConfig
+from data_holders import getAssetDataHolderClass, CollectionInfo
+
+from typing import Callable, List
+
+import argparse
+import time
+
+import asset_data_holder  # imported for registering subclasses
+
+
+def synthetic_entries(assets_count: int) -> List[dict]:
+    return [{
+        "id": i,
+        "file_name": f"asset_{i}.png",
+        "props": {
+            "properties": [{"name": "Background", "value": f"Color {i % 7}"}, {"name": "Eyes", "value": f"Type {i % 11}"}],
+            "levels": [{"name": "Level", "value": i % 100, "max": 100}],
+        }
+    } for i in range(assets_count)]
+
+
+def records_per_second(entries: List[dict], build: Callable[[dict], object]) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for entry in entries:
+            build(entry)
+        best = min(best, time.perf_counter()-start)
+    return len(entries) / best
+
+
+def run(assets_count: int) -> None:
+    holder_class = getAssetDataHolderClass()
+    config = CollectionConfig(hide_errors=True, disable_warnings=True)
+    config.collection_name = "Collection"
+    config.collection_dir_local_path = "collection"
+    config.single_asset_name = "Asset"
+    config.use_absolute_path = False
+    info = CollectionInfo(config.dict_like)
+    entries = synthetic_entries(assets_count)
+
+    modes = [
+        ("config per asset", lambda entry: holder_class(entry, collection_info=config.dict_like)),
+        ("shared info", lambda entry: holder_class(entry, collection_info=info)),
+    ]
+    print(f"{'mode':>16} | {'path, records/s':>16} | {'upload data, records/s':>22}")
+    for name, make in modes:
+        path_only = records_per_second(entries, lambda entry: make(entry).path)
+        upload_data = records_per_second(entries, lambda entry: make(entry).as_upload_data_dict())
+        print(f"{name:>16} | {path_only:>16,.0f} | {upload_data:>22,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=50_000)
+    args = parser.parse_args()
+
+    run(args.assets)
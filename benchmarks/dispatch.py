@@ -0,0 +1,81 @@
+"""
+Per-dispatch cost of the pending assets index
+
+run module:
+>python -m benchmarks.dispatch
+>python -m benchmarks.dispatch --sizes 1000 10000 --legacy
+"""
+from assets_manage.pending_index import PendingAssetsIndex
+
+from typing import Sequence
+
+import argparse
+import time
+
+
+def synthetic_assets_data(assets_count: int) -> dict:
+    return {f"asset {i}": {"id": i, "file_name": f"asset_{i}.png"} for i in range(assets_count)}
+
+
+def bench_pending_index(assets_data: dict, uploaded_share: float = 0.5) -> float:
+    """
+    Dispatch every pending asset and mark it as uploaded
+
+    :return: Nanoseconds per dispatch
+    """
+    assets_count = len(assets_data)
+    index = PendingAssetsIndex(
+        ((name, data["id"]) for name, data in assets_data.items()),
+        uploaded_ids=range(0, assets_count, int(1/uploaded_share)) if uploaded_share else ()
+    )
+    dispatched = 0
+    start = time.perf_counter_ns()
+    while True:
+        asset_id = index.pop_next()
+        if asset_id is None:
+            break
+        _ = assets_data[index.manifest_key(asset_id)]
+        index.mark_uploaded(asset_id)
+        dispatched += 1
+    return (time.perf_counter_ns()-start)/max(dispatched, 1)
+
+
+def bench_linear_scan(assets_data: dict, uploaded_share: float = 0.5) -> float:
+    """
+    Reproduces dispatch of MNU <= 0.7.4 (scan of the manifest + list of uploaded ids)
+
+    :return: Nanoseconds per dispatch
+    """
+    assets_count = len(assets_data)
+    uploaded_ids = list(range(0, assets_count, int(1/uploaded_share))) if uploaded_share else []
+    dispatched = 0
+    start = time.perf_counter_ns()
+    while True:
+        found = None # type: dict | None
+        for name, data in assets_data.items():
+            if not data.get("upload_in_progress", False) and data["id"] not in uploaded_ids:
+                data["upload_in_progress"] = True
+                found = data
+                break
+        if found is None:
+            break
+        uploaded_ids.append(found["id"])
+        dispatched += 1
+    return (time.perf_counter_ns()-start)/max(dispatched, 1)
+
+
+def run(sizes: Sequence[int], legacy: bool = False, legacy_limit: int = 5000) -> None:
+    print(f"{'assets':>10} | {'index ns/dispatch':>18} | {'scan ns/dispatch':>18}")
+    for size in sizes:
+        index_ns = bench_pending_index(synthetic_assets_data(size))
+        scan_ns = bench_linear_scan(synthetic_assets_data(size)) if legacy and size <= legacy_limit else None
+        print(f"{size:>10} | {index_ns:>18.0f} | {'-' if scan_ns is None else f'{scan_ns:.0f}':>18}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy", help="Also measure linear manifest scan(only for small sizes)", action="store_true", default=False)
+    args = parser.parse_args()
+
+    run(args.sizes, legacy=args.legacy)
@@ -0,0 +1,74 @@
+"""
+Makespan of the upload run with different dispatch orders(see assets_manage.dispatch_order). Simulation, no browser
+
+Collection: images(log-normal, median 2 MiB) with runs of large videos(log-normal, median 60 MiB), as they appear
+when the collection dir is sorted by name. Upload time = form overhead + size/bandwidth of the driver, with noise,
+which is unknown to the policies(they see only sizes)
+
+Ordering matters when single large file is a noticeable part of the driver's share of work:
+small batches or many drivers. Large batches are balanced by any order
+
+run module:
+>python -m benchmarks.dispatch_order
+>python -m benchmarks.dispatch_order --assets 100 1000 --workers 4 8 --seeds 5
+"""
+from assets_manage.dispatch_order import DISPATCH_ORDERS, simulate_makespan
+
+from typing import List, Sequence
+
+import argparse
+import random
+import statistics
+
+
+MiB = 2**20
+
+
+def synthetic_collection(assets_count: int, rng: random.Random, video_share: float = 0.05, run_length: int = 20) -> List[int]:
+    """
+    :return: File sizes in manifest order
+    """
+    sizes = []
+    while len(sizes) < assets_count:
+        if rng.random() < video_share / run_length * 2: # runs of videos
+            sizes.extend(int(rng.lognormvariate(0, 0.7) * 60 * MiB) for _ in range(rng.randint(1, run_length)))
+        else:
+            sizes.append(int(rng.lognormvariate(0, 0.6) * 2 * MiB))
+    return sizes[:assets_count]
+
+
+def upload_durations(sizes: Sequence[int], rng: random.Random, overhead: float = 8, bandwidth: float = 0.5*MiB, noise: float = 0.2) -> List[float]:
+    """
+    :return: Seconds of uploading of each asset
+    """
+    return [(overhead + size/bandwidth) * rng.uniform(1-noise, 1+noise) for size in sizes]
+
+
+def run(assets_counts: Sequence[int], workers_counts: Sequence[int], seeds: int) -> None:
+    policies = list(DISPATCH_ORDERS)
+    print(f"{'assets':>7} | {'workers':>7} | " + " | ".join(f"{name:>14}" for name in policies))
+    for assets_count, workers in ((a, w) for a in assets_counts for w in workers_counts):
+        results = {name: [] for name in policies} # type: dict[str, list[float]]
+        for seed in range(seeds):
+            rng = random.Random(seed)
+            sizes = synthetic_collection(assets_count, rng)
+            durations = upload_durations(sizes, rng)
+            for name in policies:
+                results[name].append(simulate_makespan(durations, DISPATCH_ORDERS[name](sizes, workers), workers))
+        baseline = statistics.median(results["manifest"])
+        cells = []
+        for name in policies:
+            makespan = statistics.median(results[name])
+            cells.append(f"{makespan/60:>6.1f} {(makespan-baseline)/baseline:>+7.1%}")
+        print(f"{assets_count:>7} | {workers:>7} | " + " | ".join(f"{cell:>14}" for cell in cells))
+    print("makespan in minutes(median of seeds) and change vs manifest order")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", nargs="+", type=int, default=[100, 300, 1000])
+    parser.add_argument("--workers", nargs="+", type=int, default=[4, 8, 16])
+    parser.add_argument("--seeds", type=int, default=15)
+    args = parser.parse_args()
+
+    run(args.assets, args.workers, args.seeds)
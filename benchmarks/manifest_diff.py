@@ -0,0 +1,78 @@
+"""
+Change detection on the large manifests(see assets_manage.fingerprints):
+    build - single pass over the manifest: hashes of the raw entries and os.stat of the asset files
+    diff  - merge pass over saved and current fingerprints
+Asset files don't exist, so stat measures the lookup cost only(warm dentry cache)
+
+run module:
+>python -m benchmarks.manifest_diff
+>python -m benchmarks.manifest_diff --sizes 100000 1000000 --workers 8
+"""
+from assets_manage.fingerprints import ManifestFingerprints
+from assets_manage.manifest import InMemoryManifest, StreamingManifest
+
+from typing import Callable, Sequence, Tuple
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+
+def synthetic_entry(i: int, changed: bool = False) -> dict:
+    return {
+        "id": i,
+        "file_name": f"asset_{i}.png",
+        "props": {
+            "properties": [{"name": "Background", "value": f"Color {i % 7}"}, {"name": "Eyes", "value": "Changed" if changed else f"Type {i % 11}"}],
+            "levels": [{"name": "Level", "value": i % 100, "max": 100}],
+        }
+    }
+
+
+def write_jsonl(manifest_path: str, assets_count: int, changed_every: int = 0) -> None:
+    with open(manifest_path, "w") as f:
+        for i in range(assets_count):
+            f.write(json.dumps({f"asset {i}": synthetic_entry(i, changed=changed_every and i % changed_every == 0)}) + "\n")
+
+
+def measure(func: Callable[[], object]) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter()-start, result
+
+
+def run(sizes: Sequence[int], workers: int) -> None:
+    changed_every = 1000
+    print(f"{'assets':>10} | {'manifest':>18} | {'build, s':>9} | {'build+stat, s':>13} | {'diff, s':>8} | {'changed':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            old_path, new_path = os.path.join(tmp_dir, "old.jsonl"), os.path.join(tmp_dir, "new.jsonl")
+            write_jsonl(old_path, size)
+            write_jsonl(new_path, size, changed_every)
+            manifests = [
+                ("StreamingManifest", lambda path: StreamingManifest(path)),
+                ("InMemoryManifest", lambda path: InMemoryManifest({"assets_data": {
+                    k: v for line in open(path, "rb") for k, v in json.loads(line).items()
+                }})),
+            ]
+            for name, load in manifests:
+                old, new = load(old_path), load(new_path) # type: Manifest, Manifest
+                saved = ManifestFingerprints.build(old, tmp_dir, with_files=False)
+                build, current = measure(lambda: ManifestFingerprints.build(new, tmp_dir, with_files=False))
+                build_stat, _ = measure(lambda: ManifestFingerprints.build(new, tmp_dir, workers=workers))
+                diff_time, diff = measure(lambda: saved.diff(current))
+                assert len(diff.changed) == -(-size // changed_every)
+                print(f"{size:>10} | {name:>18} | {build:>9.2f} | {build_stat:>13.2f} | {diff_time:>8.3f} | {len(diff.changed):>8}")
+                old.close()
+                new.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100_000, 1_000_000])
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    run(args.sizes, args.workers)
@@ -0,0 +1,130 @@
+"""
+Memory used by the manifest state: parsed manifest + pending assets index
+
+    before - manifest kept as parsed nested dicts, index with dict(id -> key), deque of ids and set of uploaded ids
+    after  - columnar InMemoryManifest(converted from the parsed dicts) and PendingAssetsIndex
+    cached - the same columns restored from the compiled manifest cache(restart), parsed dicts are never built
+
+Each measurement runs in a separate process. RSS is measured after the state is built(steady) and at peak
+
+run module:
+>python -m benchmarks.manifest_memory
+>python -m benchmarks.manifest_memory --sizes 100000 1000000
+"""
+from collections import deque
+from typing import Sequence, Tuple
+
+import argparse
+import gc
+import importlib
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+
+def rss_mb() -> float:
+    """Current RSS(Linux), peak RSS on other platforms"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def synthetic_manifest(assets_count: int) -> dict:
+    """Manifest as it returned by YAML parser"""
+    return {
+        "assets_data": {
+            f"asset {i}": {"id": i, "file_name": f"asset_{i}.png", "path": f"/home/user/collections/my_collection/asset_{i}.png"}
+            for i in range(assets_count)
+        },
+        "assets_count": assets_count
+    }
+
+
+def build_state(mode: str, assets_count: int, cache_dir: str, uploaded_share: float = 0.5) -> object:
+    from assets_manage.manifest import InMemoryManifest
+    from assets_manage.pending_index import PendingAssetsIndex
+    uploaded_ids = range(0, assets_count, int(1/uploaded_share))
+    if mode == "cached":
+        columnar = InMemoryManifest.load(os.path.join(cache_dir, "0manifest.yaml"))
+        return columnar, PendingAssetsIndex(columnar.entries(), uploaded_ids=uploaded_ids)
+
+    manifest = synthetic_manifest(assets_count)
+    if mode == "before":
+        assets_data = manifest["assets_data"]
+        manifest_keys = {asset_data["id"]: name for name, asset_data in assets_data.items()}
+        uploaded = set(uploaded_ids)
+        pending = deque(asset_id for asset_id in manifest_keys if asset_id not in uploaded)
+        return manifest, manifest_keys, uploaded, pending
+
+    columnar = InMemoryManifest(manifest)
+    del manifest
+    return columnar, PendingAssetsIndex(columnar.entries(), uploaded_ids=uploaded_ids)
+
+
+def write_compiled_cache(cache_dir: str, assets_count: int) -> None:
+    """YAML manifest(content is only hashed by the cache) and its compiled cache"""
+    from assets_manage.manifest import CompiledManifestCache, InMemoryManifest
+    manifest_path = os.path.join(cache_dir, "0manifest.yaml")
+    with open(manifest_path, "w") as f:
+        f.write(f"assets_count: {assets_count}\n")
+    CompiledManifestCache(manifest_path).save(InMemoryManifest(synthetic_manifest(assets_count)))
+
+
+def measure(mode: str, assets_count: int, cache_dir: str) -> Tuple[float, float]:
+    """
+    :return: (steady RSS growth, peak RSS growth) in MiB
+    """
+    for module in ("assets_manage.manifest", "assets_manage.pending_index"):
+        importlib.import_module(module) # imports are not part of the state
+    gc.collect()
+    base = rss_mb()
+    state = build_state(mode, assets_count, cache_dir)
+    gc.collect()
+    steady = rss_mb() - base
+    del state # state is alive while measured
+    return steady, peak_rss_mb() - base
+
+
+def measure_in_subprocess(mode: str, assets_count: int, cache_dir: str) -> Tuple[float, float]:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.manifest_memory", "--child", mode, str(assets_count), cache_dir],
+        check=True, capture_output=True, text=True
+    ).stdout
+    steady, peak = output.split()
+    return float(steady), float(peak)
+
+
+def run(sizes: Sequence[int]) -> None:
+    modes = ("before", "after", "cached")
+    print(f"{'assets':>10} | " + " | ".join(f"{mode + ' MiB':>11} | {'B/asset':>8} | {'peak MiB':>9}" for mode in modes))
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # in the child too: peak RSS of the parent is inherited by children
+            subprocess.run([sys.executable, "-m", "benchmarks.manifest_memory", "--child", "prepare", str(size), cache_dir], check=True)
+            results = [measure_in_subprocess(mode, size, cache_dir) for mode in modes]
+        print(f"{size:>10} | " + " | ".join(
+            f"{steady:>11.1f} | {steady*2**20/size:>8.0f} | {peak:>9.1f}" for steady, peak in results
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100_000, 1_000_000])
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child and args.child[0] == "prepare":
+        write_compiled_cache(args.child[2], int(args.child[1]))
+    elif args.child:
+        print(*measure(args.child[0], int(args.child[1]), args.child[2]))
+    else:
+        run(args.sizes)
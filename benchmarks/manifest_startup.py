@@ -0,0 +1,66 @@
+"""
+Startup cost of the YAML manifest: pure-Python loader vs libyaml loader vs compiled cache
+
+run module:
+>python -m benchmarks.manifest_startup
+>python -m benchmarks.manifest_startup --sizes 1000 10000 100000
+"""
+from assets_manage.manifest import CompiledManifestCache, InMemoryManifest, parse_yaml_manifest
+
+from typing import Callable, Sequence
+
+import argparse
+import os
+import tempfile
+import time
+import yaml
+
+
+def write_synthetic_manifest(manifest_path: str, assets_count: int) -> None:
+    assets_data = {
+        f"asset {i}": {
+            "id": i,
+            "attrs": [],
+            "file_name": f"asset_{i}.png",
+            "path": f"/collection/asset_{i}.png",
+            "props": {
+                "properties": [{"name": "Background", "value": f"Color {i % 7}"}, {"name": "Eyes", "value": f"Type {i % 11}"}],
+                "levels": [{"name": "Level", "value": i % 100, "max": 100}],
+                "stats": [{"name": "Power", "value": i % 50, "max": 50}],
+            }
+        } for i in range(assets_count)
+    }
+    with open(manifest_path, "w") as f:
+        yaml.dump({"assets_data": assets_data, "assets_count": assets_count}, f, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper))
+
+
+def measure(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter()-start
+
+
+def run(sizes: Sequence[int]) -> None:
+    with_libyaml = hasattr(yaml, "CSafeLoader")
+    print(f"{'assets':>10} | {'SafeLoader, s':>14} | {'CSafeLoader, s':>14} | {'compiled, s':>12}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, "0manifest.yaml")
+            write_synthetic_manifest(manifest_path, size)
+
+            cold = measure(lambda: parse_yaml_manifest(manifest_path, loader=yaml.SafeLoader))
+            libyaml = measure(lambda: parse_yaml_manifest(manifest_path)) if with_libyaml else None
+
+            cache = CompiledManifestCache(manifest_path)
+            cache.save(InMemoryManifest(parse_yaml_manifest(manifest_path)))
+            compiled = measure(cache.load)
+
+        print(f"{size:>10} | {cold:>14.3f} | {'-' if libyaml is None else f'{libyaml:.3f}':>14} | {compiled:>12.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000])
+    args = parser.parse_args()
+
+    run(args.sizes)
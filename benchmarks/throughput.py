@@ -0,0 +1,249 @@
+"""
+End-to-end throughput of the upload pipeline without browser: AssetsUploadManager -> AssetsHandler -> drivers with
+the fake backend(see assets_manage.upload_backends). Events are handled like MNUHandler.run does
+(MNUHandler itself also starts HTTP server and UI, so only its uploading events section is reproduced)
+
+Each driver count from 1 to AssetsUploadManager.maximum_drivers uploads fresh synthetic collection.
+Backend durations are multiplied by time_scale, results are converted back to the simulated time:
+    aph          - uploaded assets per simulated hour(drivers init is excluded)
+    latency_s    - p50/p95/p99 of per-asset latency, simulated seconds: from the start of uploading by the driver
+                   to the moment when the result is recorded by the handler
+    starvation   - time upload slots waited for the next asset while collection was not finished(wall seconds and share
+                   of slots time). Pipeline overhead is real time, so its share grows when time_scale is small
+    rate_limiter - throttling responses, back offs and the final rate(per simulated minute), if --rate-limit is set
+    data_keeper  - wall seconds spent in DataKeeper.record(event loop) and in writes of the batches(writer thread)
+
+Output is JSON, for comparing runs across commits
+
+run module:
+>python -m benchmarks.throughput
+>python -m benchmarks.throughput --assets 500 --time-scale 0.01 --error-rate 0.05 --output aph.json
+>python -m benchmarks.throughput --drivers 2 --slots 3 --rate-limit 30 --throttle-rate 0.02
+"""
+from config import CollectionConfig
+from events import ServerEvent
+from data_holders import UploadDataHolder
+from assets_manage.assets_handler import AssetsHandler
+from assets_manage.assets_upload_manager import AssetsUploadManager
+from assets_manage.upload_backends import FakeBackend, UploadResult
+
+from queue import Queue, Empty
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import yaml
+
+
+class TimedFakeBackend(FakeBackend):
+    """Fake backend which records start of each upload and idle time of the slots between uploads"""
+
+    def __init__(self, timings: "RunTimings", **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.timings = timings
+        self._last_end = dict() # type: Dict[int, float] # slot -> end of the last upload
+
+    def start_upload(self, upload_data: UploadDataHolder, slot: int) -> None:
+        start = time.perf_counter()
+        self.timings.upload_started(upload_data.asset_id, start, start-self._last_end[slot] if slot in self._last_end else 0.0)
+        super().start_upload(upload_data, slot)
+
+    def wait_uploads(self, timeout: float) -> Dict[int, UploadResult]:
+        completed = super().wait_uploads(timeout)
+        for slot in completed:
+            self._last_end[slot] = time.perf_counter()
+        return completed
+
+    def abort_upload(self, slot: int) -> None:
+        super().abort_upload(slot)
+        self._last_end[slot] = time.perf_counter()
+
+
+class RunTimings:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.starts = dict() # type: Dict[int, float] # asset id -> start of the last upload attempt
+        self.latencies = [] # type: List[float]
+        self.idle = 0.0 # type: float # slots time between uploads
+        self.record_time = 0.0 # type: float
+        self.commit_time = 0.0 # type: float
+
+    def upload_started(self, asset_id: int, start: float, idle: float) -> None:
+        with self._lock:
+            self.starts[asset_id] = start
+            self.idle += idle
+
+    def recorded(self, asset_id: int) -> None:
+        self.latencies.append(time.perf_counter()-self.starts[asset_id])
+
+
+def timed(func: Callable, add: Callable[[float], None]) -> Callable:
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            add(time.perf_counter()-start)
+    return wrapper
+
+
+def synthetic_collection(collection_dir: str, assets_count: int) -> CollectionConfig:
+    manifest = {"assets_data": {
+        f"asset {i}": {"id": i, "file_name": f"{i}.png", "props": {"properties": [{"name": "Background", "value": f"Color {i % 7}"}]}}
+        for i in range(assets_count)
+    }}
+    with open(os.path.join(collection_dir, AssetsHandler.collection_manifest), "w") as f:
+        yaml.safe_dump(manifest, f, sort_keys=False)
+    for i in range(assets_count):
+        with open(os.path.join(collection_dir, f"{i}.png"), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + os.urandom(1024))
+
+    config = CollectionConfig(hide_errors=True, disable_warnings=True)
+    for attr in config.config_attrs():
+        setattr(config, attr.name, attr.default)
+    config.collection_name = "Benchmark"
+    config.collection_dir_local_path = collection_dir
+    config.single_asset_name = "Asset"
+    config.use_absolute_path = False
+    config.duplicate_assets = "off"
+    config.detect_changes = False
+    return config
+
+
+def percentile(values: List[float], p: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[p-1] if len(values) > 1 else (values[0] if values else 0.0)
+
+
+def run_once(drivers: int, assets_count: int, time_scale: float, backend_options: dict, max_upload_time: float, rate_limit: float = 0) -> dict:
+    timings = RunTimings()
+    with tempfile.TemporaryDirectory() as collection_dir:
+        config = synthetic_collection(collection_dir, assets_count)
+        config.max_upload_time = max_upload_time * time_scale
+        config.upload_rate_limit = rate_limit / time_scale
+        bus = Queue()
+        seeds = itertools.count(backend_options.get("seed", 0)) # drivers have different random sequences
+        manager = AssetsUploadManager(
+            bus,
+            backend_factory=lambda: TimedFakeBackend(timings, **dict(backend_options, seed=next(seeds))),
+            collection_config=config
+        )
+        handler = manager.assets_handler
+        handler.pending_index.retry_base_delay *= time_scale
+        handler.pending_index.retry_max_delay *= time_scale
+        if manager.rate_limiter is not None:
+            manager.rate_limiter.backoff_cooldown *= time_scale
+        keeper = handler.data_keeper
+        keeper.record = timed(keeper.record, lambda t: setattr(timings, "record_time", timings.record_time + t))
+        keeper._commit = timed(keeper._commit, lambda t: setattr(timings, "commit_time", timings.commit_time + t))
+
+        try:
+            manager.init_drivers(drivers)
+            ready = 0
+            while ready < drivers:
+                event = bus.get(timeout=60)
+                if event.check(ServerEvent.WORKER_READY):
+                    ready += 1
+                elif event.check(ServerEvent.WORKER_DRIVER_INIT_ATTEMPTS_EXCEEDED):
+                    drivers -= 1
+            start = time.perf_counter()
+            timings.idle = 0.0
+            manager.unlock_drivers_input_bus()
+            failed = 0
+            while handler.uploaded_assets_count + handler.pending_index.dead_count < assets_count:
+                try:
+                    event = bus.get(timeout=1)
+                except Empty:
+                    continue
+                payload = event.payload
+                if event.check(ServerEvent.WORKER_COMPLETED_UPLOAD):
+                    if handler.asset_uploaded(payload):
+                        timings.recorded(payload.asset_id)
+                    else:
+                        failed += 1
+                elif event.check(ServerEvent.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD, ServerEvent.WORKER_UPLOAD_TIMEOUT_EXCEPTION):
+                    failed += 1
+                    handler.asset_uploading_failed(payload.asset_id, payload.error)
+            keeper.flush()
+            elapsed = time.perf_counter() - start
+        finally:
+            manager.on_stop()
+
+    simulated = elapsed / time_scale
+    slots = backend_options.get("slots", 1)
+    latencies = [latency / time_scale for latency in timings.latencies]
+    return {
+        "drivers": drivers,
+        "uploaded": len(latencies),
+        "failed_attempts": failed,
+        "dead": handler.pending_index.dead_count,
+        "wall_s": round(elapsed, 3),
+        "aph": round(len(latencies) / simulated * 3600, 1),
+        "aph_per_driver": round(len(latencies) / simulated * 3600 / max(drivers, 1), 1),
+        "latency_s": {f"p{p}": round(percentile(latencies, p), 3) for p in (50, 95, 99)},
+        "starvation": {"wall_s": round(timings.idle, 3), "share": round(timings.idle / (elapsed * max(drivers * slots, 1)), 4)},
+        "data_keeper": {"record_wall_s": round(timings.record_time, 4), "commit_wall_s": round(timings.commit_time, 4)},
+        "rate_limiter": None if manager.rate_limiter is None else {
+            "throttled": manager.rate_limiter.throttled_count,
+            "backoffs": manager.rate_limiter.backoff_count,
+            "rate_per_minute": round(manager.rate_limiter.rate_per_minute * time_scale, 2),
+        },
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(assets_count: int, drivers_counts: List[int], time_scale: float, backend_options: dict, max_upload_time: float, rate_limit: float = 0) -> dict:
+    return {
+        "commit": git_commit(),
+        "assets": assets_count,
+        "time_scale": time_scale,
+        "max_upload_time": max_upload_time,
+        "rate_limit": rate_limit,
+        "backend": {key: value for key, value in backend_options.items() if key != "seed"},
+        "runs": [run_once(drivers, assets_count, time_scale, backend_options, max_upload_time, rate_limit) for drivers in drivers_counts],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=300)
+    parser.add_argument("--drivers", nargs="+", type=int, default=list(range(1, AssetsUploadManager._maximum_drivers+1)))
+    parser.add_argument("--time-scale", type=float, default=0.005, help="Multiplier of the simulated durations")
+    parser.add_argument("--upload-time", nargs=2, type=float, default=[8, 0.4], metavar=("MEDIAN", "SIGMA"), help="Simulated seconds")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--max-upload-time", type=float, default=60, help="Simulated seconds")
+    parser.add_argument("--slots", type=int, default=1, help="Concurrent uploads of each driver")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Uploads per simulated minute of all drivers, 0 - unlimited")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write JSON to the file")
+    args = parser.parse_args()
+
+    scale = args.time_scale
+    result = run(args.assets, args.drivers, scale, {
+        "init_time": (20 * scale, 0.3),
+        "upload_time": (args.upload_time[0] * scale, args.upload_time[1]),
+        "error_rate": args.error_rate,
+        "timeout_rate": args.timeout_rate,
+        "throttle_rate": args.throttle_rate,
+        "slots": args.slots,
+        "seed": args.seed,
+    }, args.max_upload_time, args.rate_limit)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
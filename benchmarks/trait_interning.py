@@ -0,0 +1,97 @@
+"""
+Interned trait lists(see assets_manage.traits) on the trait-heavy collection:
+    memory - Python heap of InMemoryManifest restored from the compiled cache(tracemalloc), with and without interning
+    encode - serialization of the upload data per dispatch: json.dumps vs encode_upload_data
+
+run module:
+>python -m benchmarks.trait_interning
+>python -m benchmarks.trait_interning --sizes 10000 100000
+"""
+from assets_manage.manifest import CompiledManifestCache, InMemoryManifest
+from assets_manage.traits import encode_upload_data
+
+from typing import Sequence, Tuple
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+
+TRAIT_TYPES = ("Background", "Body", "Eyes", "Mouth", "Hat", "Clothes", "Accessory", "Earring")
+
+
+def synthetic_manifest(assets_count: int) -> dict:
+    """Generated collection: each trait type has a small pool of values"""
+    return {"assets_data": {
+        f"asset {i}": {
+            "id": i,
+            "file_name": f"asset_{i}.png",
+            "props": {
+                "properties": [{"name": trait, "value": f"{trait} {(i // (n+1)) % (5+n)}"} for n, trait in enumerate(TRAIT_TYPES)],
+                "levels": [{"name": "Level", "value": i % 10, "max": 10}],
+                "stats": [{"name": "Power", "value": i % 5, "max": 5}, {"name": "Speed", "value": i % 3, "max": 3}],
+            }
+        } for i in range(assets_count)
+    }}
+
+
+def heap_of_cached_manifest(manifest: dict, intern_traits: bool) -> Tuple[float, InMemoryManifest]:
+    """
+    :return: (MiB allocated by the manifest restored from the cache, manifest)
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manifest_path = os.path.join(tmp_dir, "0manifest.yaml")
+        with open(manifest_path, "w") as f:
+            f.write("assets_data: {}\n")
+        cache = CompiledManifestCache(manifest_path)
+        cache.save(InMemoryManifest(manifest, intern_traits))
+        tracemalloc.start()
+        restored = cache.load()
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    restored.intern_traits = intern_traits
+    return allocated / 2**20, restored
+
+
+def upload_data(asset_data: dict) -> dict:
+    """Like data_holders.SingleAssetData.as_upload_data_dict()"""
+    props = asset_data["props"]
+    return {
+        "collection": "Collection", "name": f"Asset #{asset_data['id']}", "description": "Description",
+        "externalLink": None, "properties": props["properties"], "levels": props["levels"], "stats": props["stats"],
+        "unlockableContent": None, "isNsfw": False, "maxSupply": "1", "chain": "MATIC", "recaptchaToken": "x"*512
+    }
+
+
+def run(sizes: Sequence[int]) -> None:
+    print(f"{'assets':>10} | {'heap plain, MiB':>15} | {'heap interned, MiB':>18} | {'trait entries':>13} | {'json.dumps, us':>14} | {'interned, us':>12}")
+    for size in sizes:
+        manifest = synthetic_manifest(size)
+        plain_mib, plain = heap_of_cached_manifest(manifest, intern_traits=False)
+        interned_mib, interned = heap_of_cached_manifest(manifest, intern_traits=True)
+        del manifest
+
+        rows = range(0, size, max(1, size // 1000))
+        plain_data = [upload_data(plain.get(row)) for row in rows]
+        interned_data = [upload_data(interned.get(row)) for row in rows]
+        assert all(json.loads(json.dumps(a)) == json.loads(encode_upload_data(b)) for a, b in zip(plain_data, interned_data))
+        number = 20
+        dumps_us = min(timeit.repeat(lambda: [json.dumps(d) for d in plain_data], number=number, repeat=3, timer=time.perf_counter))
+        encode_us = min(timeit.repeat(lambda: [encode_upload_data(d) for d in interned_data], number=number, repeat=3, timer=time.perf_counter))
+        per_dispatch = 1e6 / (number * len(rows))
+        print(
+            f"{size:>10} | {plain_mib:>15.1f} | {interned_mib:>18.1f} | {len(interned.traits):>13} |"
+            f" {dumps_us*per_dispatch:>14.2f} | {encode_us*per_dispatch:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    run(args.sizes)
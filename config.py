@@ -217,9 +217,26 @@ class CollectionConfig(ConfigClass):
             a("collection_dir_local_path", required=True),
             a("use_absolute_path", default=True),
             a("max_upload_time", default=60),
+            a("upload_backend", default="selenium"), # selenium/fake. fake - simulated uploading without browser, for load testing. See assets_manage.upload_backends
+            a("upload_slots", default=1), # concurrent uploads of each driver(input groups of the upload page)
+            a("standby_drivers", default=0), # drivers initialized in background and kept ready, activated instantly when drivers are added(or failed driver is replaced)
+            a("upload_rate_limit", default=0), # max uploads per minute of all drivers, decreased on throttling responses, 0 - unlimited. See assets_manage.rate_limiter
+            a("preflight_validation", default=True), # check asset files(exists, size, type) before dispatching. See assets_manage.preflight
+            a("max_asset_file_size_mb", default=100),
+            a("read_ahead_mb", default=128), # budget of page cache warming for the next asset files, 0 - disabled. See assets_manage.read_ahead
+            a("staging_dir", default=""), # local dir(e.g. tmpfs) for copies of the next asset files from slow storage, empty - disabled. See assets_manage.staging
+            a("staging_mb", default=1024), # disk budget of the staging dir
+            a("detect_changes", default=False), # compare manifest entries and asset files with the previous run, changed dead assets are uploaded again. See assets_manage.fingerprints
+            a("intern_traits", default=True), # assets share read-only trait entries of the YAML manifest(less memory, faster encoding). Disable if SingleAssetData inheritor changes traits in place. See assets_manage.traits
+            a("duplicate_assets", default="off"), # off/report/skip. Assets with identical files(and metadata for skip) are searched in background. See assets_manage.content_index
+            a("max_upload_attempts", default=5), # failed uploads of the asset before it moved to the dead letters(0dead_letters.jsonl)
+            a("watch_mode", default="off"), # off/manifest/dir. Pick up assets added to the manifest(or collection dir) without restart
+            a("dispatch_order", default="manifest"), # manifest/smallest_first/lpt/interleaved. Order by file sizes. See assets_manage.dispatch_order
             a("single_asset_name", default=""),
             a("asset_external_link_base", default=""),
             a("collection_description", default=""),
+            a("data_keeper_flush_interval_ms", default=0), # time for accumulating uploaded assets data before writing it to the disk
+            a("data_keeper_fsync", default="commit"), # commit/interval/never. See assets_manage.data_keeper.DataKeeper.FsyncPolicy
         ]
 
 
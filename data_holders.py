@@ -1,5 +1,7 @@
 from collections.abc import MutableMapping
 from config import CollectionConfig, ExceptionsFoundedDuringInit
+from assets_manage.pending_index import AssetLease
+from assets_manage.traits import encode_upload_data
 
 from dataclasses import dataclass, asdict
 from typing import Optional, Type, Generator
@@ -109,10 +111,23 @@ class RecaptchaTokenHolder:
         return self.timestamp+self.live_time >= time() if self.can_be_expire else False
 
 
+class CollectionInfo(dict):
+    """
+    Collection config in dict form(see CollectionConfig.dict_like). Collection-level values are resolved once
+    and shared by all assets of the collection
+    """
+    __slots__ = ("collection_dir_prefix",)
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        collection_dir = self.get("collection_dir_local_path", None)
+        self.collection_dir_prefix = os.path.join(os.path.abspath(collection_dir), "") if collection_dir else None # type: Optional[str] # absolute, with trailing separator
+
+
 try:
-    DEFAULT_COLLECTION_INFO = CollectionConfig().dict_like
+    DEFAULT_COLLECTION_INFO = CollectionInfo(CollectionConfig().dict_like)
 except ExceptionsFoundedDuringInit:
-    DEFAULT_COLLECTION_INFO = {}
+    DEFAULT_COLLECTION_INFO = CollectionInfo()
 
 
 class SingleAssetData(MutableMapping):
@@ -137,6 +152,9 @@ class SingleAssetData(MutableMapping):
     necessary_keys = ["collection", "name", "description", "externalLink", "properties", "levels", "stats",
                       "unlockableContent", "isNsfw", "maxSupply", "chain"]
 
+    # Inheritors without __slots__ get __dict__ and may keep any attributes
+    __slots__ = ("use_absolute_path", "origin", "origin_props", "origin_info", "staged_path", "_store")
+
     def __init__(self, dict_with_data: dict, collection_info: dict = DEFAULT_COLLECTION_INFO) -> None:
         """
         dict_with_data -    must be be one dict from COLLECTION_DATA,
@@ -145,26 +163,51 @@ class SingleAssetData(MutableMapping):
                                 optionally may contain keys: {"attrs": [STR], "props": {}}
                                     "attrs" - optional list, contain asset list of characteristic. Exist when asset was generated(other MNS`s script). Used for custom generating "props"(via code)
                                     "props" - optional dict, which contain all keys that characterizes asset("name", "description", "externalLink", "unlockableContent", "isNsfw", "properties", "levels", "stats", "max", "maxSupply"). Look class doc string for details
+        collection_info -   CollectionInfo shared by assets of the collection. Plain dict is wrapped for each asset
         """
+        if not isinstance(collection_info, CollectionInfo):
+            collection_info = CollectionInfo(collection_info)
         self.use_absolute_path = collection_info.get("use_absolute_path", True)
         self.origin       = dict_with_data
         self.origin_props = dict_with_data.get("props", {})
-        self.origin_info  = collection_info
-        self.store = {
-            "id": str(self.id),
-            "assetPath": self.path,
-            "collection": self.collection_name,
-            "name": self.name,
-            "externalLink": self.external_link,
-            "description": self.description,
-            "properties": self.properties,
-            "levels": self.levels,
-            "stats": self.stats,
-            "unlockableContent": self.unlockable_content,
-            "isNsfw": self.nsfw_content,
-            "maxSupply": str(self.supply),
-            "chain": self.blockchain
-        }
+        self.origin_info  = collection_info # type: CollectionInfo
+        self.staged_path  = None # type: Optional[str] # see use_staged_file
+        self._store       = None # type: Optional[dict] # see store
+
+    @property
+    def store(self) -> dict:
+        """
+        Upload data of the asset. Built on first access(most of the assets are only checked by path before dispatching)
+        """
+        if self._store is None:
+            self._store = {
+                "id": str(self.id),
+                "assetPath": self.path,
+                "collection": self.collection_name,
+                "name": self.name,
+                "externalLink": self.external_link,
+                "description": self.description,
+                "properties": self.properties,
+                "levels": self.levels,
+                "stats": self.stats,
+                "unlockableContent": self.unlockable_content,
+                "isNsfw": self.nsfw_content,
+                "maxSupply": str(self.supply),
+                "chain": self.blockchain
+            }
+        return self._store
+
+    @store.setter
+    def store(self, store: dict) -> None:
+        self._store = store
+
+    def use_staged_file(self, staged_path: str) -> None:
+        """
+        Asset file was copied to the local staging dir(see assets_manage.staging). Staged copy will be uploaded
+        """
+        self.staged_path = staged_path
+        if self._store is not None:
+            self._store["assetPath"] = staged_path
 
     def as_upload_data_dict(self) -> dict:
         """
@@ -196,13 +239,18 @@ class SingleAssetData(MutableMapping):
     @property
     def path(self) -> str:
         """
-        Return abs path to the asset file
+        Return abs path to the asset file(staged copy, if it is used)
         :return: Absolute path
         """
+        if self.staged_path is not None:
+            return self.staged_path
         if self.use_absolute_path and "path" in self.origin and self.origin["path"]:
             return self.origin["path"]
-        else:
-            return os.path.abspath(os.path.join(self.origin_info["collection_dir_local_path"], self.origin["file_name"]))
+        file_name = self.origin["file_name"]
+        prefix = self.origin_info.collection_dir_prefix
+        if prefix is not None and os.sep not in file_name and (os.altsep is None or os.altsep not in file_name) and file_name not in (".", ".."):
+            return prefix + file_name # already normalized
+        return os.path.abspath(os.path.join(self.origin_info["collection_dir_local_path"], file_name))
 
     @property
     def name(self) -> str:
@@ -275,6 +323,15 @@ class SingleAssetData(MutableMapping):
 class UploadDataHolder:
     _token: RecaptchaTokenHolder
     _asset: SingleAssetData
+    _lease: Optional[AssetLease] = None # See assets_manage.pending_index.AssetLease
+
+    def claim_lease(self) -> bool:
+        """
+        Must be called by driver before uploading
+
+        :return: False if asset was returned to the queue(lease expired) and must not be uploaded
+        """
+        return self._lease.claim() if self._lease is not None else True
 
     @property
     def file_path(self) -> str:
@@ -292,7 +349,7 @@ class UploadDataHolder:
 
     @property
     def asset_data_json(self) -> str:
-        return json.dumps(self.asset_data_for_upload)
+        return encode_upload_data(self.asset_data_for_upload)
 
     @property
     def token_expired(self) -> bool:
@@ -306,6 +363,13 @@ class UploadDataHolder:
         return self._token.token
 
 
+@dataclass
+class UploadErrorHolder:
+    """Payload of the failed uploading events"""
+    asset_id: int
+    error: Optional[str] = None # description of the last error, will be saved in dead letters
+
+
 class UploadResponseHolder:
     """
     Container for response received after uploading asset
@@ -329,6 +393,8 @@ class UploadResponseHolder:
         contract_type: str # Base64 encoded str(AssetContractType:INT)
         asset_type: str # Base64 encoded str(AssetType:INT)
 
+    throttling_markers = ("rate limit", "too many requests", "throttl") # lowercase parts of the API errors about the rate limit
+
     def __init__(self, raw_response: str, start_of_upload_time: float, asset_id: int):
         self.time_spent_on_upload = time()-start_of_upload_time # type: float
         self.raw_response = raw_response
@@ -374,6 +440,31 @@ class UploadResponseHolder:
     def asset_id(self):
         return self._asset_id
 
+    @property
+    def throttled(self) -> bool:
+        """
+        :return: True if request was rejected due to rate limiting(HTTP 429 or API error about the rate limit)
+        """
+        if not isinstance(self.store, dict):
+            return False
+        if self.store.get("status", None) == 429:
+            return True
+        errors = self.store.get("errors", None) or []
+        return any(
+            marker in str(err.get("message", err) if isinstance(err, dict) else err).lower()
+            for err in errors for marker in self.throttling_markers
+        )
+
+    @property
+    def error_description(self) -> str:
+        """
+        :return: Errors returned by API or raw response if request was invalid
+        """
+        errors = self.store.get("errors", None) if isinstance(self.store, dict) else None
+        if errors:
+            return "; ".join(str(err.get("message", err)) if isinstance(err, dict) else str(err) for err in errors)
+        return self.raw_response[:512]
+
     @property
     def dict_for_save(self):
         """
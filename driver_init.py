@@ -6,24 +6,28 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
 
-from selenium.common.exceptions import SessionNotCreatedException, WebDriverException, TimeoutException
+from selenium.common.exceptions import SessionNotCreatedException, WebDriverException, TimeoutException, StaleElementReferenceException
+from selenium.webdriver.remote.webelement import WebElement
 
 from random import randint
 
 from threading import Lock
 from queue import Queue
+from weakref import WeakKeyDictionary
+from dataclasses import dataclass, field
 
 from rich import print
 
 import time
-import json
+import itertools
 import js_injections
 
 from glob import glob
-from typing import Union, Optional, Any
+from typing import Union, Optional, Any, Dict, Sequence
 
 from config import MetamaskConfig, ExceptionsFoundedDuringInit
 from data_holders import UploadResponseHolder
+from assets_manage.traits import encode_upload_data
 from events import EventHolder, ServerEvent
 from mnu_utils import console, abs_path_from_base_dir_relative, MNU_WEBDRIVER_ABS_PATH, MNU_WEBDRIVER_ABS_PATH_PATTERN
 
@@ -117,7 +121,8 @@ def init_driver_for_manual_actions(webdriver_path: str = MNU_WEBDRIVER_ABS_PATH)
     return driver
 
 
-def driver_init(secret_phases: str = SECRET, temp_password: str = PASSWORD, auth_lock: Lock = Lock(), hide_warnings: bool = False, webdriver_path: str = MNU_WEBDRIVER_ABS_PATH) -> WebDriverParentClass:
+def driver_init(secret_phases: str = SECRET, temp_password: str = PASSWORD, auth_lock: Lock = Lock(), hide_warnings: bool = False, webdriver_path: str = MNU_WEBDRIVER_ABS_PATH,
+                upload_slots: int = 1, max_upload_time: float = 60) -> WebDriverParentClass:
     """
     Configuring driver for uploading
     #TODO: Refactoring
@@ -375,7 +380,9 @@ def driver_init(secret_phases: str = SECRET, temp_password: str = PASSWORD, auth
     driver.execute_cdp_cmd('Network.setBlockedURLs', {"urls": ["features-proxy.opensea.io", "api.amplitude.com", "google-analytics.com"]})
     driver.execute_cdp_cmd('Network.enable', {})
     driver.execute_script(js_injections.replace_dom())
-    driver.execute_script(js_injections.asset_upload_injection(), 1) # only one "thread" due to banning
+    driver.execute_script(js_injections.asset_upload_injection(), upload_slots) # input groups, see driver_start_upload
+    driver.execute_script(js_injections.upload_response_tagging())
+    driver.set_script_timeout(max_upload_time + _script_timeout_reserve) # set once, waiting time is passed to the script(see driver_wait_uploads)
     return driver
 
 
@@ -386,13 +393,16 @@ def init_driver_before_success(
         temp_password: str = PASSWORD,
         auth_lock: Lock = Lock(),
         hide_warnings: bool = True,
-        max_attempts: int = 5
+        max_attempts: int = 5,
+        upload_slots: int = 1,
+        max_upload_time: float = 60
 ) -> Optional[WebDriverParentClass]:
     count = 0
     while max_attempts>count:
         try:
             driver_init_start_time = time.time()
-            driver = driver_init(secret_phases, temp_password, auth_lock=auth_lock, hide_warnings=hide_warnings)
+            driver = driver_init(secret_phases, temp_password, auth_lock=auth_lock, hide_warnings=hide_warnings,
+                                 upload_slots=upload_slots, max_upload_time=max_upload_time)
             driver_init_end_time = time.time()
             output_bus.put(EventHolder(ServerEvent.WORKER_READY, {"id": worker_id, "duration": driver_init_end_time-driver_init_start_time}))
             return driver
@@ -405,6 +415,77 @@ def init_driver_before_success(
     output_bus.put(EventHolder(ServerEvent.WORKER_DRIVER_INIT_ATTEMPTS_EXCEEDED, worker_id))
 
 
+@dataclass
+class UploadInputGroup:
+    data_field: WebElement
+    media_field: WebElement
+    response_field: WebElement
+
+
+@dataclass
+class DriverUploadInputs:
+    """Element handles of the injected input groups, cached per driver(see driver_upload_asset)"""
+    groups: Dict[int, UploadInputGroup] = field(default_factory=dict)
+
+
+_driver_upload_inputs = WeakKeyDictionary() # type: WeakKeyDictionary[WebDriverParentClass, DriverUploadInputs]
+_script_timeout_reserve = 5 # sec, async script is resolved by its own timer before the driver timeout
+_upload_tags = itertools.count(1) # serials of the uploads, see js_injections.upload_response_tagging
+
+
+def _upload_input_group(driver: WebDriverParentClass, input_group_id: int, refresh: bool = False) -> UploadInputGroup:
+    inputs = _driver_upload_inputs.setdefault(driver, DriverUploadInputs())
+    group = inputs.groups.get(input_group_id, None)
+    if group is None or refresh:
+        group = inputs.groups[input_group_id] = UploadInputGroup(
+            driver.find_element(By.ID, f'asset_data_json_{input_group_id}'),
+            driver.find_element(By.ID, f'media_{input_group_id}'),
+            driver.find_element(By.ID, f'response_field_{input_group_id}')
+        )
+    return group
+
+
+def driver_start_upload(asset_data: dict, asset_abs_file_path: str, driver: WebDriverParentClass, input_group_id: int = 0) -> None:
+    """
+    Start uploading of the asset by the input group. Asset data is set by the script(not typed),
+    file is sent to the media input, which starts the upload request
+
+    :param input_group_id: id of input group, see upload_slots of driver_init()
+    """
+    encoded_data = encode_upload_data(asset_data)
+    upload_tag = str(next(_upload_tags)) # late response of the previous upload of the group is dropped by its tag
+    group = _upload_input_group(driver, input_group_id)
+    try:
+        driver.execute_script(js_injections.upload_input_prepare(), group.data_field, group.response_field, encoded_data, upload_tag)
+    except StaleElementReferenceException: # page was reloaded
+        group = _upload_input_group(driver, input_group_id, refresh=True)
+        driver.execute_script(js_injections.upload_input_prepare(), group.data_field, group.response_field, encoded_data, upload_tag)
+    group.media_field.send_keys(asset_abs_file_path)
+
+
+def driver_wait_uploads(driver: WebDriverParentClass, input_group_ids: Sequence[int], wait_in_sec: Union[int, float]) -> Dict[int, str]:
+    """
+    Wait until at least one of the started uploads is completed. Waiting is made by the single async script
+
+    :param input_group_ids: Groups with started uploads
+    :param wait_in_sec: max time for waiting, up to max_upload_time of driver_init()(script timeout of the driver)
+    :return: Raw responses of the completed uploads by input group id, empty if nothing was completed in time
+    """
+    groups = [_upload_input_group(driver, group_id) for group_id in input_group_ids]
+    completed = driver.execute_async_script(
+        js_injections.upload_response_await(), [group.response_field for group in groups], int(wait_in_sec*1000)
+    )
+    return {input_group_ids[index]: response for index, response in completed}
+
+
+def driver_reset_upload(driver: WebDriverParentClass, input_group_id: int = 0) -> None:
+    """Reset input group after failed(or abandoned) upload"""
+    try:
+        driver.execute_script(js_injections.upload_input_reset(), _upload_input_group(driver, input_group_id).response_field)
+    except WebDriverException:
+        _driver_upload_inputs.pop(driver, None)
+
+
 def driver_upload_asset(
         asset_data: dict,
         asset_id: int,
@@ -416,39 +497,30 @@ def driver_upload_asset(
     """
     Try upload asset and give result
 
+    Element handles are cached per driver, response is awaited by the single async script(see driver_start_upload, driver_wait_uploads)
+
     :param asset_data: See data_holders.SingleAssetData.as_upload_data_dict() for more information.
     :param asset_id: Inner asset id
     :param asset_abs_file_path: Absolute path to asset file
     :param driver: Instance of selenium webdriver returned by driver_init() func
     :param wait_in_sec: max time for waiting response
-    :param input_group_id: id of input group (DEPRECATED)
+    :param input_group_id: id of input group
     :return: Result of uploading(response)
     :raises: :exc:`selenium.common.exceptions.TimeoutException` if upload was unsuccessful or uploading timeout occurs
     """
     start_time = time.time()
-    driver.find_element(By.ID, f'asset_data_json_{input_group_id}').send_keys(json.dumps(asset_data))
-    driver.find_element(By.ID, f'media_{input_group_id}').send_keys(asset_abs_file_path)
-
     try:
-        upload_response_form = WebDriverWait(driver, wait_in_sec).until(
-            EC.presence_of_element_located(
-                (By.XPATH, f'//*[@id="response_field_{input_group_id}" and @upload_complete="true"]')
-            )
-        )
-
-        u_response = UploadResponseHolder(upload_response_form.get_attribute('value'), start_time, asset_id)
-        upload_response_form.clear()
-        return u_response
+        driver_start_upload(asset_data, asset_abs_file_path, driver, input_group_id)
+        completed = driver_wait_uploads(driver, [input_group_id], wait_in_sec)
     except Exception as e:
-        upload_response_form = WebDriverWait(driver, 2).until(
-            EC.presence_of_element_located(
-                (By.XPATH, f'//*[@id="response_field_{input_group_id}"]')
-            )
-        )
-        upload_response_form.clear()
-        upload_response_form.send_keys("error")
+        driver_reset_upload(driver, input_group_id)
         raise e
 
+    if input_group_id not in completed:
+        driver_reset_upload(driver, input_group_id)
+        raise TimeoutException(f"Upload response was not received in {wait_in_sec}s")
+    return UploadResponseHolder(completed[input_group_id], start_time, asset_id)
+
 
 if __name__ == "__main__":
     """
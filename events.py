@@ -25,6 +25,7 @@ class ServerEvent(MNUEnum):
     WORKER_READY                     = 1
     WORKER_STOPPED                   = 2
     WORKER_STOPPED_AS_FIRST_RECEIVER = 3
+    WORKER_STANDBY                   = 4 # payload: {"id": INT, "duration": FLOAT} # initialized driver waits for activation(see standby_drivers), WORKER_READY(payload: worker id) is sent on activation
     WORKER_EVENTS_BUS_LOCKED         = 5
     WORKER_EVENTS_BUS_UNLOCKED       = 6
     WORKER_COMPLETED_UPLOAD          = 8
@@ -34,10 +35,19 @@ class ServerEvent(MNUEnum):
     STOP_FIRST_RECEIVER = 25
 
     #FROM ASSETS HANDLER
-    AH_ASSETS_ARE_OVER = 100
+    AH_ASSETS_ARE_OVER  = 100 # payload: {"watching": BOOL} # True if handler waits for new assets(see watch_mode)
+    AH_READ_AHEAD_STATS = 101 # payload: see assets_manage.read_ahead.FileReadAhead.stats
+    AH_STAGING_STATS    = 102 # payload: see assets_manage.staging.StagingCache.stats
+    AH_NEW_ASSETS_FOUND = 103 # payload: INT # amount of assets added to the queue in watch mode
 
     #WARNING
-    WORKER_TOKEN_EXPIRED = 300
+    WORKER_TOKEN_EXPIRED     = 300
+    WORKER_UPLOAD_THROTTLED  = 301 # payload: {"id": INT, "rate": FLOAT} # upload rate(per minute) after back off, see assets_manage.rate_limiter
+    AH_ASSETS_LEASES_EXPIRED = 310 # payload: list of asset ids returned to the queue
+    AH_ASSET_DEAD_LETTERED   = 311 # payload: UploadErrorHolder
+    AH_ASSET_REJECTED        = 312 # payload: UploadErrorHolder # asset file not passed preflight validation
+    AH_DUPLICATED_ASSETS     = 313 # payload: {"groups": INT, "skipped": [INT], "metadata_differs": [INT]} # see 0duplicates_report.json
+    AH_MANIFEST_CHANGED      = 314 # payload: {"added": INT, "removed": INT, "changed": [INT], "requeued": [INT]} # see detect_changes
 
     #ERRORS
     WORKER_DRIVER_INITIALIZING_FAILURE      = 500
@@ -45,8 +55,9 @@ class ServerEvent(MNUEnum):
     WORKER_DRIVER_INIT_TECHNICAL_ERROR      = 502 # payload: MNUDriverInitError
     WORKER_RECEIVED_NON_EVENT_HOLDER_OBJECT = 511
     WORKER_RECEIVED_NON_U_D_HOLDER_OBJECT   = 512
-    WORKER_UNKNOWN_ERROR_WHILE_UPLOAD       = 520
-    WORKER_UPLOAD_TIMEOUT_EXCEPTION         = 521
+    WORKER_UNKNOWN_ERROR_WHILE_UPLOAD       = 520 # payload: UploadErrorHolder
+    WORKER_UPLOAD_TIMEOUT_EXCEPTION         = 521 # payload: UploadErrorHolder
+    AH_DATA_KEEPER_WRITE_ERROR              = 530 # payload: OSError
 
 
 class UIRequestEvent(MNUEnum):
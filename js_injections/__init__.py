@@ -39,3 +39,87 @@ def asset_upload_injection() -> str:
 
 def open_new_tab_and_reload_it(url: str = "https://google.com", new_window: bool = True, reload_after: int = 5000):
     return f'let tab = window.open("{url}","{"_blank" if new_window else "_self"}"); setTimeout(function(){{tab.location.reload();}}, {reload_after});'
+
+
+def upload_response_tagging() -> str:
+    """
+    Injection for tagging of the upload requests(once per page, see upload_input_prepare).
+    Request takes the upload_tag of the input group, which was prepared before sending. When the request is completed,
+    its tag is set to response_tag of the response field, so late response of the aborted upload is told apart
+    from the response of the next upload of the same group(see upload_response_await)
+
+    :return: js script
+    """
+    return """
+if (!window.mnuTaggedSend) {
+    const send = XMLHttpRequest.prototype.send;
+    window.mnuTaggedSend = true;
+    XMLHttpRequest.prototype.send = function(body) {
+        const field = window.mnuPreparedField, handler = this.onreadystatechange;
+        window.mnuPreparedField = null;
+        if (field && handler) {
+            const tag = field.getAttribute("upload_tag");
+            this.onreadystatechange = function() {
+                if (this.readyState === 4) field.setAttribute("response_tag", tag);
+                return handler.apply(this, arguments);
+            };
+        }
+        return send.call(this, body);
+    };
+}"""
+
+
+def upload_input_prepare() -> str:
+    """
+    Injection for setting asset data of the input group before the file is sent.
+    Response field left by the previous upload is reset, group is tagged for the next request(see upload_response_tagging)
+
+    arguments: asset data field, response field, encoded asset data, upload tag
+    :return: js script
+    """
+    return 'arguments[1].setAttribute("upload_complete", "false"); arguments[1].value = ""; arguments[1].setAttribute("upload_tag", arguments[3]); ' \
+           'window.mnuPreparedField = arguments[1]; arguments[0].value = arguments[2];'
+
+
+def upload_input_reset() -> str:
+    """
+    Injection for resetting input group after failed upload(same as typing "error" into the response field)
+
+    arguments: response field
+    :return: js script
+    """
+    return 'arguments[0].value = "error"; arguments[0].dispatchEvent(new Event("change"));'
+
+
+def upload_response_await() -> str:
+    """
+    Async injection, resolves when at least one of the upload requests is completed(upload_complete="true"
+    on the response field) with the list of [field index, response]. Input groups of the completed requests are reset,
+    as after clearing of the response field. Resolves with empty list, if nothing was completed in time.
+    Response of the request with another tag(late response of the aborted upload) is dropped, see upload_response_tagging
+
+    arguments: response fields, timeout in ms
+    :return: js script
+    """
+    return """
+const fields = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+let timer = null, finished = false;
+const observer = new MutationObserver(check);
+function finish(result) {
+    finished = true; observer.disconnect(); clearTimeout(timer);
+    result.forEach(function(item) {const field = fields[item[0]]; field.value = ""; field.dispatchEvent(new Event("change"));});
+    done(result);
+}
+function check() {
+    if (finished) return;
+    const result = [];
+    fields.forEach(function(field, i) {
+        if (field.getAttribute("upload_complete") !== "true") return;
+        if (field.getAttribute("response_tag") === field.getAttribute("upload_tag")) result.push([i, field.value]);
+        else field.setAttribute("upload_complete", "false"); // stale response, upload of the group is still in progress
+    });
+    if (result.length) finish(result);
+}
+fields.forEach(function(field) {observer.observe(field, {attributes: true, attributeFilter: ["upload_complete"]});});
+timer = setTimeout(function() {if (!finished) finish([]);}, timeout);
+check();"""
@@ -3,9 +3,10 @@ from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from config import MNUSecrets, CollectionConfig
 from version import __version__, __server_version__, __name__ as app_name
 
-from data_holders import UploadResponseHolder, SessionsHolder
+from data_holders import UploadResponseHolder, UploadErrorHolder, SessionsHolder
 from events import EventHolder, ServerEvent, UIRequestEvent
 from assets_manage.assets_upload_manager import AssetsUploadManager
+from assets_manage.upload_backends import BackendFactory
 from mnu_api_primitives import UIStateHolder
 from mnu_utils import console
 
@@ -258,10 +259,13 @@ class MNUHandler:
     _server_address = "127.0.0.1" # you can change this on "0.0.0.0" or "" for listen on all interfaces. But not recommended for security reasons
     _init_drivers_on_start = 1 # on 1 opensea account 1 driver
 
-    def __init__(self, port: int):
+    def __init__(self, port: int, backend_factory: Optional[BackendFactory] = None):
+        """
+        :param backend_factory: Upload backend of the drivers(e.g. fake backend for load testing). See assets_manage.upload_backends
+        """
         self.uploader_events_bus = Queue() # type: Queue[EventHolder] # bus with events from workers(uploaders)
         self.ui_events_bus = Queue() # type: Queue[EventHolder] # bus with events from UI(MNUServer pushing events)
-        self.upload_manager = AssetsUploadManager(self.uploader_events_bus)
+        self.upload_manager = AssetsUploadManager(self.uploader_events_bus, backend_factory=backend_factory)
         self.server = MNUServer(ui_events_bus=self.ui_events_bus, server_address=(self._server_address, port))
 
         self._configure()
@@ -300,6 +304,9 @@ class MNUHandler:
                             upload_response = payload # type: UploadResponseHolder
                             if self.upload_manager.assets_handler.asset_uploaded(upload_response):
                                 self.server.server_state.trigger_asset_upload(upload_response.time_spent_on_upload)
+                            elif upload_response.throttled:
+                                # rate is decreased by the rate limiter, drivers keep working
+                                console.log(f"[yellow]Uploading of asset(id={upload_response.asset_id}) was throttled by API. Asset returned to the queue[/]")
                             else:
                                 self.upload_manager.lock_drivers_input_bus()
                                 #print errors
@@ -314,7 +321,11 @@ class MNUHandler:
                                     console.log(f"[red]Error occurred during uploading asset(id={upload_response.asset_id})")
 
                         elif upload_event.check(ServerEvent.WORKER_STOPPED, ServerEvent.WORKER_STOPPED_AS_FIRST_RECEIVER):
+                            if self.upload_manager.replace_failed_drivers():
+                                console.log("[yellow]Failed driver replaced by the standby driver[/]")
                             self.server.server_state.trigger_set_drivers_count(self.upload_manager.drivers_count)
+                        elif upload_event.check(ServerEvent.WORKER_STANDBY):
+                            console.log(f"Standby driver(id={payload['id']}) is ready")
                         elif upload_event.check(ServerEvent.WORKER_PREPARE):
                             ...
                         elif upload_event.check(ServerEvent.WORKER_READY):
@@ -339,13 +350,39 @@ class MNUHandler:
                         elif upload_event.check(ServerEvent.WORKER_RECEIVED_NON_U_D_HOLDER_OBJECT):
                             ...
 
-                        elif upload_event.check(ServerEvent.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD):
-                            self.upload_manager.assets_handler.asset_uploading_failed(payload)
-                        elif upload_event.check(ServerEvent.WORKER_UPLOAD_TIMEOUT_EXCEPTION):
-                            self.upload_manager.assets_handler.asset_uploading_failed(payload)
+                        elif upload_event.check(ServerEvent.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD, ServerEvent.WORKER_UPLOAD_TIMEOUT_EXCEPTION):
+                            if not isinstance(payload, UploadErrorHolder):
+                                raise ValueError(f"payload type: {type(payload)}")
+                            self.upload_manager.assets_handler.asset_uploading_failed(payload.asset_id, payload.error)
 
                         elif upload_event.check(ServerEvent.WORKER_TOKEN_EXPIRED):
                             ...
+                        elif upload_event.check(ServerEvent.WORKER_UPLOAD_THROTTLED):
+                            console.log(f"[yellow]Uploading is throttled by API(driver id={payload['id']}). Upload rate decreased to {payload['rate']:.1f} per minute[/]")
+
+                        elif upload_event.check(ServerEvent.AH_DATA_KEEPER_WRITE_ERROR):
+                            console.log(f"[red]Error occurred while saving uploaded assets data([yellow]{payload}[/]). Retrying...[/]")
+                        elif upload_event.check(ServerEvent.AH_ASSET_DEAD_LETTERED):
+                            console.log(f"[red]Asset(id={payload.asset_id}) failed uploading too many times and moved to the dead letters. Last error: [yellow]{payload.error}[/][/]")
+                        elif upload_event.check(ServerEvent.AH_ASSET_REJECTED):
+                            console.log(f"[red]Asset(id={payload.asset_id}) skipped: [yellow]{payload.error}[/][/]")
+                        elif upload_event.check(ServerEvent.AH_DUPLICATED_ASSETS):
+                            console.log(f"[yellow]Found {payload['groups']} groups of assets with identical files, {len(payload['skipped'])} assets skipped, {len(payload['metadata_differs'])} have different metadata and will be uploaded. See 0duplicates_report.json[/]")
+                        elif upload_event.check(ServerEvent.AH_MANIFEST_CHANGED):
+                            console.log(f"[yellow]Manifest changed since the last run: {payload['added']} added, {payload['removed']} removed, {len(payload['changed'])} changed, {len(payload['requeued'])} dead assets returned to the queue[/]")
+                        elif upload_event.check(ServerEvent.AH_ASSETS_LEASES_EXPIRED):
+                            console.log(f"[yellow]Uploading of assets(ids={payload}) was not finished in time. Assets returned to the queue[/]")
+                        elif upload_event.check(ServerEvent.AH_ASSETS_ARE_OVER):
+                            if isinstance(payload, dict) and payload.get("watching", False):
+                                console.log("[green]All assets are uploaded. Waiting for new assets in the manifest[/]")
+                            else:
+                                console.log("[green]All assets are uploaded[/]")
+                        elif upload_event.check(ServerEvent.AH_NEW_ASSETS_FOUND):
+                            console.log(f"[green]{payload} new assets added to the queue[/]")
+                        elif upload_event.check(ServerEvent.AH_READ_AHEAD_STATS):
+                            console.log(f"Asset files were warm on dispatch: {payload['warm']}/{payload['dispatched']}({payload['warm_ratio']:.0%}), {payload['warmed_bytes']/2**20:.1f} MiB")
+                        elif upload_event.check(ServerEvent.AH_STAGING_STATS):
+                            console.log(f"Assets uploaded from the staging dir: {payload['staged']}/{payload['dispatched']}")
                     except AssertionError as AE:
                         console.log("[red]During handling uploading event received wrong type EventHandler[/]", AE)
                     except ValueError as VE:
@@ -0,0 +1,278 @@
+from queue import Queue
+from threading import Event
+
+import os
+import json
+import time
+import yaml
+
+from events import ServerEvent
+from assets_manage.assets_handler import AssetsHandler
+
+
+PNG_HEAD = b"\x89PNG\r\n\x1a\n"
+
+
+def _write_collection(tmp_path, count, entries=None):
+    """
+    Manifest of `count` assets with files 0.png, 1.png, ... Existing files are kept
+
+    :param entries: Asset id -> additional fields of the manifest entry
+    """
+    manifest = {"assets_data": {
+        f"asset {i}": {"id": i, "file_name": f"{i}.png", **(entries or {}).get(i, {})} for i in range(count)
+    }}
+    (tmp_path / AssetsHandler.collection_manifest).write_text(yaml.safe_dump(manifest, sort_keys=False))
+    for i in range(count):
+        if not (tmp_path / f"{i}.png").exists():
+            (tmp_path / f"{i}.png").write_bytes(PNG_HEAD + b"%d" % i)
+
+
+def _handler(config):
+    return AssetsHandler(Queue(), Queue(), collection_config=config)
+
+
+def _wait_qsize(bus, size, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while bus.qsize() != size and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return bus.qsize()
+
+
+def test_prefetch_depth_follows_active_workers(collection_config, tmp_path):
+    _write_collection(tmp_path, 50)
+    handler = _handler(collection_config)
+    try:
+        bus = handler.assets_uploader_bus
+        assert _wait_qsize(bus, 1) == 1
+        handler.set_active_workers(3)
+        assert _wait_qsize(bus, 3) == 3
+        bus.get()
+        assert _wait_qsize(bus, 3) == 3 # refilled on consumption
+    finally:
+        handler.stop()
+
+
+def test_producer_is_not_throttled(collection_config, tmp_path):
+    _write_collection(tmp_path, 300)
+    collection_config.preflight_validation = False
+    handler = _handler(collection_config)
+    try:
+        bus = handler.assets_uploader_bus
+        start = time.monotonic()
+        dispatched = [bus.get(timeout=1).payload.asset_id for _ in range(300)]
+        assert time.monotonic() - start < 3
+        assert dispatched == list(range(300))
+        handler.pending_index.retry_base_delay = 0
+        handler.asset_uploading_failed(7)
+        assert bus.get(timeout=1).payload.asset_id == 7 # producer waits for leased assets instead of finishing
+        assert handler.output_bus.empty()
+    finally:
+        handler.stop()
+
+
+def test_failed_asset_moved_to_dead_letters(collection_config, tmp_path):
+    _write_collection(tmp_path, 2)
+    collection_config.max_upload_attempts = 1
+    handler = _handler(collection_config)
+    try:
+        asset_id = handler.assets_uploader_bus.get(timeout=1).payload.asset_id
+        assert handler.asset_uploading_failed(asset_id, "Broken file")
+        dead_event = handler.output_bus.get(timeout=1)
+        assert dead_event.check(ServerEvent.AH_ASSET_DEAD_LETTERED)
+        assert dead_event.payload.error == "Broken file"
+    finally:
+        handler.stop()
+
+    restarted = _handler(collection_config)
+    try:
+        assert restarted.assets_uploader_bus.get(timeout=1).payload.asset_id == 1
+        assert restarted.dead_letters.load()[asset_id]["error"] == "Broken file"
+        assert restarted.dead_letters.remove() == 1
+    finally:
+        restarted.stop()
+
+
+def test_invalid_files_are_rejected_before_dispatch(collection_config, tmp_path):
+    (tmp_path / "1.png").write_bytes(b"")
+    (tmp_path / "2.png").write_bytes(b"GIF89a is not a PNG, but accepted")
+    (tmp_path / "3.png").write_bytes(b"plain text")
+    _write_collection(tmp_path, 5)
+    handler = _handler(collection_config)
+    try:
+        dispatched = [handler.assets_uploader_bus.get(timeout=1).payload.asset_id for _ in range(3)]
+        assert dispatched == [0, 2, 4]
+    finally:
+        handler.stop()
+    with open(handler.collection_preflight_report) as f:
+        report = [json.loads(line) for line in f]
+    assert [(r["id"], r["error"]) for r in report] == [(1, "File is empty"), (3, "Unsupported file type")]
+    assert os.path.getsize(handler.collection_preflight_cache) > 0
+
+
+def test_duplicated_files_are_uploaded_once(collection_config, tmp_path):
+    for i in (1, 3, 4, 5):
+        (tmp_path / f"{i}.png").write_bytes(PNG_HEAD + b"same content")
+    _write_collection(tmp_path, 6, entries={5: {"props": {"name": "Other traits"}}})
+    collection_config.duplicate_assets = "skip"
+    handler = _handler(collection_config)
+    try:
+        event = handler.output_bus.get(timeout=2) # files are hashed in background, asset 0 is dispatched meanwhile
+        assert event.check(ServerEvent.AH_DUPLICATED_ASSETS)
+        assert event.payload == {"groups": 1, "skipped": [3, 4], "metadata_differs": [5]}
+        dispatched = [handler.assets_uploader_bus.get(timeout=1).payload.asset_id for _ in range(4)]
+        assert dispatched == [0, 1, 2, 5]
+    finally:
+        handler.stop()
+    with open(handler.collection_duplicates_report) as f:
+        assert [group["ids"] for group in json.load(f)["groups"]] == [[1, 3, 4, 5]]
+
+
+def test_largest_files_dispatched_first(collection_config, tmp_path, monkeypatch):
+    for i in range(5):
+        (tmp_path / f"{i}.png").write_bytes(PNG_HEAD + b"x" * (i % 3) * 100 + b"%d" % i)
+    _write_collection(tmp_path, 5)
+    collection_config.dispatch_order = "lpt"
+    slow_storage = Event()
+
+    def file_size(path):
+        slow_storage.wait(2)
+        return os.stat(path).st_size
+
+    monkeypatch.setattr(AssetsHandler, "_file_size", staticmethod(file_size))
+    handler = _handler(collection_config)
+    try:
+        bus = handler.assets_uploader_bus
+        assert bus.get(timeout=1).payload.asset_id == 0 # manifest order, while sizes are measured in background
+        assert _wait_qsize(bus, 1) == 1
+        slow_storage.set()
+        deadline = time.monotonic() + 2
+        while handler.pending_index.peek(3) != [2, 4, 3] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        handler.set_active_workers(4)
+        assert _wait_qsize(bus, 4) == 4
+        dispatched = [bus.get().payload.asset_id for _ in range(4)]
+        assert dispatched == [1, 2, 4, 3]
+    finally:
+        handler.stop()
+
+
+def test_assets_dispatched_from_staging_dir(collection_config, tmp_path):
+    staging_dir = tmp_path / "0local"
+    _write_collection(tmp_path, 5)
+    collection_config.staging_dir = str(staging_dir)
+    handler = _handler(collection_config)
+    try:
+        bus = handler.assets_uploader_bus
+        assert bus.get(timeout=1).payload.file_path == str(tmp_path / "0.png") # nothing staged yet
+        time.sleep(0.2) # copies of the next assets
+        payload = bus.get(timeout=1).payload
+        assert payload.file_path.startswith(str(staging_dir))
+        with open(payload.file_path, "rb") as f:
+            assert f.read() == (tmp_path / "1.png").read_bytes()
+    finally:
+        handler.stop()
+    assert not os.path.exists(payload.file_path)
+
+
+def test_new_assets_picked_up_in_watch_mode(collection_config, tmp_path, monkeypatch):
+    monkeypatch.setattr(AssetsHandler, "watch_interval", 0.05)
+    _write_collection(tmp_path, 2)
+    collection_config.watch_mode = "manifest"
+    handler = _handler(collection_config)
+    try:
+        bus, output_bus = handler.assets_uploader_bus, handler.output_bus
+        for _ in range(2):
+            handler.pending_index.mark_uploaded(bus.get(timeout=1).payload.asset_id)
+        event = output_bus.get(timeout=1)
+        while event.check(ServerEvent.AH_READ_AHEAD_STATS):
+            event = output_bus.get(timeout=1)
+        assert event.check(ServerEvent.AH_ASSETS_ARE_OVER) and event.payload == {"watching": True}
+
+        time.sleep(0.05) # mtime granularity
+        manifest_path = tmp_path / AssetsHandler.collection_manifest
+        (tmp_path / "2.png").write_bytes(PNG_HEAD + b"2")
+        manifest_path.write_text(manifest_path.read_text() + "  asset 2:\n    id: 2\n    file_name: 2.png\n")
+        assert bus.get(timeout=1).payload.asset_id == 2
+        assert output_bus.get(timeout=1).payload == 1
+        assert handler.assets_handler_thread.is_alive()
+    finally:
+        handler.stop()
+
+
+def test_new_files_picked_up_in_dir_watch_mode(collection_config, tmp_path, monkeypatch):
+    monkeypatch.setattr(AssetsHandler, "watch_interval", 0.05)
+    _write_collection(tmp_path, 1)
+    collection_config.watch_mode = "dir"
+    handler = _handler(collection_config)
+    try:
+        bus = handler.assets_uploader_bus
+        handler.pending_index.mark_uploaded(bus.get(timeout=1).payload.asset_id)
+        (tmp_path / "1.png").write_bytes(PNG_HEAD + b"1")
+        upload = bus.get(timeout=5).payload
+        assert upload.asset_id == 1 and upload.file_path.endswith("1.png")
+        manifest_text = (tmp_path / AssetsHandler.collection_manifest).read_text()
+        assert manifest_text.startswith("assets_data:\n  asset 0:\n") # appended, not rewritten
+        assert handler.assets_handler_thread.is_alive()
+    finally:
+        handler.stop()
+
+
+def test_rewritten_streaming_manifest_is_remapped(collection_config, tmp_path, monkeypatch):
+    monkeypatch.setattr(AssetsHandler, "watch_interval", 0.05)
+    stream_path = tmp_path / "0manifest.jsonl"
+    stream_path.write_text("".join(json.dumps({f"asset {i}": {"id": i, "file_name": f"{i}.png"}}) + "\n" for i in range(4)))
+    _write_collection(tmp_path, 4)
+    collection_config.watch_mode = "manifest"
+    handler = _handler(collection_config)
+    try:
+        bus, output_bus = handler.assets_uploader_bus, handler.output_bus
+        handler.pending_index.mark_uploaded(bus.get(timeout=1).payload.asset_id)
+
+        (tmp_path / "3_fixed.png").write_bytes(PNG_HEAD + b"3")
+        tmp_stream_path = tmp_path / "0manifest.jsonl.tmp"
+        tmp_stream_path.write_text(json.dumps({"asset 3": {"id": 3, "file_name": "3_fixed.png"}}) + "\n" +
+                                   json.dumps({"asset 2": {"id": 2, "file_name": "2.png"}}) + "\n")
+        os.replace(tmp_stream_path, stream_path)
+
+        event = output_bus.get(timeout=1)
+        while not event.check(ServerEvent.AH_ASSET_REJECTED):
+            event = output_bus.get(timeout=1)
+        assert event.payload.asset_id == 1
+        uploads = {}
+        while not {2, 3} <= set(uploads): # 1 may be dispatched before the rewrite
+            upload = bus.get(timeout=1).payload
+            uploads[upload.asset_id] = upload
+        assert uploads[3].file_path.endswith("3_fixed.png")
+        assert handler.assets_handler_thread.is_alive()
+    finally:
+        handler.stop()
+
+
+def test_changed_dead_asset_is_requeued(collection_config, tmp_path):
+    _write_collection(tmp_path, 3)
+    collection_config.max_upload_attempts = 1
+    collection_config.detect_changes = True
+    handler = _handler(collection_config)
+    try:
+        asset_id = handler.assets_uploader_bus.get(timeout=1).payload.asset_id
+        handler.asset_uploading_failed(asset_id, "Broken file")
+        deadline = time.monotonic() + 2
+        while not os.path.isfile(handler.collection_fingerprints) and time.monotonic() < deadline:
+            time.sleep(0.01) # built in background
+    finally:
+        handler.stop()
+    assert os.path.isfile(handler.collection_fingerprints)
+
+    (tmp_path / f"{asset_id}.png").write_bytes(PNG_HEAD + b"fixed")
+    _write_collection(tmp_path, 4)
+    restarted = _handler(collection_config)
+    try:
+        changed = restarted.output_bus.get(timeout=2)
+        assert changed.check(ServerEvent.AH_MANIFEST_CHANGED)
+        assert changed.payload == {"added": 1, "removed": 0, "changed": [asset_id], "requeued": [asset_id]}
+        dispatched = [restarted.assets_uploader_bus.get(timeout=1).payload.asset_id for _ in range(4)] # not blocked by the detection
+        assert sorted(dispatched) == [0, 1, 2, 3]
+        assert restarted.dead_letters.load() == {}
+    finally:
+        restarted.stop()
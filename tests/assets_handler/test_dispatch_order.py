@@ -0,0 +1,15 @@
+from assets_manage.dispatch_order import DISPATCH_ORDERS, simulate_makespan
+
+
+def test_policies_return_permutations():
+    sizes = [5, 1, 9, 3, 7, 2, 8]
+    for name, policy in DISPATCH_ORDERS.items():
+        order = policy(sizes, 2)
+        if order is not None:
+            assert sorted(order) == list(range(len(sizes))), name
+
+
+def test_lpt_shortens_tail_of_large_files():
+    sizes = [1]*6 + [10] # large file at the end of the manifest
+    assert simulate_makespan(sizes, None, 2) == 13
+    assert simulate_makespan(sizes, DISPATCH_ORDERS["lpt"](sizes, 2), 2) == 10
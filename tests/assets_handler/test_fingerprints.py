@@ -0,0 +1,49 @@
+import json
+import os
+
+from assets_manage.fingerprints import ManifestFingerprints
+from assets_manage.manifest import InMemoryManifest, StreamingManifest
+
+
+def _manifest(count, changed=()):
+    return {"assets_data": {
+        f"asset {i}": {"id": i, "file_name": f"{i}.png", "props": {"properties": [{"name": "Hat", "value": "Red" if i not in changed else "Blue"}]}}
+        for i in range(count)
+    }}
+
+
+def test_diff_reports_added_removed_and_changed(tmp_path):
+    for i in range(6):
+        (tmp_path / f"{i}.png").write_bytes(b"%d" % i)
+    old = ManifestFingerprints.build(InMemoryManifest(_manifest(5)), str(tmp_path), use_absolute_path=False)
+    old.save(str(tmp_path / "0fingerprints.bin"))
+
+    manifest = _manifest(6, changed={2})
+    del manifest["assets_data"]["asset 0"]
+    (tmp_path / "3.png").write_bytes(b"replaced")
+    os.utime(tmp_path / "3.png", ns=(1, 1))
+    new = ManifestFingerprints.build(InMemoryManifest(manifest), str(tmp_path), use_absolute_path=False)
+
+    diff = ManifestFingerprints.load(str(tmp_path / "0fingerprints.bin")).diff(new)
+    assert (diff.added, diff.removed, diff.changed_meta, diff.changed_file) == ([5], [0], [2], [3])
+    assert diff.changed == [2, 3]
+    assert not new.diff(new)
+
+
+def test_streaming_manifest_fingerprints(tmp_path):
+    manifest_path = str(tmp_path / "0manifest.jsonl")
+    entries = [(3, "Red"), (1, "Red"), (2, "Red"), (1, "Blue")] # not sorted, duplicated id
+    with open(manifest_path, "w") as f:
+        for asset_id, value in entries:
+            f.write(json.dumps({f"asset {asset_id}": {"id": asset_id, "file_name": f"{asset_id}.png", "hat": value}}) + "\n")
+    manifest = StreamingManifest(manifest_path)
+    fingerprints = ManifestFingerprints.build(manifest, str(tmp_path), use_absolute_path=False)
+    manifest.close()
+
+    assert list(fingerprints.ids) == [1, 2, 3]
+    assert list(fingerprints.sizes) == [ManifestFingerprints.missing]*3
+    red = ManifestFingerprints.entry_hash(json.dumps({"asset 1": {"id": 1, "file_name": "1.png", "hat": "Red"}}).encode())
+    assert fingerprints.hashes[0] == red # first entry wins
+    # raw entries differ between formats, so only files are compared
+    in_memory = ManifestFingerprints.build(InMemoryManifest(_manifest(4, changed={1})), str(tmp_path), use_absolute_path=False)
+    assert in_memory.diff(fingerprints).changed == []
@@ -0,0 +1,226 @@
+import json
+import os
+import yaml
+
+import pytest
+
+from assets_manage.manifest import StreamingManifest, InMemoryManifest, CompiledManifestCache, convert_to_jsonl
+from assets_manage.exceptions import ManifestFileCorrupted
+from assets_manage.traits import encode_upload_data
+
+
+def _write_jsonl(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({f"asset {i}": {"id": i, "file_name": f"asset_{i}.png"}}) + "\n")
+
+
+def test_streaming_manifest_random_access(tmp_path):
+    manifest_path = str(tmp_path / "0manifest.jsonl")
+    _write_jsonl(manifest_path, 1000)
+
+    manifest = StreamingManifest(manifest_path, window_size=16)
+    keys = dict((asset_id, key) for key, asset_id in manifest.entries())
+    assert len(manifest) == 1000
+    assert manifest.get(keys[999])["file_name"] == "asset_999.png"
+    assert manifest.get(keys[3])["id"] == 3
+    assert len(manifest._window) <= 16
+    manifest.close()
+
+
+def test_streaming_manifest_index_reused_and_invalidated(tmp_path):
+    manifest_path = str(tmp_path / "0manifest.jsonl")
+    _write_jsonl(manifest_path, 10)
+    StreamingManifest(manifest_path).close()
+    assert os.path.isfile(manifest_path + StreamingManifest.index_suffix)
+    assert StreamingManifest(manifest_path)._load_index() is not None
+
+    _write_jsonl(manifest_path, 12)
+    assert len(StreamingManifest(manifest_path)) == 12
+
+
+def test_streaming_manifest_corrupted_line(tmp_path):
+    manifest_path = tmp_path / "0manifest.jsonl"
+    manifest_path.write_text('{"asset 0": {"id": 0}}\n{"asset 1": \n')
+    with pytest.raises(ManifestFileCorrupted):
+        StreamingManifest(str(manifest_path))
+
+
+def test_convert_yaml_manifest(tmp_path):
+    yaml_path = tmp_path / "0manifest.yaml"
+    yaml_path.write_text("assets_data:\n  asset 0:\n    id: 0\n    file_name: a.png\nassets_count: 1\n")
+    jsonl_path = str(tmp_path / "0manifest.jsonl")
+    assert convert_to_jsonl(str(yaml_path), jsonl_path) == 1
+    manifest = StreamingManifest(jsonl_path)
+    key, asset_id = next(manifest.entries())
+    assert manifest.get(key) == {"id": 0, "file_name": "a.png"}
+
+
+def test_compiled_cache_used_until_manifest_changes(tmp_path):
+    yaml_path = tmp_path / "0manifest.yaml"
+    yaml_path.write_text("assets_data:\n  asset 0:\n    id: 0\n    file_name: a.png\n")
+    cache = CompiledManifestCache(str(yaml_path))
+    assert cache.load() is None
+
+    assert len(InMemoryManifest.load(str(yaml_path))) == 1
+    assert cache.load().manifest_data == {"assets_data": {"asset 0": {"id": 0, "file_name": "a.png"}}}
+
+    yaml_path.write_text("assets_data:\n  asset 0:\n    id: 0\n    file_name: b.png\n")
+    assert cache.load() is None
+    assert InMemoryManifest.load(str(yaml_path)).get(0)["file_name"] == "b.png"
+
+
+def test_in_memory_manifest_columns_round_trip():
+    assets_data = {
+        "asset 0": {"id": 0, "file_name": "a.png", "path": "/collection/a.png"},
+        "custom": {"id": 5, "file_name": "b.png", "path": "/other/renamed.png", "props": {"name": "B"}},
+        "asset 6": {"id": 6, "path": None, "attrs": ["x"]},
+    }
+    manifest = InMemoryManifest({"assets_data": assets_data, "assets_count": 3})
+    assert manifest.manifest_data == {"assets_data": assets_data, "assets_count": 3}
+    assert list(manifest.entries()) == [(0, 0), (1, 5), (2, 6)]
+    assert manifest.path_names[0] is None and manifest.names[0] is None
+
+
+def test_in_memory_manifest_entry_without_id():
+    with pytest.raises(ManifestFileCorrupted):
+        InMemoryManifest({"assets_data": {"asset 0": {"file_name": "a.png"}}})
+
+
+def test_trait_lists_interned_and_encoded_once(tmp_path):
+    properties = [{"name": "Background", "value": "Blue"}, {"name": "Eyes", "value": "Laser"}]
+    assets_data = {
+        f"asset {i}": {"id": i, "file_name": f"{i}.png", "props": {"name": f"N{i}", "properties": list(properties), "levels": []}}
+        for i in range(3)
+    }
+    manifest = InMemoryManifest({"assets_data": assets_data})
+    assert manifest.manifest_data["assets_data"] == assets_data
+    assert len(manifest.traits) == 2
+    first, second = manifest.get(0)["props"], manifest.get(2)["props"]
+    assert first["properties"][0] is second["properties"][0]
+    assert first["properties"].json == json.dumps(properties, separators=(",", ":"))
+
+    upload_data = {"id": "0", "name": first["name"], "properties": first["properties"], "levels": first["levels"]}
+    assert json.loads(encode_upload_data(upload_data)) == upload_data
+    assert json.loads(encode_upload_data({"properties": first["properties"]})) == {"properties": properties}
+
+    yaml_path = tmp_path / "0manifest.yaml"
+    yaml_path.write_text("assets_data: {}\n")
+    CompiledManifestCache(str(yaml_path)).save(manifest)
+    restored = CompiledManifestCache(str(yaml_path)).load()
+    assert restored.manifest_data == manifest.manifest_data
+    assert restored.get(0)["props"]["properties"][1] is restored.get(1)["props"]["properties"][1]
+
+
+def test_interned_traits_are_read_only(tmp_path):
+    properties = [{"name": "Background", "value": "Blue"}]
+    assets_data = {f"asset {i}": {"id": i, "file_name": f"{i}.png", "props": {"properties": list(properties)}} for i in range(2)}
+    manifest = InMemoryManifest({"assets_data": assets_data})
+    traits = manifest.get(0)["props"]["properties"]
+    with pytest.raises(TypeError):
+        traits[0]["value"] = "Red"
+    with pytest.raises(TypeError):
+        traits.append({"name": "Eyes", "value": "Laser"})
+    changed = [dict(traits[0], value="Red")] + traits[1:] # copies are plain, encoded by json.dumps
+    assert json.loads(encode_upload_data({"properties": changed})) == {"properties": [{"name": "Background", "value": "Red"}]}
+    assert manifest.get(1)["props"]["properties"] == properties
+
+    yaml_path = tmp_path / "0manifest.yaml"
+    yaml_path.write_text(yaml.safe_dump({"assets_data": assets_data}))
+    InMemoryManifest.load(str(yaml_path)) # compiled cache with interned traits
+    not_interned = InMemoryManifest.load(str(yaml_path), intern_traits=False)
+    traits = not_interned.get(0)["props"]["properties"]
+    traits[0]["value"] = "Red"
+    assert not_interned.get(1)["props"]["properties"] == properties
+
+
+def test_streaming_manifest_refresh_picks_up_appended_lines(tmp_path):
+    manifest_path = str(tmp_path / "0manifest.jsonl")
+    _write_jsonl(manifest_path, 2)
+    manifest = StreamingManifest(manifest_path)
+    assert manifest.refresh() == []
+
+    with open(manifest_path, "a") as f:
+        f.write(json.dumps({"asset 2": {"id": 2, "file_name": "c.png"}}) + "\n")
+        f.write('{"asset 3": {"id": 3, "fi') # being appended
+    new = manifest.refresh()
+    assert [asset_id for _, asset_id in new] == [2]
+    assert manifest.get(new[0][0])["file_name"] == "c.png"
+
+    with open(manifest_path, "a") as f:
+        f.write('le_name": "d.png"}}\n')
+    assert [asset_id for _, asset_id in manifest.refresh()] == [3]
+    assert len(StreamingManifest(manifest_path)) == 4 # saved index is up to date
+    manifest.close()
+
+
+def test_streaming_manifest_refresh_reopens_rewritten_file(tmp_path):
+    manifest_path = str(tmp_path / "0manifest.jsonl")
+    _write_jsonl(manifest_path, 3)
+    manifest = StreamingManifest(manifest_path)
+    keys_version = manifest.keys_version
+    manifest.get(dict((i, key) for key, i in manifest.entries())[2]) # file is opened
+
+    tmp_path_ = manifest_path + ".tmp"
+    with open(tmp_path_, "w") as f:
+        f.write(json.dumps({"asset 2": {"id": 2, "file_name": "renamed_2.png"}}) + "\n")
+        f.write(json.dumps({"asset 5": {"id": 5, "file_name": "asset_5.png"}}) + "\n")
+    os.replace(tmp_path_, manifest_path)
+
+    assert [asset_id for _, asset_id in manifest.refresh()] == [5]
+    assert manifest.keys_version == keys_version + 1
+    keys = dict((asset_id, key) for key, asset_id in manifest.entries())
+    assert sorted(keys) == [2, 5]
+    assert manifest.get(keys[2])["file_name"] == "renamed_2.png"
+    assert manifest.get(keys[5])["file_name"] == "asset_5.png"
+    manifest.close()
+
+
+def test_in_memory_manifest_refresh(tmp_path):
+    yaml_path = tmp_path / "0manifest.yaml"
+    yaml_path.write_text("assets_data:\n  asset 0:\n    id: 0\n    file_name: a.png\n")
+    manifest = InMemoryManifest.load(str(yaml_path))
+    assert manifest.refresh() == []
+
+    yaml_path.write_text("assets_data:\n  asset 0:\n    id: 0\n    file_name: a.png\n  asset 1:\n    id: 1\n    file_name: b.png\n")
+    assert manifest.refresh() == [(1, 1)]
+    assert manifest.get(1)["file_name"] == "b.png"
+
+
+def test_in_memory_manifest_refresh_of_half_written_file(tmp_path):
+    yaml_path = tmp_path / "0manifest.yaml"
+    header = 'assets_data:\n  "asset 0": {"id": 0, "file_name": "a.png"}\n'
+    yaml_path.write_text(header)
+    manifest = InMemoryManifest.load(str(yaml_path))
+
+    yaml_path.write_text("")
+    with pytest.raises(ManifestFileCorrupted):
+        manifest.refresh()
+    yaml_path.write_text(header + '  "asset 1": {"id": 1, "file_na')
+    with pytest.raises(ManifestFileCorrupted):
+        manifest.refresh()
+    yaml_path.write_text(header + '  "asset 1": ')
+    assert manifest.refresh() == []
+
+    yaml_path.write_text(header + '  "asset 1": {"id": 1, "file_name": "b.png"}\nassets_count: 2\n')
+    assert manifest.refresh() == [(1, 1)]
+    assert len(manifest) == 2
+
+
+def test_file_entries_of_both_manifests(tmp_path):
+    assets_data = {
+        "asset 0": {"id": 0, "file_name": "0.png", "size": 10},
+        "asset 1": {"id": 1, "file_name": "1.png", "path": "/data/1.png", "props": {"name": "One"}},
+        "asset 2": {"id": 2, "file_name": "2.png", "size": True},
+    }
+    expected = [(0, "0.png", None, 10), (1, "1.png", "/data/1.png", None), (2, "2.png", None, None)]
+    assert list(InMemoryManifest({"assets_data": assets_data}).file_entries()) == expected
+
+    manifest_path = str(tmp_path / "0manifest.jsonl")
+    with open(manifest_path, "w") as f:
+        f.writelines(json.dumps({name: asset_data}) + "\n" for name, asset_data in assets_data.items())
+    manifest = StreamingManifest(manifest_path)
+    try:
+        assert list(manifest.file_entries()) == expected
+    finally:
+        manifest.close()
@@ -0,0 +1,107 @@
+import pytest
+
+from assets_manage.pending_index import PendingAssetsIndex
+
+
+def _index(count=5, uploaded=()):
+    return PendingAssetsIndex(((f"asset {i}", i) for i in range(count)), uploaded_ids=uploaded)
+
+
+def test_dispatch_in_manifest_order():
+    index = _index(uploaded=(1, 3))
+    assert [index.pop_next() for _ in range(4)] == [0, 2, 4, None]
+    assert index.in_progress_count == 3
+
+
+def test_failed_asset_is_retried_with_backoff():
+    index = _index()
+    first = index.pop_next()
+    assert index.mark_failed(first) == 1
+    assert index.mark_failed(first) is None
+    assert index.pop_next() == 1 # fresh work goes on while failed asset waits in the retry lane
+    assert 2.5 <= index.next_retry_in() <= 5
+
+    index.retry_base_delay = 0
+    index.pop_next()
+    index.mark_failed(2)
+    assert index.pop_next() == 2 # ready retry is dispatched before fresh work
+
+
+def test_asset_is_dead_after_max_attempts():
+    index = PendingAssetsIndex([("a", 0), ("b", 1)], dead_ids=(1,), max_attempts=2)
+    index.retry_base_delay = 0
+    for attempt in (1, 2):
+        assert index.pop_next() == 0
+        assert index.mark_failed(0) == attempt
+    assert index.is_dead(0) and index.dead_count == 2
+    assert index.pop_next() is None and index.retry_count == 0
+
+
+def test_uploaded_asset_is_not_dispatched_again():
+    index = _index(count=2)
+    asset_id = index.pop_next()
+    index.mark_uploaded(asset_id)
+    assert index.uploaded_count == 1
+    assert not index.mark_failed(asset_id)
+    assert index.pop_next() == 1
+    assert index.pop_next() is None
+
+
+def test_duplicated_ids_are_indexed_once():
+    index = PendingAssetsIndex([("a", 0), ("b", 0)])
+    assert len(index) == 1
+    assert index.manifest_key(0) == "a"
+
+
+def test_expired_claimed_lease_returns_asset():
+    index = _index(count=3)
+    first, second = index.pop_next(lease_time=0), index.pop_next(lease_time=60)
+    lease = index.lease(first)
+    assert lease.claim()
+    assert index.lease(second).claim()
+    assert index.reap_expired() == [first]
+    assert lease.revoked and not lease.claim()
+    assert index.pop_next() == first
+    assert index.in_progress_count == 2
+
+
+def test_unclaimed_lease_is_kept_until_later_lease_claimed():
+    index = _index(count=3)
+    first, second = index.pop_next(lease_time=0), index.pop_next(lease_time=60)
+    assert index.reap_expired() == [] # both assets still may wait in the bus
+    assert index.lease(second).claim()
+    assert index.reap_expired() == [first] # first asset was lost before reaching the driver
+    index.mark_uploaded(second)
+    assert not index.mark_failed(second)
+    assert index.pop_next() == first
+
+
+def test_sparse_ids_and_late_manifest_entries():
+    index = PendingAssetsIndex([(0, 10**12), (64, 3)], uploaded_ids=(7,), dead_ids=(8,))
+    assert index.peek(5) == [10**12, 3]
+    assert index.manifest_key(10**12) == 0
+    assert index.add(128, 7) is False # already uploaded
+    assert index.add(192, 8) is False and index.is_dead(8)
+    assert index.add(256, 9)
+    assert [index.pop_next() for _ in range(4)] == [10**12, 3, 9, None]
+    assert index.uploaded_ids == {7} and index.uploaded_count == 1
+
+
+def test_set_order_keeps_dispatched_rows():
+    index = PendingAssetsIndex(((i, i) for i in range(5)), uploaded_ids=[3])
+    assert index.pop_next() == 0
+    index.set_order([4, 3, 2, 1, 0])
+    assert index.peek(5) == [4, 2, 1]
+    with pytest.raises(ValueError):
+        index.set_order([4, 4, 2, 1, 0])
+    index.add(5, 5)
+    assert [index.pop_next() for _ in range(5)] == [4, 2, 1, 5, None]
+    assert index.pending_count == 0
+
+
+def test_remap_keys_of_rewritten_manifest():
+    index = PendingAssetsIndex(((i*64, i) for i in range(4)), uploaded_ids=[3])
+    assert index.remap_keys([(0, 2), (64, 0), (128, 5)]) == [1, 3]
+    assert index.manifest_key(2) == 0 and index.manifest_key(0) == 64
+    assert index.remap_keys([("asset 0", 0)]) == [1, 2, 3] # keys column is converted
+    assert index.manifest_key(0) == "asset 0"
@@ -0,0 +1,74 @@
+import os
+import json
+
+from assets_manage.preflight import PreflightValidator, sniff_media_type, read_head
+from assets_manage.stat_cache import FileStatCache
+
+
+def test_sniff_media_type():
+    assert sniff_media_type(b"\x00\x00\x00\x18ftypmp42") == "video/mp4"
+    assert sniff_media_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_media_type(b'<?xml version="1.0"?><svg xmlns="http://www.w3.org/2000/svg"/>') == "image/svg+xml"
+    assert sniff_media_type(b'{"asset": {"version": "2.0"}}', "model.gltf") == "model/gltf+json"
+    assert sniff_media_type(b'{"asset": {"version": "2.0"}}', "model.json") is None
+
+
+def test_sniff_audio_frames():
+    for frame_header in (b"\xff\xfb\x90\x64", b"\xff\xf3\x40\xc4", b"\xff\xe3\x18\xc4", b"\xff\xfd\x90\x64"):
+        assert sniff_media_type(frame_header) == "audio/mpeg"
+    for adts_header in (b"\xff\xf1\x50\x80", b"\xff\xf9\x50\x80"):
+        assert sniff_media_type(adts_header) == "audio/aac"
+    assert sniff_media_type(b"\xff\xe9\x00\x00") is None # reserved version, no layer
+    assert sniff_media_type(b"\xff\xd8\xff\xe0") == "image/jpeg"
+
+
+def test_svg_after_long_prolog(tmp_path):
+    svg = tmp_path / "asset.svg"
+    svg.write_bytes(b'<?xml version="1.0"?>\n<!-- ' + b"license " * 512 + b'-->\n<svg xmlns="http://www.w3.org/2000/svg"/>')
+    with open(svg, "rb") as f:
+        assert sniff_media_type(read_head(f)) == "image/svg+xml"
+    (tmp_path / "notes.html").write_bytes(b"<html>" + b" " * 128*1024)
+    with open(tmp_path / "notes.html", "rb") as f:
+        head = read_head(f)
+    assert len(head) == 64*1024 and sniff_media_type(head) is None
+
+
+def test_cached_result_skips_reading(tmp_path, monkeypatch):
+    asset = tmp_path / "asset.glb"
+    asset.write_bytes(b"glTF\x02\x00\x00\x00")
+    cache_path = str(tmp_path / "cache.jsonl")
+
+    validator = PreflightValidator(cache_path, max_file_size=1024)
+    assert validator.submit(str(asset)).result().media_type == "model/gltf-binary"
+    validator.close()
+
+    sniffed = []
+    monkeypatch.setattr("assets_manage.preflight.sniff_media_type", lambda head, name: sniffed.append(name))
+    validator = PreflightValidator(cache_path, max_file_size=1024)
+    try:
+        assert validator.validate(str(asset)).media_type == "model/gltf-binary"
+        assert sniffed == [] # size and mtime are the same
+        asset.write_bytes(b"changed")
+        assert validator.validate(str(asset)).error == "Unsupported file type"
+        assert sniffed == [str(asset)]
+    finally:
+        validator.close()
+
+
+def test_stat_cache_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(FileStatCache, "min_compaction_lines", 10)
+    asset = tmp_path / "asset.png"
+    asset.write_bytes(b"\x89PNG\r\n\x1a\n")
+    cache_path = tmp_path / "cache.jsonl"
+    cache = FileStatCache(str(cache_path))
+    for i in range(25):
+        cache.put(str(asset), os.stat(asset), {"media_type": "image/png", "attempt": i})
+    cache.close()
+    assert len(cache_path.read_text().splitlines()) < 10
+
+    cache_path.write_text("".join(
+        json.dumps({"path": str(asset), "size": 8, "mtime_ns": i, "media_type": None}) + "\n" for i in range(20)
+    ))
+    cache = FileStatCache(str(cache_path))
+    cache.close()
+    assert [json.loads(line)["mtime_ns"] for line in cache_path.read_text().splitlines()] == [19]
@@ -0,0 +1,27 @@
+import pytest
+
+from assets_manage.read_ahead import FileReadAhead
+
+
+@pytest.mark.parametrize("mode", ["read", "auto"])
+def test_budget_and_warm_ratio(tmp_path, mode):
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f"{i}.png"))
+        (tmp_path / f"{i}.png").write_bytes(b"x" * 100)
+
+    read_ahead = FileReadAhead(250, mode=mode)
+    try:
+        assert read_ahead.prefetch(0, paths[0]) and read_ahead.prefetch(1, paths[1])
+        assert not read_ahead.prefetch(2, paths[2]) # over budget
+        assert not read_ahead.prefetch(3, str(tmp_path / "missing.png"))
+        read_ahead._pending[0][1].result()
+
+        assert read_ahead.dispatched(0)
+        read_ahead.retain([2]) # asset 1 left the window
+        assert 1 not in read_ahead
+        assert read_ahead.prefetch(2, paths[2])
+        assert not read_ahead.dispatched(5)
+        assert read_ahead.stats == {"dispatched": 2, "warm": 1, "warm_ratio": 0.5, "warmed_bytes": 100}
+    finally:
+        read_ahead.close()
@@ -0,0 +1,26 @@
+import os
+
+from assets_manage.staging import StagingCache
+
+
+def test_lru_eviction_keeps_files_in_use(tmp_path):
+    for i in range(4):
+        (tmp_path / f"{i}.png").write_bytes(b"%d" % i * 100)
+    staging = StagingCache(str(tmp_path / "local"), byte_budget=250)
+    try:
+        assert staging.stage(0, str(tmp_path / "0.png")) and staging.stage(1, str(tmp_path / "1.png"))
+        staging._files[1].copying.result()
+        path = staging.dispatch(1)
+        assert open(path, "rb").read() == b"1" * 100
+
+        assert staging.stage(2, str(tmp_path / "2.png")) # 0 is evicted, 1 is in use
+        assert 0 not in staging and 1 in staging
+        assert not staging.stage(3, str(tmp_path / "3.png"), keep={2})
+
+        staging.release(1)
+        staging._executor.submit(lambda: None).result()
+        assert not os.path.exists(path)
+        assert staging.stats == {"dispatched": 1, "staged": 1, "staged_bytes": 100}
+    finally:
+        staging.close()
+    assert not os.path.exists(staging.staging_dir)
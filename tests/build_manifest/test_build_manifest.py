@@ -0,0 +1,100 @@
+import os
+import json
+
+from assets_manage.build_manifest import build_manifest, scan_collection_dir, manifest_files
+from assets_manage.manifest import StreamingManifest, InMemoryManifest
+
+
+PNG_HEAD = b"\x89PNG\r\n\x1a\n"
+
+
+def _collection(tmp_path, *names):
+    for name in names:
+        (tmp_path / name).write_bytes(PNG_HEAD + name.encode())
+
+
+def test_build_and_append(tmp_path):
+    _collection(tmp_path, "a_10.png", "a_2.png")
+    (tmp_path / "notes.txt").write_text("not an asset")
+    (tmp_path / "a_2.json").write_text(json.dumps({"name": "Second", "attributes": [
+        {"trait_type": "Color", "value": "Red"},
+        {"trait_type": "Power", "value": 7, "max_value": 10},
+        {"trait_type": "Age", "value": 3, "display_type": "number"},
+    ]}))
+    manifest_path = str(tmp_path / "0manifest.jsonl")
+    assert build_manifest(str(tmp_path), manifest_path, workers=2) == (2, 1)
+
+    _collection(tmp_path, "a_3.png")
+    assert build_manifest(str(tmp_path), manifest_path, incremental=True, workers=2) == (1, 1)
+
+    manifest = StreamingManifest(manifest_path)
+    entries = [manifest.get(key) for key, _ in manifest.entries()]
+    manifest.close()
+    assert [(e["id"], e["file_name"]) for e in entries] == [(0, "a_2.png"), (1, "a_10.png"), (2, "a_3.png")]
+    assert entries[0]["props"] == {
+        "name": "Second",
+        "properties": [{"name": "Color", "value": "Red"}],
+        "levels": [{"name": "Power", "value": 7, "max": 10}],
+        "stats": [{"name": "Age", "value": 3, "max": 3}],
+    }
+    assert len(entries[0]["sha256"]) == 64
+
+
+def test_build_yaml_manifest(tmp_path):
+    _collection(tmp_path, "b.png")
+    manifest_path = str(tmp_path / "0manifest.yaml")
+    build_manifest(str(tmp_path), manifest_path, workers=1, with_hash=False)
+    inode = os.stat(manifest_path).st_ino
+    _collection(tmp_path, "c.png")
+    build_manifest(str(tmp_path), manifest_path, incremental=True, workers=1, with_hash=False)
+    assert os.stat(manifest_path).st_ino == inode # appended in place
+
+    manifest = InMemoryManifest.load(manifest_path, use_cache=False)
+    assert [manifest.get(key)["file_name"] for key, _ in manifest.entries()] == ["b.png", "c.png"]
+    assert manifest.manifest_data["assets_count"] == 2
+
+
+def test_not_appendable_yaml_manifest_is_rewritten(tmp_path):
+    _collection(tmp_path, "b.png", "c.png")
+    manifest_path = tmp_path / "0manifest.yaml"
+    manifest_path.write_text("assets_data:\n    asset 0:\n        id: 0\n        file_name: b.png\nother_key: 1\n")
+    assert build_manifest(str(tmp_path), str(manifest_path), incremental=True, workers=1, with_hash=False) == (1, 0)
+
+    manifest = InMemoryManifest.load(str(manifest_path), use_cache=False)
+    assert [manifest.get(key)["file_name"] for key, _ in manifest.entries()] == ["b.png", "c.png"]
+
+
+def test_zero_prefixed_assets_are_not_ignored(tmp_path):
+    _collection(tmp_path, "0.png", "007_rare.png", "1.png")
+    (tmp_path / "0data_keeper.yaml").write_text("{}")
+    (tmp_path / "0fingerprints.bin").write_bytes(b"")
+    (tmp_path / ".hidden.png").write_bytes(PNG_HEAD)
+    manifest_path = str(tmp_path / "0manifest.jsonl")
+    assert build_manifest(str(tmp_path), manifest_path, workers=1, with_hash=False) == (3, 0)
+
+    manifest = StreamingManifest(manifest_path)
+    assert [manifest.get(key)["file_name"] for key, _ in manifest.entries()] == ["0.png", "1.png", "007_rare.png"]
+    manifest.close()
+
+
+def test_incremental_append_with_known_files(tmp_path):
+    _collection(tmp_path, "a.png")
+    os.mkdir(tmp_path / "sub")
+    _collection(tmp_path / "sub", "b.png")
+    manifest_path = str(tmp_path / "0manifest.yaml")
+    listings = dict()
+    assert list(scan_collection_dir(str(tmp_path), listings)) == ["a.png", os.path.join("sub", "b.png")]
+    build_manifest(str(tmp_path), manifest_path, workers=0, with_hash=False)
+    known_files, next_id = manifest_files(manifest_path)
+    assert (known_files, next_id) == ({"a.png", os.path.join("sub", "b.png")}, 2)
+
+    _collection(tmp_path / "sub", "c.png")
+    files = list(scan_collection_dir(str(tmp_path), listings))
+    assert files == ["a.png", os.path.join("sub", "b.png"), os.path.join("sub", "c.png")]
+    (tmp_path / "0manifest.yaml").write_text("assets_data:\n") # known files are not read from the manifest
+    assert build_manifest(str(tmp_path), manifest_path, incremental=True, workers=0, with_hash=False,
+                          files=files, known_files=known_files, next_id=next_id) == (1, 0)
+    assert os.path.join("sub", "c.png") in known_files
+
+    manifest = InMemoryManifest.load(manifest_path, use_cache=False)
+    assert [(asset_id, manifest.get(key)["file_name"]) for key, asset_id in manifest.entries()] == [(2, os.path.join("sub", "c.png"))]
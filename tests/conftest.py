@@ -5,6 +5,7 @@ from queue import Queue
 
 from events import EventHolder, ServerEvent
 from driver_init import init_driver_before_success
+from config import CollectionConfig
 
 
 # For testing reasons you may use this Metamask Secret Phrases
@@ -45,6 +46,25 @@ def driver():
     yield new_driver
     new_driver.quit()
 
+
+@pytest.fixture
+def collection_config(tmp_path):
+    """
+    CollectionConfig(singleton) of the test collection in tmp_path with default options, without config file.
+    Options changed by the test are restored after it
+    """
+    config = CollectionConfig(hide_errors=True, disable_warnings=True)
+    saved = dict(vars(config))
+    for attr in config.config_attrs():
+        setattr(config, attr.name, attr.default)
+    config.collection_name = "Test"
+    config.collection_dir_local_path = str(tmp_path)
+    config.single_asset_name = "Test asset"
+    config.use_absolute_path = False
+    yield config
+    vars(config).clear()
+    vars(config).update(saved)
+
 # store history of failures per test class name and per index in parametrize (if parametrize used)
 _test_failed_incremental: Dict[str, Dict[Tuple[int, ...], str]] = {}
 
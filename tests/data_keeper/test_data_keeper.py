@@ -0,0 +1,124 @@
+import os
+from threading import Event
+
+import yaml
+
+from assets_manage.data_keeper import DataKeeper
+
+
+def _record(asset_id):
+    return {"asset_id": asset_id, "token_id": str(asset_id), "contract_address": "0x0", "asset_type": None}
+
+
+def _keeper_with_records(keeper_path, ids, **kwargs):
+    keeper = DataKeeper(keeper_path, **kwargs)
+    keeper.load_uploaded_ids()
+    for i in ids:
+        keeper.record(i, _record(i))
+    assert keeper.flush(timeout=5)
+    keeper.stop()
+
+
+def test_records_are_group_committed(tmp_path):
+    keeper_path = str(tmp_path / "0data_keeper.yaml")
+    keeper = DataKeeper(keeper_path, flush_interval=0.05)
+    for i in range(100):
+        keeper.record(i, _record(i))
+    assert keeper.flush(timeout=5)
+
+    with open(keeper_path) as f:
+        assert yaml.safe_load(f) == {i: _record(i) for i in range(100)}
+    keeper.stop()
+
+    assert sorted(DataKeeper(keeper_path).load_uploaded_ids()) == list(range(100))
+
+
+def test_stop_commits_queued_records(tmp_path):
+    keeper_path = str(tmp_path / "0data_keeper.yaml")
+    keeper = DataKeeper(keeper_path, flush_interval=10, fsync_policy="never")
+    keeper.record(7, _record(7))
+    keeper.stop()
+    assert DataKeeper(keeper_path).load_uploaded_ids() == [7]
+
+
+def test_uploaded_ids_recovered_from_index_and_keeper_tail(tmp_path):
+    keeper_path = str(tmp_path / "0data_keeper.yaml")
+    _keeper_with_records(keeper_path, range(5))
+
+    # record was committed, but the process was killed before the index update
+    with open(keeper_path, "ab") as f:
+        f.write(DataKeeper.encode_record(5, _record(5)))
+
+    keeper = DataKeeper(keeper_path)
+    assert sorted(keeper.load_uploaded_ids()) == list(range(6))
+    assert keeper._read_ids_index()[1] == os.path.getsize(keeper_path)
+    keeper.stop()
+
+
+def test_torn_trailing_record_is_truncated(tmp_path):
+    keeper_path = str(tmp_path / "0data_keeper.yaml")
+    _keeper_with_records(keeper_path, range(3))
+    valid_size = os.path.getsize(keeper_path)
+
+    with open(keeper_path, "ab") as f:
+        f.write(DataKeeper.encode_record(3, _record(3))[:-10])
+    assert sorted(DataKeeper(keeper_path).load_uploaded_ids()) == [0, 1, 2]
+    assert os.path.getsize(keeper_path) == valid_size
+
+    with open(keeper_path, "ab") as f:
+        f.write(DataKeeper.encode_record(3, _record(3)).replace(b"0x0", b"0x1"))
+    assert sorted(DataKeeper(keeper_path).load_uploaded_ids()) == [0, 1, 2]
+
+    _keeper_with_records(keeper_path, [3])
+    assert sorted(DataKeeper(keeper_path).load_uploaded_ids()) == [0, 1, 2, 3]
+
+
+def test_legacy_data_keeper_is_converted(tmp_path):
+    keeper_path = tmp_path / "0data_keeper.yaml"
+    keeper_path.write_text(yaml.dump({i: _record(i) for i in range(3)}))
+    assert sorted(DataKeeper(str(keeper_path)).load_uploaded_ids()) == [0, 1, 2]
+    assert [asset_id for asset_id, _ in DataKeeper(str(keeper_path)).iter_records()] == [0, 1, 2]
+
+
+def test_log_compaction(tmp_path):
+    keeper_path = str(tmp_path / "0data_keeper.yaml")
+    _keeper_with_records(keeper_path, [0, 1, 1, 2])
+    with open(keeper_path, "r+b") as f:
+        f.write(b"X") # break the first record
+
+    _keeper_with_records(keeper_path, [2, 3], compaction_threshold=1)
+    assert [asset_id for asset_id, _ in DataKeeper(keeper_path).iter_records()] == [1, 2, 3]
+    assert os.path.isfile(keeper_path + DataKeeper.corrupted_suffix)
+    assert sorted(DataKeeper(keeper_path).load_uploaded_ids()) == [1, 2, 3]
+
+
+def test_records_committed_during_compaction_are_kept(tmp_path, monkeypatch):
+    keeper_path = str(tmp_path / "0data_keeper.yaml")
+    _keeper_with_records(keeper_path, [0, 0, 1])
+    compaction_started, commits_done = Event(), Event()
+    compacted_records = DataKeeper._compacted_records
+
+    def slow_compacted_records(keeper, size):
+        compaction_started.set()
+        assert commits_done.wait(timeout=5)
+        return compacted_records(keeper, size)
+
+    monkeypatch.setattr(DataKeeper, "_compacted_records", slow_compacted_records)
+    keeper = DataKeeper(keeper_path, compaction_threshold=1)
+    keeper.load_uploaded_ids()
+    keeper.record(2, _record(2))
+    assert compaction_started.wait(timeout=5)
+    keeper.record(3, _record(3)) # committed while the snapshot is written
+    assert keeper.flush(timeout=5)
+    commits_done.set()
+    keeper.stop()
+
+    assert [asset_id for asset_id, _ in DataKeeper(keeper_path).iter_records()] == [0, 1, 2, 3]
+    assert sorted(DataKeeper(keeper_path).load_uploaded_ids()) == [0, 1, 2, 3]
+
+
+def test_legacy_data_keeper_with_dates_is_converted(tmp_path):
+    keeper_path = tmp_path / "0data_keeper.yaml"
+    keeper_path.write_text("1:\n  asset_id: 1\n  uploaded: 2022-01-02\n")
+    assert DataKeeper(str(keeper_path)).load_uploaded_ids() == [1]
+    assert list(DataKeeper(str(keeper_path)).iter_records()) == [(1, {"asset_id": 1, "uploaded": "2022-01-02"})]
@@ -0,0 +1,37 @@
+from assets_manage.rate_limiter import TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_tokens_are_refilled_with_rate():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(max_rate=2, burst=2, clock=clock)
+    assert limiter.acquire() and limiter.acquire()
+    assert not limiter.acquire()
+    assert limiter.time_to_token() == 0.5
+
+    clock.now = 0.5
+    assert limiter.acquire() and not limiter.acquire()
+    limiter.refund()
+    assert limiter.acquire()
+
+
+def test_rate_backs_off_on_throttling_and_recovers():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(max_rate=1, clock=clock)
+    assert limiter.throttled()
+    assert not limiter.throttled() # in cooldown, responses of the requests in flight
+    assert limiter.rate == 0.5 and not limiter.acquire()
+
+    clock.now += limiter.backoff_cooldown
+    assert limiter.throttled() and limiter.rate == 0.25
+    for _ in range(100):
+        limiter.succeeded()
+    assert limiter.rate == 1
+    assert limiter.stats == {"rate_per_minute": 60, "max_rate_per_minute": 60, "throttled": 3, "backoffs": 2}
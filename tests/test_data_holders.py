@@ -0,0 +1,31 @@
+import os
+
+import asset_data_holder
+from data_holders import getAssetDataHolderClass, CollectionInfo, SingleAssetData
+
+
+INFO = {"collection_name": "Test", "collection_dir_local_path": "collection", "use_absolute_path": True,
+        "single_asset_name": "Asset", "asset_external_link_base": "", "collection_description": ""}
+
+
+def test_asset_holder_is_lazy_and_keeps_subclassing_contract():
+    holder_class = getAssetDataHolderClass()
+    assert holder_class is asset_data_holder.SingleAssetDataRepresentation
+    info = CollectionInfo(INFO)
+    asset = holder_class({"id": 7, "file_name": "7.png", "props": {"properties": [{"name": "Hat", "value": "Red"}]}}, collection_info=info)
+    assert not hasattr(asset, "__dict__")
+    assert asset._store is None
+    assert asset.path == os.path.abspath(os.path.join("collection", "7.png"))
+    assert asset._store is None # path doesn't build upload data
+
+    asset.use_staged_file("/staging/7.png")
+    upload_data = asset.as_upload_data_dict()
+    assert upload_data["name"] == "Asset#7" and upload_data["properties"] == [{"name": "Hat", "value": "Red"}]
+    assert asset["assetPath"] == "/staging/7.png"
+    assert asset.store is asset.store
+
+
+def test_plain_dict_and_not_normalized_file_names():
+    asset = SingleAssetData({"id": 1, "file_name": "../other/1.png", "path": "/abs/1.png"}, collection_info=dict(INFO, use_absolute_path=False))
+    assert asset.path == os.path.abspath(os.path.join("other", "1.png"))
+    assert asset.origin_info["collection_name"] == "Test"
@@ -0,0 +1,244 @@
+from queue import Queue, Empty
+import time
+import yaml
+
+from events import ServerEvent
+from data_holders import UploadResponseHolder
+from assets_manage.assets_handler import AssetsHandler
+from assets_manage.assets_upload_manager import AssetsUploadManager
+from assets_manage.upload_backends import FakeBackend
+
+
+def _config(config, tmp_path, count):
+    manifest = {"assets_data": {f"asset {i}": {"id": i, "file_name": f"{i}.png"} for i in range(count)}}
+    (tmp_path / AssetsHandler.collection_manifest).write_text(yaml.safe_dump(manifest, sort_keys=False))
+    for i in range(count):
+        (tmp_path / f"{i}.png").write_bytes(b"\x89PNG\r\n\x1a\n%d" % i)
+    config.max_upload_time = 1
+    return config
+
+
+def test_upload_manager_with_fake_backend(collection_config, tmp_path):
+    count = 40
+    bus = Queue()
+    manager = AssetsUploadManager(
+        bus,
+        backend_factory=lambda: FakeBackend(init_time=(0.01, 0), upload_time=(0.005, 0.5), error_rate=0.1, seed=1),
+        collection_config=_config(collection_config, tmp_path, count)
+    )
+    handler = manager.assets_handler
+    handler.pending_index.retry_base_delay = 0
+    try:
+        manager.init_drivers(3)
+        manager.unlock_drivers_input_bus()
+        ready, failed = 0, 0
+        deadline = time.monotonic() + 10
+        while handler.uploaded_assets_count < count and time.monotonic() < deadline:
+            try:
+                event = bus.get(timeout=0.1)
+            except Empty:
+                continue
+            if event.check(ServerEvent.WORKER_READY):
+                ready += 1
+            elif event.check(ServerEvent.WORKER_COMPLETED_UPLOAD):
+                assert isinstance(event.payload, UploadResponseHolder)
+                assert handler.asset_uploaded(event.payload)
+            elif event.check(ServerEvent.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD, ServerEvent.WORKER_UPLOAD_TIMEOUT_EXCEPTION):
+                failed += 1
+                handler.asset_uploading_failed(event.payload.asset_id, event.payload.error)
+        assert ready == 3
+        assert failed > 0
+        assert handler.uploaded_assets_ids == set(range(count))
+    finally:
+        manager.on_stop()
+
+
+def test_driver_slots_upload_concurrently(collection_config, tmp_path):
+    count = 12
+    bus = Queue()
+    backends = []
+
+    class PeakBackend(FakeBackend):
+        peak = 0
+
+        def start_upload(self, upload_data, slot):
+            super().start_upload(upload_data, slot)
+            self.peak = max(self.peak, len(self._uploads))
+
+    def backend_factory():
+        backends.append(PeakBackend(init_time=(0.01, 0), upload_time=(0.2, 0), throttle_rate=0.2, seed=2, slots=4))
+        return backends[-1]
+
+    config = _config(collection_config, tmp_path, count)
+    config.upload_rate_limit = 6000
+    manager = AssetsUploadManager(bus, backend_factory=backend_factory, collection_config=config)
+    handler = manager.assets_handler
+    handler.pending_index.retry_base_delay = 0
+    manager.rate_limiter.backoff_cooldown = 0
+    try:
+        manager.init_drivers(1)
+        assert manager.upload_slots_count == 4
+        manager.unlock_drivers_input_bus()
+        throttled = 0
+        start = time.monotonic()
+        while handler.uploaded_assets_count < count and time.monotonic() < start + 10:
+            try:
+                event = bus.get(timeout=0.1)
+            except Empty:
+                continue
+            if event.check(ServerEvent.WORKER_COMPLETED_UPLOAD):
+                handler.asset_uploaded(event.payload)
+            elif event.check(ServerEvent.WORKER_UPLOAD_THROTTLED):
+                throttled += 1
+        assert handler.uploaded_assets_ids == set(range(count))
+        assert throttled == manager.rate_limiter.backoff_count > 0
+        assert backends[0].peak == 4
+        assert backends[0].uploaded_count == count
+    finally:
+        manager.on_stop()
+
+
+def test_stopped_driver_reports_uploads_in_flight(collection_config, tmp_path):
+    bus = Queue()
+
+    class StaggeredBackend(FakeBackend):
+        def start_upload(self, upload_data, slot):
+            super().start_upload(upload_data, slot)
+            self._uploads[slot].completes_at = time.monotonic() + 0.2*(upload_data.asset_id+1)
+
+    backend = StaggeredBackend(init_time=(0.01, 0), slots=3)
+    manager = AssetsUploadManager(bus, backend_factory=lambda: backend, collection_config=_config(collection_config, tmp_path, 3))
+    try:
+        manager.init_drivers(1)
+        manager.unlock_drivers_input_bus()
+        driver = manager.workers_pool[0]
+        deadline = time.monotonic() + 5
+        while len(driver.in_flight) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(driver.in_flight) == 3
+        manager.lock_drivers_input_bus()
+        manager.close_drivers()
+        events = []
+        while not bus.empty():
+            events.append(bus.get())
+        completed = [event.payload.asset_id for event in events if event.check(ServerEvent.WORKER_COMPLETED_UPLOAD)]
+        assert sorted(completed) == [0, 1, 2]
+        assert events[-1].check(ServerEvent.WORKER_STOPPED) # backend is closed after uploads were reported
+        assert backend.uploaded_count == 3
+    finally:
+        manager.on_stop()
+
+
+def test_throttled_uploads_are_requeued_without_attempts(collection_config, tmp_path):
+    count = 10
+    bus = Queue()
+    config = _config(collection_config, tmp_path, count)
+    config.max_upload_attempts = 1
+    config.upload_rate_limit = 6000
+    manager = AssetsUploadManager(
+        bus,
+        backend_factory=lambda: FakeBackend(init_time=(0.01, 0), upload_time=(0.005, 0), throttle_rate=0.5, seed=3, slots=2),
+        collection_config=config
+    )
+    handler = manager.assets_handler
+    manager.rate_limiter.backoff_cooldown = 0
+    manager.rate_limiter.min_rate_share = 0.5
+    try:
+        manager.init_drivers(2)
+        manager.unlock_drivers_input_bus()
+        throttled = 0
+        deadline = time.monotonic() + 10
+        while handler.uploaded_assets_count < count and time.monotonic() < deadline:
+            try:
+                event = bus.get(timeout=0.1)
+            except Empty:
+                continue
+            if event.check(ServerEvent.WORKER_COMPLETED_UPLOAD):
+                if not handler.asset_uploaded(event.payload):
+                    assert event.payload.throttled
+                    throttled += 1
+        assert throttled > 0
+        assert handler.uploaded_assets_ids == set(range(count))
+        assert handler.pending_index.dead_count == 0 and handler.dead_letters.load() == {}
+    finally:
+        manager.on_stop()
+
+
+def test_standby_drivers_replace_failed_and_added_drivers(collection_config, tmp_path):
+    bus = Queue()
+    backends = iter([
+        FakeBackend(init_time=(0.01, 0), init_failure_rate=1), # active driver, never initialized
+        FakeBackend(init_time=(0.01, 0)),
+        FakeBackend(init_time=(0.01, 0)),
+        FakeBackend(init_time=(0.01, 0)),
+    ])
+    config = _config(collection_config, tmp_path, 1)
+    config.standby_drivers = 1
+    manager = AssetsUploadManager(bus, backend_factory=lambda: next(backends), collection_config=config)
+    try:
+        manager.init_drivers(1)
+        assert manager.drivers_count == 1 and len(manager.standby_pool) == 1
+        standby, replaced, ready = 0, 0, []
+        deadline = time.monotonic() + 5
+        while (standby < 2 or not replaced or not ready) and time.monotonic() < deadline:
+            try:
+                event = bus.get(timeout=0.1)
+            except Empty:
+                continue
+            if event.check(ServerEvent.WORKER_STANDBY):
+                standby += 1
+            elif event.check(ServerEvent.WORKER_READY):
+                ready.append(event.payload)
+            elif event.check(ServerEvent.WORKER_STOPPED):
+                replaced += manager.replace_failed_drivers()
+        assert replaced == 1
+        assert len(ready) == 1 # activated standby driver, its init is reported once
+        assert [driver.status for driver in manager.workers_pool.values()] == ["Working"]
+        assert manager.standby_drivers_count == 1
+
+        start = time.monotonic()
+        manager.add_driver()
+        assert time.monotonic() - start < 0.1
+        assert manager.drivers_count == 2 and len(manager.standby_pool) == 1 # refilling
+        while any(driver.status != "Working" for driver in manager.workers_pool.values()) and time.monotonic() < start + 1:
+            time.sleep(0.01)
+        assert all(driver.status == "Working" for driver in manager.workers_pool.values())
+    finally:
+        manager.on_stop()
+    assert manager.standby_pool == {}
+
+
+def test_crashed_driver_is_replaced_by_standby(collection_config, tmp_path):
+    bus = Queue()
+
+    class CrashingBackend(FakeBackend):
+        def wait_uploads(self, timeout):
+            raise RuntimeError("Browser is closed(fake)")
+
+    backends = iter([CrashingBackend(init_time=(0.01, 0)), FakeBackend(init_time=(0.01, 0), upload_time=(0.01, 0)), FakeBackend(init_time=(0.01, 0))])
+    config = _config(collection_config, tmp_path, 3)
+    config.standby_drivers = 1
+    manager = AssetsUploadManager(bus, backend_factory=lambda: next(backends), collection_config=config)
+    handler = manager.assets_handler
+    handler.pending_index.retry_base_delay = 0
+    try:
+        manager.init_drivers(1)
+        manager.unlock_drivers_input_bus()
+        replaced = 0
+        deadline = time.monotonic() + 10
+        while handler.uploaded_assets_count < 3 and time.monotonic() < deadline:
+            try:
+                event = bus.get(timeout=0.1)
+            except Empty:
+                continue
+            if event.check(ServerEvent.WORKER_STOPPED):
+                replaced += manager.replace_failed_drivers()
+            elif event.check(ServerEvent.WORKER_COMPLETED_UPLOAD):
+                handler.asset_uploaded(event.payload)
+            elif event.check(ServerEvent.WORKER_UNKNOWN_ERROR_WHILE_UPLOAD):
+                handler.asset_uploading_failed(event.payload.asset_id, event.payload.error)
+        assert replaced == 1
+        assert handler.uploaded_assets_ids == {0, 1, 2}
+        assert len(manager.standby_pool) == 1 # refilled after activation
+    finally:
+        manager.on_stop()